@@ -1,131 +1,467 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
-from models import db
+import click
+from datetime import datetime
+import os
+from flask import Flask, Response, current_app, render_template, jsonify, request, url_for, stream_with_context
+from flask.cli import with_appcontext
+from models import db, pagination, credentials, entites, fragments, taches
+from models.replica import init_replica
+from models.projection import as_dicts, parse_fields, query_columns
+from models.version_model import get_table_version
+from controllers.http_cache import reponse_conditionnelle
+from controllers.profilage import init_profilage
+from controllers.serialisation import FournisseurJSON, encoder
+from controllers.sessions import init_sessions
+from controllers.assets import init_assets
 from models.patient_model import Patient
 from models.medecin_model import Medecin
 from models.rdv_model import RendezVous
-from controllers.patient_controller import patient_inscription, patient_connexion, patient_dashboard, patient_profil, patient_deconnexion
+from controllers import patient_controller, rdv_controller
 from controllers.medecin_controller import medecin_bp
 from controllers.api_controller import api_bp
-from config import SECRET_KEY, SQLALCHEMY_DATABASE_URI, SQLALCHEMY_TRACK_MODIFICATIONS
+from config import engine_options
+from config import API_PAGE_SIZE, API_PAGE_MAX, API_STREAM_CHUNK
 
-app = Flask(__name__)
+# Commandes de maintenance du schéma (flask --app app <commande>)
+@click.command('db-upgrade')
+@click.option('--version', 'cible', type=int, default=None, help='Version cible (toutes par défaut)')
+@with_appcontext
+def db_upgrade(cible):
+    """Appliquer les migrations en attente"""
+    from models import migrations
+    appliquees = migrations.upgrade(cible, log=click.echo)
+    click.echo(f'Schéma à jour (version {migrations.current_version()}, {len(appliquees)} migration(s) appliquée(s))')
 
-# Configuration simple
-app.config['SECRET_KEY'] = SECRET_KEY
-app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = SQLALCHEMY_TRACK_MODIFICATIONS
+@click.command('db-version')
+@with_appcontext
+def db_version():
+    """Afficher la version du schéma"""
+    from models import migrations
+    click.echo(migrations.current_version())
 
-# Initialisation
-db.init_app(app)
+@click.command('db-check-plans')
+@with_appcontext
+def db_check_plans():
+    """Vérifier (SQLite) qu'aucune requête critique ne parcourt toute une table"""
+    from models import migrations
+    regressions = migrations.check_query_plans()
+    for nom, plan in regressions.items():
+        click.echo(f'Parcours complet : {nom}', err=True)
+        for ligne in plan:
+            click.echo(f'    {ligne}', err=True)
+    if regressions:
+        raise SystemExit(1)
+    click.echo('Toutes les requêtes critiques utilisent un index.')
 
-# Créer les tables
-with app.app_context():
-    db.create_all()
+# Agrégats des rapports d'occupation (à lancer par cron, ex. toutes les 10 minutes)
+@click.command('rapports-actualiser')
+@click.option('--complet', is_flag=True, help='Reconstruire tous les agrégats au lieu des seuls jours modifiés')
+@with_appcontext
+def rapports_actualiser(complet):
+    """Mettre à jour les agrégats journaliers des rendez-vous"""
+    from models import rapports_model
+    debut = datetime.now()
+    rapports_model.actualiser(complet, log=click.echo)
+    click.echo(f'Agrégats à jour en {(datetime.now() - debut).total_seconds():.2f} s')
 
-# Blueprints
-app.register_blueprint(medecin_bp)
-app.register_blueprint(api_bp)
+# Archivage des rendez-vous anciens (à lancer par cron, ex. chaque nuit)
+@click.command('rdv-archiver')
+@click.option('--horizon', type=click.IntRange(1), default=None, help='Jours après la date du rendez-vous (ARCHIVE_HORIZON par défaut)')
+@click.option('--lot', 'taille_lot', type=click.IntRange(1), default=None, help='Lignes déplacées par transaction')
+@click.option('--max', 'maximum', type=click.IntRange(1), default=None, help='Arrêter après ce nombre de lignes')
+@with_appcontext
+def rdv_archiver(horizon, taille_lot, maximum):
+    """Déplacer les rendez-vous terminés ou annulés anciens vers rendez_vous_archive"""
+    from models import archive_model
+    from config import ARCHIVE_HORIZON, ARCHIVE_TAILLE_LOT
+
+    def afficher_tailles(titre):
+        click.echo(titre)
+        for table, taille in archive_model.tailles().items():
+            octets = f", {taille['octets'] / 2 ** 20:.1f} Mo" if taille['octets'] is not None else ''
+            click.echo(f"  {table:20} {taille['lignes']:10d} ligne(s){octets}")
+
+    afficher_tailles('Avant :')
+    debut = datetime.now()
+    deplaces = archive_model.archiver(horizon or ARCHIVE_HORIZON, taille_lot or ARCHIVE_TAILLE_LOT,
+                                      maximum=maximum, log=click.echo)
+    click.echo(f'{deplaces} rendez-vous archivé(s) en {(datetime.now() - debut).total_seconds():.1f} s')
+    afficher_tailles('Après :')
+
+# Feuilles de style et scripts versionnés (à lancer à chaque déploiement)
+@click.command('assets-construire')
+@click.option('--nettoyer', is_flag=True, help='Supprimer les fichiers des constructions précédentes')
+@with_appcontext
+def assets_construire(nettoyer):
+    """Minifier, versionner et précompresser les CSS/JS de static/, puis afficher le poids par template"""
+    from controllers import assets
+
+    def ko(octets):
+        return f'{octets / 1024:8.1f} Ko' if octets is not None else '         -'
+
+    manifeste = assets.construire(current_app.static_folder, nettoyer, log=click.echo)
+    if assets.brotli is None:
+        click.echo('Module brotli absent : variantes gzip seulement', err=True)
+    click.echo(f"\n{'template':30} {'source':>11} {'minifié':>11} {'gzip':>11} {'brotli':>11}")
+    templates = os.path.join(current_app.root_path, current_app.template_folder)
+    for template, entrees in assets.poids_templates(templates, manifeste).items():
+        totaux = [sum(e[cle] for e in entrees.values()) if all(e[cle] is not None for e in entrees.values()) else None
+                  for cle in ('source', 'minifie', 'gzip', 'br')]
+        click.echo(f'{template:30} ' + ' '.join(ko(total) for total in totaux))
+    click.echo('Chargés une fois par navigateur (Cache-Control: immutable) ; redémarrer les workers pour servir cette version.')
+
+# Tâches de fond (rappels, actualisation des agrégats)
+@click.command('taches-worker')
+@click.option('--workers', type=click.IntRange(1), default=None, help='Tâches exécutées en même temps (TACHES_WORKERS par défaut)')
+@with_appcontext
+def taches_worker(workers):
+    """Exécuter les tâches de fond jusqu'à Ctrl-C"""
+    from models import taches
+    from config import TACHES_WORKERS
+    executeur = taches.executeur
+    executeur.workers = workers or TACHES_WORKERS
+    executeur.demarrer(current_app._get_current_object())
+    click.echo(f'Exécuteur démarré ({executeur.workers} thread(s)), Ctrl-C pour arrêter')
+    try:
+        while executeur.actif():
+            executeur.thread.join(60)
+            m = executeur.metriques()
+            click.echo(f"  {m['executees']} exécutée(s), {m['reessais']} réessai(s), {m['echecs']} échec(s), "
+                       f"{m['programmees']} programmée(s)")
+    except KeyboardInterrupt:
+        click.echo('Arrêt : attente des tâches en cours')
+        executeur.arreter()
+
+@click.command('taches-etat')
+@with_appcontext
+def taches_etat():
+    """Afficher la file des tâches par type et par statut"""
+    from models import taches
+    compteurs, plus_ancienne = taches.etat()
+    click.echo(f"{'type':22}" + ''.join(f'{statut:>12}' for statut in taches.StatutTache.TOUS))
+    for type_, par_statut in sorted(compteurs.items()):
+        click.echo(f'{type_:22}' + ''.join(f'{par_statut.get(statut, 0):12d}' for statut in taches.StatutTache.TOUS))
+    if plus_ancienne is not None:
+        click.echo(f'Plus ancienne tâche échue en attente : {plus_ancienne:%Y-%m-%d %H:%M:%S} '
+                   f'(retard {(datetime.now() - plus_ancienne).total_seconds():.0f} s)')
+
+@click.command('taches-rappels')
+@with_appcontext
+def taches_rappels():
+    """Programmer les rappels des rendez-vous à venir qui n'en ont pas (après un import)"""
+    from models import taches
+    lus = taches.planifier_rappels(log=click.echo)
+    click.echo(f'{lus} rendez-vous à venir lus, rappels programmés')
+
+@click.command('taches-relancer')
+@click.option('--type', 'type_', default=None, help='Seulement ce type de tâche')
+@with_appcontext
+def taches_relancer(type_):
+    """Remettre en file les tâches en échec"""
+    from models import taches
+    click.echo(f'{taches.relancer_echecs(type_)} tâche(s) remise(s) en file')
+
+# Import / export en masse
+@click.command('donnees-importer')
+@click.argument('table', type=click.Choice(['patients', 'medecins', 'rendez_vous']))
+@click.argument('fichier', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format_', type=click.Choice(['csv', 'ndjson']), default=None, help='Déduit de l\'extension par défaut')
+@click.option('--lot', 'taille_lot', type=click.IntRange(1), default=None, help='Lignes par INSERT multiple')
+@click.option('--erreurs', 'chemin_erreurs', type=click.Path(dir_okay=False), default=None, help='Rapport CSV des lignes rejetées')
+@click.option('--reprise', 'chemin_checkpoint', type=click.Path(dir_okay=False), default=None, help='Fichier de reprise (relancer avec le même fichier pour reprendre)')
+@click.option('--hacher-mots-de-passe', is_flag=True, help='Hacher les mots de passe fournis en clair (lent)')
+@with_appcontext
+def donnees_importer(table, fichier, format_, taille_lot, chemin_erreurs, chemin_checkpoint, hacher_mots_de_passe):
+    """Importer un fichier CSV ou NDJSON dans une table"""
+    from models import import_export
+    from config import IMPORT_TAILLE_LOT
+    rapport = import_export.importer(
+        table, fichier, format_, taille_lot or IMPORT_TAILLE_LOT, chemin_erreurs, chemin_checkpoint,
+        hacher=credentials.generer_hash if hacher_mots_de_passe else None,
+        progression=lambda r: click.echo(f'  ligne {r.derniere_ligne} : {r.importees} importée(s), {r.erreurs} rejetée(s)', err=True)
+    )
+    click.echo(f'{rapport.importees} ligne(s) importée(s), {rapport.erreurs} rejetée(s)')
+    if rapport.erreurs:
+        raise SystemExit(1)
+
+@click.command('donnees-exporter')
+@click.argument('table', type=click.Choice(['patients', 'medecins', 'rendez_vous']))
+@click.argument('sortie', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'format_', type=click.Choice(['csv', 'ndjson']), default='csv')
+@click.option('--lot', 'taille_lot', type=click.IntRange(1), default=None, help='Lignes lues par paquet')
+@click.option('--avec-mots-de-passe', is_flag=True, help='Inclure les hashs des mots de passe')
+@with_appcontext
+def donnees_exporter(table, sortie, format_, taille_lot, avec_mots_de_passe):
+    """Exporter une table en CSV ou NDJSON (sortie standard par défaut)"""
+    from models import import_export
+    from config import EXPORT_TAILLE_LOT
+    total = import_export.exporter(table, sortie, format_, taille_lot or EXPORT_TAILLE_LOT, avec_mots_de_passe)
+    click.echo(f'{total} ligne(s) exportée(s)', err=True)
 
 # Routes principales simplifiées
-@app.route('/')
 def index():
     """Page d'accueil"""
     return render_template('index.html')
 
-@app.route('/api/health')
 def health_check():
     """Vérification santé"""
     return jsonify({
         'statut': 'opérationnel',
-        'base_de_donnees': 'connectée'
+        'base_de_donnees': 'connectée',
+        'hachage': credentials.metriques(),
+        'fragments': fragments.cache.metriques(),
+        'entites': entites.cache.metriques()
     })
 
 # Routes API simplifiées
-@app.route('/api/patients')
+# Pagination par curseur : ?limit=N&after=<curseur>, le curseur suivant est
+# renvoyé dans les en-têtes X-Next-Cursor et Link.
+# Export complet en flux : ?stream=ndjson ou ?stream=json.
+def _flux_lignes(rows, ndjson):
+    """Générer le corps JSON/NDJSON par paquets de API_STREAM_CHUNK lignes"""
+    def paquet_encode(paquet, premier):
+        if ndjson:
+            return b'\n'.join(paquet) + b'\n'
+        return (b'' if premier else b',') + b','.join(paquet)
+
+    if not ndjson:
+        yield b'['
+    paquet = []
+    premier = True
+    for row in rows:
+        paquet.append(encoder(dict(zip(row._fields, row))))
+        if len(paquet) >= API_STREAM_CHUNK:
+            yield paquet_encode(paquet, premier)
+            paquet = []
+            premier = False
+    if paquet:
+        yield paquet_encode(paquet, premier)
+    if not ndjson:
+        yield b']'
+
+def _query_api(colonnes, cles):
+    """Requête projetée sur les colonnes demandées par ?fields=a,b (toutes par défaut).
+
+    Les colonnes de pagination (cles) sont toujours sélectionnées.
+    """
+    fields = parse_fields(request.args.get('fields'))
+    if fields is not None:
+        fields = set(fields) | set(cles)
+    return query_columns(colonnes, fields)
+
+def _liste_api(model, query, cles):
+    """Réponse paginée (keyset) ou en flux pour une requête projetée"""
+    mode = request.args.get('stream')
+    if mode in ('json', 'ndjson'):
+        rows = pagination.stream(query, cles, API_STREAM_CHUNK)
+        mimetype = 'application/x-ndjson' if mode == 'ndjson' else 'application/json'
+        return Response(stream_with_context(_flux_lignes(rows, mode == 'ndjson')), mimetype=mimetype)
+
+    # 304 si le client a déjà cette version de la table, sans lire de lignes
+    return reponse_conditionnelle(get_table_version(model), lambda: _page_api(query, cles))
+
+def _page_api(query, cles):
+    """Une page de résultats, avec le curseur de la page suivante"""
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, API_PAGE_MAX))
+    try:
+        rows, next_cursor = pagination.paginate(query, cles, request.args.get('after'), limit)
+    except ValueError as e:
+        # Une Response (pas un tuple) : reponse_conditionnelle lit son status_code
+        response = jsonify({'error': str(e)})
+        response.status_code = 400
+        return response
+
+    response = jsonify(as_dicts(rows))
+    if next_cursor:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
+# Colonnes des listes de l'API, filtrables par ?fields=
+API_PATIENT_COLUMNS = {
+    'id': Patient.id,
+    'nom': Patient.nom,
+    'email': Patient.email,
+    'telephone': Patient.telephone
+}
+
+API_MEDECIN_COLUMNS = {
+    'id': Medecin.id,
+    'nom': Medecin.nom,
+    'specialite': Medecin.specialite
+}
+
+API_RDV_COLUMNS = {
+    'id': RendezVous.id,
+    'date': RendezVous.date_heure,
+    'motif': RendezVous.motif
+}
+
 def api_patients():
     """Liste des patients"""
-    patients = Patient.query.all()
-    return jsonify([{
-        'id': p.id,
-        'nom': p.nom,
-        'email': p.email,
-        'telephone': p.telephone
-    } for p in patients])
-
-@app.route('/api/medecins')
+    cles = {'id': Patient.id}
+    return _liste_api(Patient, _query_api(API_PATIENT_COLUMNS, cles), cles)
+
 def api_medecins():
     """Liste des médecins"""
-    medecins = Medecin.query.all()
-    return jsonify([{
-        'id': m.id,
-        'nom': m.nom,
-        'specialite': m.specialite
-    } for m in medecins])
-
-@app.route('/api/rdv')
+    cles = {'id': Medecin.id}
+    query = _query_api(API_MEDECIN_COLUMNS, cles)
+    specialite = request.args.get('specialite')
+    if specialite:
+        query = query.filter(Medecin.specialite == specialite)
+    return _liste_api(Medecin, query, cles)
+
 def api_rdv():
-    """Liste des rendez-vous"""
-    rdvs = RendezVous.query.all()
-    return jsonify([{
-        'id': r.id,
-        'date': r.date_heure.isoformat() if r.date_heure else None,
-        'motif': r.motif
-    } for r in rdvs])
-
-# Routes patients simplifiées
-@app.route('/patient/connexion', methods=['GET', 'POST'])
-def patient_connexion():
-    """Connexion patient"""
-    from controllers.patient_controller import patient_connexion as connexion_func
-    return connexion_func()
-
-@app.route('/patient/inscription', methods=['GET', 'POST'])
-def patient_inscription():
-    """Inscription patient"""
-    from controllers.patient_controller import patient_inscription as inscription_func
-    return inscription_func()
-
-@app.route('/patient/dashboard')
-def patient_dashboard():
-    """Dashboard patient"""
-    from controllers.patient_controller import patient_dashboard as dashboard_func
-    return dashboard_func()
-
-@app.route('/patient/profil', methods=['GET', 'POST'])
-def patient_profil():
-    """Profil patient"""
-    from controllers.patient_controller import patient_profil as profil_func
-    return profil_func()
-
-@app.route('/patient/deconnexion')
-def patient_deconnexion():
-    """Déconnexion patient"""
-    from controllers.patient_controller import patient_deconnexion as deconnexion_func
-    return deconnexion_func()
-
-@app.route('/rdv/nouveau', methods=['GET', 'POST'])
-def nouveau_rdv():
-    """Créer un nouveau rendez-vous"""
-    from controllers.rdv_controller import nouveau_rdv as nouveau_rdv_ctrl
-    return nouveau_rdv_ctrl()
-
-@app.route('/rdv/liste')
-def liste_rdv():
-    """Liste des rendez-vous"""
-    from controllers.rdv_controller import liste_rdv as liste_rdv_func
-    return liste_rdv_func()
-
-@app.route('/rdv/details/<int:rdv_id>')
-def rdv_details(rdv_id):
-    """Détails d'un rendez-vous"""
-    from controllers.rdv_controller import details_rdv as details_rdv_func
-    return details_rdv_func(rdv_id)
-
-@app.route('/rdv/annuler/<int:rdv_id>', methods=['POST'])
-def annuler_rdv(rdv_id):
-    """Annuler un rendez-vous"""
-    from controllers.rdv_controller import annuler_rdv as annuler_rdv_func
-    return annuler_rdv_func(rdv_id)
+    """Liste des rendez-vous (filtres : medecin_id, patient_id, debut, fin, statut)"""
+    cles = {'date': RendezVous.date_heure, 'id': RendezVous.id}
+    query = _query_api(API_RDV_COLUMNS, cles)
+    medecin_id = request.args.get('medecin_id', type=int)
+    patient_id = request.args.get('patient_id', type=int)
+    statut = request.args.get('statut')
+    try:
+        debut = request.args.get('debut')
+        fin = request.args.get('fin')
+        debut = datetime.fromisoformat(debut) if debut else None
+        fin = datetime.fromisoformat(fin) if fin else None
+    except ValueError:
+        return jsonify({'error': 'Format de date invalide'}), 400
+
+    if medecin_id is not None:
+        query = query.filter(RendezVous.medecin_id == medecin_id)
+    if patient_id is not None:
+        query = query.filter(RendezVous.patient_id == patient_id)
+    if statut:
+        query = query.filter(RendezVous.statut == statut)
+    if debut:
+        query = query.filter(RendezVous.date_heure >= debut)
+    if fin:
+        query = query.filter(RendezVous.date_heure < fin)
+
+    return _liste_api(RendezVous, query, cles)
+
+
+# Métriques du pool de hachage, des caches, des sessions et des tâches ajoutées à /metrics
+def _metriques_supplementaires():
+    m = credentials.metriques()
+    f = fragments.cache.metriques()
+    e = entites.cache.metriques()
+    sig = entites.signal.metriques()
+    s = current_app.session_interface.cache.metriques()
+    t = taches.executeur.metriques()
+    return [
+        ('password_hash_queue_depth', 'gauge', 'Hachages en attente', m['en_attente']),
+        ('password_hash_in_progress', 'gauge', 'Hachages en cours', m['en_cours']),
+        ('password_hash_rejected_total', 'counter', 'Hachages refusés (file pleine)', m['refuses']),
+        ('password_hash_total', 'counter', 'Hachages et vérifications effectués', m['traites']),
+        ('fragment_cache_hits_total', 'counter', 'Pages détail médecin servies depuis le cache', f['succes']),
+        ('fragment_cache_misses_total', 'counter', 'Pages détail médecin rendues', f['echecs']),
+        ('fragment_cache_evictions_total', 'counter', 'Fragments évincés (FRAGMENTS_TAILLE_MAX)', f['evictions']),
+        ('fragment_cache_invalidations_total', 'counter', 'Invalidations par les écritures validées', f['invalidations']),
+        ('fragment_cache_bytes', 'gauge', 'Octets de HTML en cache', f['octets']),
+        ('entity_cache_hits_total', 'counter', 'Patients et médecins lus depuis le cache', e['succes']),
+        ('entity_cache_misses_total', 'counter', 'Patients et médecins lus en base', e['echecs']),
+        ('entity_cache_hit_ratio', 'gauge', 'Part des lectures servies par le cache', round(e['taux_succes'], 4)),
+        ('entity_cache_evictions_total', 'counter', 'Entrées évincées (ENTITES_TAILLE_MAX)', e['evictions']),
+        ('entity_cache_invalidations_total', 'counter', 'Invalidations (écritures validées ou signalées)', e['invalidations']),
+        ('entity_cache_rows', 'gauge', 'Lignes en cache', e['lignes']),
+        ('entity_cache_signals_received_total', 'counter', 'Invalidations reçues des autres workers', sig['recues']),
+        ('entity_cache_signal_errors_total', 'counter', 'Erreurs du fichier de signal (base occupée)', sig['erreurs']),
+        ('session_cache_hits_total', 'counter', 'Sessions lues depuis le cache du worker', s['succes']),
+        ('session_store_reads_total', 'counter', 'Sessions lues dans le stockage partagé', s['lectures']),
+        ('session_store_writes_total', 'counter', 'Sessions écrites dans le stockage partagé', s['ecritures']),
+        ('session_expired_purged_total', 'counter', 'Sessions expirées supprimées', s['purgees']),
+        ('jobs_running', 'gauge', 'Tâches de fond en cours dans ce processus', t['en_cours']),
+        ('jobs_scheduled', 'gauge', 'Tâches dans la roue temporelle de ce processus', t['programmees']),
+        ('jobs_completed_total', 'counter', 'Tâches de fond terminées', t['executees']),
+        ('jobs_retried_total', 'counter', 'Tâches de fond reprogrammées après une erreur', t['reessais']),
+        ('jobs_failed_total', 'counter', 'Tâches de fond en échec (essais épuisés)', t['echecs']),
+        ('jobs_recovered_total', 'counter', 'Tâches reprises à un processus arrêté', t['reprises']),
+    ]
+
+# Routes de l'application (les blueprints portent les leurs)
+ROUTES = [
+    ('/', 'index', index, ['GET']),
+    ('/api/health', 'health_check', health_check, ['GET']),
+    ('/api/patients', 'api_patients', api_patients, ['GET']),
+    ('/api/medecins', 'api_medecins', api_medecins, ['GET']),
+    ('/api/rdv', 'api_rdv', api_rdv, ['GET']),
+    ('/patient/connexion', 'patient_connexion', patient_controller.patient_connexion, ['GET', 'POST']),
+    ('/patient/inscription', 'patient_inscription', patient_controller.patient_inscription, ['GET', 'POST']),
+    ('/patient/dashboard', 'patient_dashboard', patient_controller.patient_dashboard, ['GET']),
+    ('/patient/profil', 'patient_profil', patient_controller.patient_profil, ['GET', 'POST']),
+    ('/patient/deconnexion', 'patient_deconnexion', patient_controller.patient_deconnexion, ['GET']),
+    ('/rdv/nouveau', 'nouveau_rdv', rdv_controller.nouveau_rdv, ['GET', 'POST']),
+    ('/rdv/liste', 'liste_rdv', rdv_controller.liste_rdv, ['GET']),
+    ('/rdv/details/<int:rdv_id>', 'rdv_details', rdv_controller.details_rdv, ['GET']),
+    ('/rdv/annuler/<int:rdv_id>', 'annuler_rdv', rdv_controller.annuler_rdv, ['POST']),
+]
+
+COMMANDES = [db_upgrade, db_version, db_check_plans, rapports_actualiser, rdv_archiver, assets_construire,
+             taches_worker, taches_etat, taches_rappels, taches_relancer, donnees_importer, donnees_exporter]
+
+def _cle_secrete(app):
+    """SECRET_KEY absente de l'environnement : clé générée une fois et gardée dans instance/"""
+    chemin = os.path.join(app.instance_path, 'secret_key')
+    try:
+        with open(chemin) as fichier:
+            return fichier.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(app.instance_path, exist_ok=True)
+    cle = os.urandom(32).hex()
+    descripteur = os.open(chemin, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descripteur, 'w') as fichier:
+        fichier.write(cle)
+    app.logger.warning('SECRET_KEY absente : clé générée dans %s', chemin)
+    return cle
+
+def create_app(config=None):
+    """Construire l'application ; `config` (dict) remplace des valeurs de config.py.
+
+    Aucun accès à la base : le schéma se crée avec `flask --app app db-upgrade`.
+    """
+    app = Flask(__name__)
+    app.json = FournisseurJSON(app)
+    app.config.from_object('config')
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = _cle_secrete(app)
+
+    init_sessions(app)
+    db.init_app(app)
+    init_replica(app, db)
+    init_profilage(app, _metriques_supplementaires)
+    init_assets(app)
+    # Caches du worker : invalidations signalées par les autres processus (au plus toutes les ENTITES_SIGNAL_INTERVALLE s)
+    app.before_request(entites.synchroniser)
+    if app.config.get('TACHES_EXECUTEUR_WEB'):
+        # Démarré à la première requête de chaque processus (après le fork de
+        # gunicorn), une tâche à la fois : les threads servent les requêtes
+        taches.executeur.workers = 1
+        app.before_request(lambda: None if taches.executeur.actif() else taches.executeur.demarrer(app))
+
+    app.register_blueprint(medecin_bp)
+    app.register_blueprint(api_bp)
+    for regle, endpoint, vue, methodes in ROUTES:
+        app.add_url_rule(regle, endpoint, vue, methods=methodes)
+    for commande in COMMANDES:
+        app.cli.add_command(commande)
+
+    # gunicorn --preload : les processus fils ne doivent pas réutiliser les
+    # connexions ouvertes par le maître
+    with app.app_context():
+        moteurs = list(db.engines.values())
+    os.register_at_fork(after_in_child=lambda: [moteur.dispose(close=False) for moteur in moteurs])
+    return app
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        from models import migrations
+        migrations.upgrade()
     app.run(debug=True)
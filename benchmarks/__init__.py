@@ -0,0 +1 @@
+# Banc de mesure des performances (python -m benchmarks --help)
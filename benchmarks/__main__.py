@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+# Utilisation :
+#   python -m benchmarks generer --base /tmp/banc.db --echelle petite
+#   python -m benchmarks lancer --base /tmp/banc.db --sortie resultats.json
+#   python -m benchmarks lancer --base /tmp/banc.db --mode http --workers 8 \
+#       --reference reference.json --seuil 0.2
+#   python -m benchmarks reservations --base /tmp/banc.db --workers 16
+#   python -m benchmarks json --base /tmp/banc.db --lignes 10000
+#   python -m benchmarks rapports --base /tmp/banc.db
+
+
+def _application(base):
+    """App on the benchmark database, with its schema and report rollups brought up to date."""
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(base), 'SQLALCHEMY_BINDS': {}})
+    with app.app_context():
+        from models import migrations, rapports_model
+        migrations.upgrade(log=lambda message: None)
+        rapports_model.actualiser(log=lambda message: None)
+    return app
+
+
+def _version_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def generer(args):
+    if os.path.exists(args.base):
+        sys.exit(f'{args.base} existe déjà : choisir un fichier neuf')
+    app = _application(args.base)
+    from benchmarks.donnees import ECHELLES, generer
+    echelle = dict(ECHELLES[args.echelle])
+    for cle in ('medecins', 'patients', 'rdv'):
+        if getattr(args, cle):
+            echelle[cle] = getattr(args, cle)
+    with app.app_context():
+        debut = datetime.now()
+        generer(echelle['medecins'], echelle['patients'], echelle['rdv'], args.graine)
+    print(f'Base générée en {(datetime.now() - debut).total_seconds():.1f} s : {args.base}')
+
+
+def lancer(args):
+    base = args.base
+    if not args.sur_place:
+        # Les scénarios d'écriture modifient la base : on travaille sur une copie
+        base = os.path.join(tempfile.mkdtemp(prefix='banc-'), 'banc.db')
+        shutil.copyfile(args.base, base)
+    app = _application(base)
+    from benchmarks import mesure, scenarios
+
+    choisis = [s for s in scenarios.SCENARIOS
+               if (not args.scenarios or s.nom in args.scenarios) and (args.ecritures or not s.ecriture)]
+    with app.app_context():
+        contexte = scenarios.Contexte(args.graine)
+        sessions = [contexte.session_patient() for _ in range(args.workers)]
+
+    resultats = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': _version_git(),
+            'python': platform.python_version(),
+            'plateforme': platform.platform(),
+            'echelle': contexte.echelle(),
+            'requetes': args.requetes,
+            'echauffement': args.echauffement,
+            'workers': args.workers,
+        },
+        'non_couvertes': scenarios.routes_non_couvertes(app),
+        'modes': {},
+    }
+    for nom in resultats['non_couvertes']:
+        print(f'Route sans scénario : {nom}', file=sys.stderr)
+
+    modes = ['client', 'http'] if args.mode == 'tous' else [args.mode]
+    for mode in modes:
+        if mode == 'client':
+            clients = [mesure.ClientTest(app, session) for session in sessions]
+        else:
+            url = args.url or mesure.demarrer_serveur(app)[0]
+            clients = [mesure.ClientHTTP(url, session) for session in sessions]
+        resultats['modes'][mode] = {}
+        print(f'[{mode}]')
+        for scenario in choisis:
+            with app.app_context():
+                resume = mesure.executer(scenario, contexte, clients, sessions, args.requetes, args.echauffement)
+            resultats['modes'][mode][scenario.nom] = resume
+            print(f"  {scenario.nom:38} p50 {resume['p50']:9.2f} ms  p95 {resume['p95']:9.2f} ms  "
+                  f"p99 {resume['p99']:9.2f} ms  {resume['debit']:8.1f} req/s  erreurs {resume['erreurs']}")
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+        print(f'Résultats : {args.sortie}')
+
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+        regressions = mesure.comparer(resultats, reference, args.seuil, args.metrique)
+        for mode, nom, avant, apres in regressions:
+            print(f'Régression [{mode}] {nom} : {args.metrique} {avant:.2f} ms -> {apres:.2f} ms', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f'Aucune régression de plus de {args.seuil:.0%} sur {args.metrique} par rapport à {args.reference}')
+
+
+def reservations(args):
+    base = os.path.join(tempfile.mkdtemp(prefix='banc-'), 'banc.db')
+    shutil.copyfile(args.base, base)
+    app = _application(base)
+    from benchmarks import concurrence
+    print(f'[réservations] {args.workers} threads')
+    echecs = concurrence.verifier(app, args.workers, args.reservations, args.graine)
+    for echec in echecs:
+        print(f'Invariant violé : {echec}', file=sys.stderr)
+    if echecs:
+        sys.exit(1)
+    print('Aucune double réservation')
+
+
+def serialisation(args):
+    app = _application(args.base)
+    from benchmarks import serialisation as banc_json
+    print(f'[json] {args.lignes} rendez-vous, médiane de {args.repetitions} essais')
+    resultats = banc_json.mesurer(app, args.lignes, args.repetitions)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+
+
+def rapports(args):
+    app = _application(args.base)
+    from benchmarks import rapports as banc_rapports
+    print(f'[rapports] médiane de {args.repetitions} essais')
+    resultats = banc_rapports.mesurer(app, args.repetitions)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Banc de mesure des performances')
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    p = commandes.add_parser('generer', help='Créer une base SQLite de données synthétiques')
+    p.add_argument('--base', required=True, help='Fichier SQLite à créer')
+    p.add_argument('--echelle', choices=('petite', 'moyenne', 'grande'), default='petite')
+    p.add_argument('--medecins', type=int, help="Remplace le nombre de médecins de l'échelle")
+    p.add_argument('--patients', type=int)
+    p.add_argument('--rdv', type=int)
+    p.add_argument('--graine', type=int, default=42)
+    p.set_defaults(fonction=generer)
+
+    p = commandes.add_parser('lancer', help='Mesurer les routes et écrire les résultats en JSON')
+    p.add_argument('--base', required=True, help='Base créée par "generer"')
+    p.add_argument('--mode', choices=('client', 'http', 'tous'), default='client',
+                   help='client de test Flask, serveur HTTP réel, ou les deux')
+    p.add_argument('--url', help='Mesurer un serveur déjà lancé (ex. gunicorn) sur la même base')
+    p.add_argument('--workers', type=int, default=1, help='Clients simultanés')
+    p.add_argument('--requetes', type=int, default=200, help='Requêtes mesurées par scénario')
+    p.add_argument('--echauffement', type=int, default=20, help='Requêtes non mesurées avant chaque scénario')
+    p.add_argument('--scenarios', type=lambda v: v.split(','), help='Noms de scénarios séparés par des virgules')
+    p.add_argument('--sans-ecritures', dest='ecritures', action='store_false',
+                   help='Ignorer les scénarios qui modifient la base')
+    p.add_argument('--sur-place', action='store_true', help='Travailler sur la base elle-même et non sur une copie')
+    p.add_argument('--graine', type=int, default=1)
+    p.add_argument('--sortie', help='Fichier JSON des résultats')
+    p.add_argument('--reference', help='Résultats JSON de référence à comparer')
+    p.add_argument('--seuil', type=float, default=0.2, help='Hausse tolérée (0.2 = +20 %%)')
+    p.add_argument('--metrique', default='p95', choices=('p50', 'p90', 'p95', 'p99', 'moyenne'))
+    p.set_defaults(fonction=lancer)
+
+    p = commandes.add_parser('reservations', help='Réserver en parallèle et vérifier l\'absence de doubles réservations')
+    p.add_argument('--base', required=True, help='Base créée par "generer" (travail sur une copie)')
+    p.add_argument('--workers', type=int, default=8, help='Threads simultanés')
+    p.add_argument('--reservations', type=int, default=400, help='Réservations par scénario')
+    p.add_argument('--graine', type=int, default=1)
+    p.set_defaults(fonction=reservations)
+
+    p = commandes.add_parser('json', help='Comparer la sérialisation JSON (jsonify standard contre projection + orjson)')
+    p.add_argument('--base', required=True, help='Base créée par "generer"')
+    p.add_argument('--lignes', type=int, default=10000)
+    p.add_argument('--repetitions', type=int, default=15)
+    p.add_argument('--sortie', help='Fichier JSON des résultats')
+    p.set_defaults(fonction=serialisation)
+
+    p = commandes.add_parser('rapports', help='Mesurer les agrégats journaliers et les rapports d\'occupation')
+    p.add_argument('--base', required=True, help='Base créée par "generer" (les agrégats y sont reconstruits)')
+    p.add_argument('--repetitions', type=int, default=5)
+    p.add_argument('--sortie', help='Fichier JSON des résultats')
+    p.set_defaults(fonction=rapports)
+
+    args = parser.parse_args()
+    args.fonction(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Barrier
+import random
+import time
+
+from config import HEURE_OUVERTURE, JOURS_OUVRES
+from models import db, disponibilite_model
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.rdv_model import RendezVous, StatutRdv
+from models.reservation_model import ResultatReservation, developper_recurrence, reserver, reserver_serie
+
+# Vérification du chemin d'écriture des réservations sous contention : des
+# threads, chacun dans son propre contexte d'application (donc sa propre
+# connexion), réservent en même temps. Les invariants sont vérifiés en base.
+
+
+def _jour_ouvre(jour):
+    while jour.weekday() not in JOURS_OUVRES:
+        jour += timedelta(days=1)
+    return jour
+
+
+def _creneau(rng, jours=60):
+    jour = _jour_ouvre(datetime.now().date() + timedelta(days=rng.randint(1, jours)))
+    return datetime(jour.year, jour.month, jour.day, rng.randrange(8, 18), rng.choice((0, 30)))
+
+
+def _lancer(app, workers, taches):
+    """Run taches (callables) on `workers` threads started together; returns (resultats, secondes)."""
+    depart = Barrier(workers)
+
+    def travailleur(lot):
+        with app.app_context():
+            depart.wait()
+            return [tache() for tache in lot]
+
+    lots = [taches[i::workers] for i in range(workers)]
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        resultats = [r for lot in pool.map(travailleur, lots) for r in lot]
+    return resultats, time.perf_counter() - debut
+
+
+def chevauchements(depuis_id):
+    """Pairs of overlapping active bookings of one medecin, at least one created after depuis_id."""
+    medecins = [row[0] for row in db.session.query(RendezVous.medecin_id).filter(RendezVous.id > depuis_id).distinct()]
+    paires = []
+    for medecin_id in medecins:
+        rdvs = db.session.query(RendezVous.id, RendezVous.date_heure, RendezVous.duree)\
+            .filter(RendezVous.medecin_id == medecin_id, RendezVous.statut != StatutRdv.ANNULE)\
+            .order_by(RendezVous.date_heure).all()
+        actifs = []  # (fin, id) des rendez-vous pouvant encore chevaucher
+        for rdv_id, debut, duree in rdvs:
+            actifs = [(fin, autre) for fin, autre in actifs if fin > debut]
+            paires.extend((autre, rdv_id) for _, autre in actifs if max(autre, rdv_id) > depuis_id)
+            actifs.append((disponibilite_model._fin_rdv(debut, duree), rdv_id))
+    return paires
+
+
+def verifier(app, workers=8, reservations=400, graine=1, debit_min=None, log=print):
+    """Hammer the booking path from `workers` threads; returns the list of violated invariants.
+
+    Every booking of the spread load must be answered (created or refused,
+    never SATURE), at `debit_min` bookings per second at least when given.
+    """
+    rng = random.Random(graine)
+    with app.app_context():
+        depuis_id = db.session.query(db.func.max(RendezVous.id)).scalar() or 0
+        nb_medecins = db.session.query(db.func.max(Medecin.id)).scalar()
+        patients = [row[0] for row in db.session.query(Patient.id).order_by(Patient.id).limit(reservations)]
+        patients = [patients[i % len(patients)] for i in range(reservations)]  # petite base : patients réutilisés
+        # Un jour au-delà des rendez-vous générés (180 jours), pour que le premier arrivé l'obtienne
+        dispute = datetime.combine(_jour_ouvre(datetime.now().date() + timedelta(days=200)),
+                                   datetime.min.time()).replace(hour=HEURE_OUVERTURE)
+    echecs = []
+
+    def bilan(nom, resultats, secondes):
+        compte = Counter(resultat for resultat, _ in resultats)
+        compte['debit'] = len(resultats) / secondes
+        log(f'  {nom:22} {len(resultats):5d} réservations en {secondes:6.2f} s '
+            f'({compte["debit"]:7.1f} /s)  ' + '  '.join(f'{k} {n}' for k, n in sorted(compte.items()) if k != 'debit'))
+        return compte
+
+    # 1. Tous les threads visent le même créneau du même médecin
+    medecin_id = rng.randint(1, nb_medecins)
+    taches = [lambda p=p: reserver(p, medecin_id, dispute, 'banc') for p in patients]
+    compte = bilan('créneau disputé', *_lancer(app, workers, taches))
+    if compte[ResultatReservation.CREE] != 1:
+        echecs.append(f'créneau disputé : {compte[ResultatReservation.CREE]} réservation(s) au lieu de 1')
+
+    # 2. Double soumission : même patient, même clé, envoyée par tous les threads
+    cle = f'banc-{rng.getrandbits(64):x}'
+    creneau = datetime.combine(_jour_ouvre(dispute.date() + timedelta(days=1)), dispute.time())
+    taches = [lambda: reserver(patients[0], medecin_id, creneau, 'banc', cle=cle)] * workers * 4
+    resultats, secondes = _lancer(app, workers, taches)
+    compte = bilan('double soumission', resultats, secondes)
+    if compte[ResultatReservation.CREE] != 1 or len({rdv_id for _, rdv_id in resultats}) != 1:
+        echecs.append(f'double soumission : {dict(compte)}, {len({r for _, r in resultats})} rendez-vous distincts')
+
+    # 3. Charge répartie sur tous les médecins (débit du chemin d'écriture)
+    taches = [lambda p=p: reserver(p, rng.randint(1, nb_medecins), _creneau(rng), 'banc') for p in patients]
+    compte = bilan('créneaux répartis', *_lancer(app, workers, taches))
+    if compte[ResultatReservation.SATURE]:
+        echecs.append(f'créneaux répartis : {compte[ResultatReservation.SATURE]} réservation(s) abandonnée(s) (sature)')
+    if debit_min is not None and compte['debit'] < debit_min:
+        echecs.append(f'créneaux répartis : {compte["debit"]:.1f} réservations/s, minimum {debit_min}')
+
+    # 4. Séries hebdomadaires concurrentes chez le même médecin, décalées d'une demi-heure
+    lundi = dispute.date() + timedelta(days=7 - dispute.weekday() + 7)
+    taches = [lambda p=p, i=i: reserver_serie(p, medecin_id, developper_recurrence(
+                  datetime.combine(lundi, datetime.min.time()).replace(hour=9) + timedelta(minutes=30 * (i % 8)),
+                  'hebdomadaire', 12), 'banc')
+              for i, p in enumerate(patients[:workers * 4])]
+    resultats, secondes = _lancer(app, workers, taches)
+    bilan('séries concurrentes', [occurrence[1:] for serie in resultats for occurrence in serie], secondes)
+
+    with app.app_context():
+        paires = chevauchements(depuis_id)
+    log(f'  chevauchements créés : {len(paires)}')
+    if paires:
+        echecs.append(f'{len(paires)} paire(s) de rendez-vous qui se chevauchent, ex. {paires[:5]}')
+    return echecs
@@ -0,0 +1,130 @@
+# Générateur de données synthétiques pour la base du banc de mesure.
+# La charge des médecins suit une loi de Zipf (quelques médecins portent la
+# plupart des rendez-vous), les patients sont tirés uniformément et les
+# rendez-vous répartis sur les deux dernières années et les six prochains
+# mois, aux heures d'ouverture. Une même graine donne la même base (à date
+# de génération égale : les dates sont relatives au jour courant).
+from datetime import date, datetime, timedelta
+import random
+
+from models import db
+from models.credentials import generer_hash
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.rdv_model import RendezVous, StatutRdv
+
+# Mot de passe de tous les comptes générés (le banc se connecte avec)
+MOT_DE_PASSE = 'benchmark'
+
+ECHELLES = {
+    'petite': {'medecins': 50, 'patients': 5000, 'rdv': 50000},
+    'moyenne': {'medecins': 500, 'patients': 50000, 'rdv': 500000},
+    'grande': {'medecins': 5000, 'patients': 500000, 'rdv': 5000000},
+}
+
+NOMS = ['Martin', 'Bernard', 'Thomas', 'Petit', 'Robert', 'Richard', 'Durand', 'Dubois', 'Moreau', 'Laurent',
+        'Simon', 'Michel', 'Lefebvre', 'Leroy', 'Roux', 'David', 'Bertrand', 'Morel', 'Fournier', 'Girard',
+        'Koné', 'Traoré', 'Kouassi', 'Yao', 'Diallo', 'Ouattara', 'Bamba', 'Coulibaly', 'N\'Guessan', 'Konan']
+PRENOMS = ['Léa', 'Paul', 'Emma', 'Louis', 'Chloé', 'Hugo', 'Inès', 'Jules', 'Manon', 'Lucas',
+           'Aminata', 'Moussa', 'Fatou', 'Ibrahim', 'Awa', 'Yves', 'Aïcha', 'Serge', 'Mariam', 'Éric']
+# Spécialités, de la plus à la moins représentée
+SPECIALITES = ['Médecine générale', 'Pédiatrie', 'Gynécologie', 'Cardiologie', 'Dermatologie', 'Ophtalmologie',
+               'Psychiatrie', 'Radiologie', 'Rhumatologie', 'Neurologie', 'Endocrinologie', 'Néphrologie']
+VILLES = ['Abidjan', 'Bouaké', 'Yamoussoukro', 'Paris', 'Lyon', 'Marseille', 'Dakar', 'Bamako']
+MOTIFS = ['Consultation', 'Suivi', 'Contrôle annuel', 'Renouvellement d\'ordonnance', 'Vaccination',
+          'Douleurs', 'Résultats d\'analyses', 'Certificat médical']
+
+# Exposant de la loi de Zipf de la charge par médecin
+ZIPF_S = 1.1
+TAILLE_LOT = 10000
+
+
+def _poids_zipf(n, s=ZIPF_S):
+    cumul, total = [], 0.0
+    for rang in range(1, n + 1):
+        total += 1 / rang ** s
+        cumul.append(total)
+    return cumul
+
+
+def _inserer(table, lignes):
+    lot = []
+    for ligne in lignes:
+        lot.append(ligne)
+        if len(lot) >= TAILLE_LOT:
+            with db.engine.begin() as connexion:
+                connexion.execute(table.insert(), lot)
+            lot = []
+    if lot:
+        with db.engine.begin() as connexion:
+            connexion.execute(table.insert(), lot)
+
+
+def _medecins(rng, n, hash_, maintenant):
+    cumul = _poids_zipf(len(SPECIALITES), 0.8)
+    for i in range(1, n + 1):
+        yield {
+            'id': i, 'nom': rng.choice(NOMS), 'prenom': rng.choice(PRENOMS), 'email': f'medecin{i}@bench.local',
+            'mot_de_passe': hash_, 'specialite': rng.choices(SPECIALITES, cum_weights=cumul)[0],
+            'telephone': f'07{rng.randrange(10 ** 8):08d}', 'adresse': rng.choice(VILLES),
+            'created_at': maintenant, 'updated_at': maintenant
+        }
+
+
+def _patients(rng, n, hash_, maintenant):
+    for i in range(1, n + 1):
+        yield {
+            'id': i, 'nom': rng.choice(NOMS), 'prenom': rng.choice(PRENOMS), 'email': f'patient{i}@bench.local',
+            'mot_de_passe': hash_, 'date_naissance': date(1940, 1, 1) + timedelta(days=rng.randrange(30000)),
+            'telephone': f'05{rng.randrange(10 ** 8):08d}', 'created_at': maintenant, 'updated_at': maintenant
+        }
+
+
+def _date_rdv(rng, aujourd_hui):
+    jour = aujourd_hui + timedelta(days=rng.randrange(-730, 180))
+    if jour.weekday() >= 5:
+        jour -= timedelta(days=jour.weekday() - 4)
+    return datetime(jour.year, jour.month, jour.day, rng.randrange(8, 18), rng.choice((0, 30)))
+
+
+def _statut(rng, date_heure, maintenant):
+    tirage = rng.random()
+    if date_heure < maintenant:
+        return StatutRdv.TERMINE if tirage < 0.8 else StatutRdv.ANNULE if tirage < 0.95 else StatutRdv.PLANIFIE
+    return StatutRdv.PLANIFIE if tirage < 0.7 else StatutRdv.CONFIRME if tirage < 0.9 else StatutRdv.ANNULE
+
+
+def _rendez_vous(rng, n, nb_medecins, nb_patients, maintenant):
+    cumul = _poids_zipf(nb_medecins)
+    medecins = list(range(1, nb_medecins + 1))
+    for i in range(1, n + 1):
+        date_heure = _date_rdv(rng, maintenant.date())
+        cree = min(date_heure - timedelta(days=rng.randrange(1, 60)), maintenant)
+        yield {
+            'id': i, 'patient_id': rng.randrange(1, nb_patients + 1),
+            'medecin_id': rng.choices(medecins, cum_weights=cumul)[0],
+            'date_heure': date_heure, 'duree': 30, 'motif': rng.choice(MOTIFS),
+            'statut': _statut(rng, date_heure, maintenant), 'notes': None,
+            'created_at': cree, 'updated_at': cree
+        }
+
+
+def generer(medecins, patients, rdv, graine=42, log=print):
+    """Fill an empty database (inside an app context) with synthetic data."""
+    if db.session.query(db.func.count(Medecin.id)).scalar():
+        raise RuntimeError('La base contient déjà des médecins : utiliser un fichier neuf')
+    rng = random.Random(graine)
+    maintenant = datetime.now().replace(second=0, microsecond=0)
+    hash_ = generer_hash(MOT_DE_PASSE)
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connexion:
+            connexion.exec_driver_sql('PRAGMA journal_mode=WAL')
+    log(f'{medecins} médecins...')
+    _inserer(Medecin.__table__, _medecins(rng, medecins, hash_, maintenant))
+    log(f'{patients} patients...')
+    _inserer(Patient.__table__, _patients(rng, patients, hash_, maintenant))
+    log(f'{rdv} rendez-vous...')
+    _inserer(RendezVous.__table__, _rendez_vous(rng, rdv, medecins, patients, maintenant))
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connexion:
+            connexion.exec_driver_sql('ANALYZE')
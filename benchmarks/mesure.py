@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from http.cookiejar import CookieJar
+from threading import Thread
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+import json
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.donnees import MOT_DE_PASSE
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(durees_triees, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not durees_triees:
+        return 0.0
+    rang = max(1, -(-p * len(durees_triees) // 100))
+    return durees_triees[int(rang) - 1]
+
+
+def resumer(durees, codes, duree_totale):
+    """Latency percentiles (ms), throughput (req/s) and status codes of one scenario."""
+    durees = sorted(durees)
+    resultat = {f'p{p}': round(1000 * percentile(durees, p), 3) for p in PERCENTILES}
+    resultat.update({
+        'n': len(durees),
+        'moyenne': round(1000 * sum(durees) / len(durees), 3) if durees else 0.0,
+        'max': round(1000 * durees[-1], 3) if durees else 0.0,
+        'debit': round(len(durees) / duree_totale, 1) if duree_totale else 0.0,
+        'erreurs': sum(n for code, n in codes.items() if code >= 500),
+        'codes': {str(code): n for code, n in sorted(codes.items())},
+    })
+    return resultat
+
+
+class CorpsJson(dict):
+    """Request body sent as JSON instead of a form."""
+
+
+class ClientTest:
+    """Flask test client, logged in as one patient."""
+
+    def __init__(self, app, session):
+        self.client = app.test_client()
+        self.client.post('/patient/connexion', data={'email': session['email'], 'mot_de_passe': MOT_DE_PASSE})
+
+    def envoyer(self, methode, url, donnees):
+        if isinstance(donnees, CorpsJson):
+            reponse = self.client.open(url, method=methode, json=donnees)
+        else:
+            reponse = self.client.open(url, method=methode, data=donnees)
+        reponse.close()
+        return reponse.status_code
+
+
+class _SansRedirection(urlrequest.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClientHTTP:
+    """Real HTTP client with its own cookie jar, logged in as one patient."""
+
+    def __init__(self, base_url, session):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urlrequest.build_opener(urlrequest.HTTPCookieProcessor(CookieJar()), _SansRedirection)
+        self.envoyer('POST', '/patient/connexion', {'email': session['email'], 'mot_de_passe': MOT_DE_PASSE})
+
+    def envoyer(self, methode, url, donnees):
+        entetes, corps = {}, None
+        if isinstance(donnees, CorpsJson):
+            entetes, corps = {'Content-Type': 'application/json'}, json.dumps(donnees).encode()
+        elif donnees is not None:
+            corps = urlencode(donnees).encode()
+        requete = urlrequest.Request(self.base_url + url, data=corps, headers=entetes, method=methode)
+        try:
+            with self.opener.open(requete, timeout=60) as reponse:
+                reponse.read()
+                return reponse.status
+        except HTTPError as e:
+            e.read()
+            return e.code
+
+
+def executer(scenario, contexte, clients, sessions, requetes, echauffement):
+    """Run one scenario; clients[i] sends the requests of worker i concurrently."""
+    def travailleur(i, n):
+        durees, codes = [], Counter()
+        for _ in range(n):
+            methode, url, donnees = scenario.fabrique(contexte, sessions[i])
+            debut = time.perf_counter()
+            code = clients[i].envoyer(methode, url, donnees)
+            durees.append(time.perf_counter() - debut)
+            codes[code] += 1
+        return durees, codes
+
+    workers = len(clients)
+    parts = [requetes // workers + (1 if i < requetes % workers else 0) for i in range(workers)]
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(travailleur, range(workers), [max(1, echauffement // workers)] * workers))
+        debut = time.perf_counter()
+        resultats = list(pool.map(travailleur, range(workers), parts))
+        duree_totale = time.perf_counter() - debut
+    durees, codes = [], Counter()
+    for d, c in resultats:
+        durees.extend(d)
+        codes.update(c)
+    return resumer(durees, codes, duree_totale)
+
+
+class _RequetesSilencieuses(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def demarrer_serveur(app):
+    """Serve the app on a random local port (threaded werkzeug server); returns (url, serveur)."""
+    serveur = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_RequetesSilencieuses)
+    Thread(target=serveur.serve_forever, name='banc-http', daemon=True).start()
+    return f'http://127.0.0.1:{serveur.server_port}', serveur
+
+
+def comparer(resultats, reference, seuil, metrique='p95'):
+    """Scenarios whose metric grew by more than seuil (0.2 = +20 %) against the reference run.
+
+    Returns a list of (mode, scenario, reference, actuel).
+    """
+    regressions = []
+    for mode, scenarios in resultats['modes'].items():
+        for nom, mesure in scenarios.items():
+            avant = reference.get('modes', {}).get(mode, {}).get(nom)
+            if avant and avant[metrique] > 0 and mesure[metrique] > avant[metrique] * (1 + seuil):
+                regressions.append((mode, nom, avant[metrique], mesure[metrique]))
+    return regressions
@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+from statistics import median
+import time
+
+from models import db, rapports_model
+
+# Rapports d'occupation : reconstruction des agrégats, passage incrémental
+# sans changement, puis un an de rapports sur tous les médecins.
+
+
+def _chrono(fonction, repetitions):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    return round(1000 * median(durees), 2)
+
+
+def mesurer(app, repetitions=5, log=print):
+    """Median time (ms) of the rollup job and of year-long reports."""
+    fin = date.today()
+    debut = fin - timedelta(days=364)
+    silence = lambda message: None
+    resultats = {}
+    with app.app_context():
+        resultats['reconstruction'] = _chrono(lambda: rapports_model.actualiser(True, log=silence), 1)
+        resultats['actualisation sans changement'] = _chrono(lambda: rapports_model.actualiser(log=silence), repetitions)
+        rollup = rapports_model.RollupJournalier
+        resultats['lignes agrégées (un an)'] = db.session.query(db.func.count(rollup.jour))\
+            .filter(rollup.jour >= debut).scalar()
+        for par in ('specialite', 'medecin'):
+            resultats[f'rapports un an, par {par}'] = _chrono(
+                lambda: rapports_model.generer_rapports(debut, fin, par), repetitions)
+    for nom, valeur in resultats.items():
+        unite = '' if nom.startswith('lignes') else ' ms'
+        log(f'  {nom:34} {valeur:10}{unite}')
+    return resultats
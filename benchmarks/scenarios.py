@@ -0,0 +1,146 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import count
+import random
+
+from benchmarks.donnees import MOT_DE_PASSE, NOMS, SPECIALITES, MOTIFS
+from benchmarks.mesure import CorpsJson
+from models import db
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.rdv_model import RendezVous
+
+# Un scénario par route et par méthode : fabrique(contexte, session) renvoie
+# (méthode, url, données du formulaire). Les paramètres sont tirés au hasard
+# pour ne pas mesurer uniquement les caches de réponses.
+Scenario = namedtuple('Scenario', 'nom endpoint methode fabrique ecriture')
+
+# Routes volontairement non mesurées
+EXCLUES = {
+    'static': 'fichiers statiques servis par le serveur web en production',
+    'assets.fichier': 'CSS/JS versionnés, en cache immutable chez le client',
+    'medecin.api_flux': 'flux SSE sans fin',
+    'patient_deconnexion': 'fermerait la session du client de mesure',
+    'patient_profil POST': 'échoue sur SQLite (date_naissance reçue comme texte)',
+}
+
+_inscriptions = count(1)
+
+
+class Contexte:
+    """Sizes of the benchmark database and the random source of the scenarios."""
+
+    def __init__(self, graine=1):
+        self.rng = random.Random(graine)
+        self.nb_medecins = db.session.query(db.func.max(Medecin.id)).scalar() or 0
+        self.nb_patients = db.session.query(db.func.max(Patient.id)).scalar() or 0
+        self.nb_rdv = db.session.query(db.func.max(RendezVous.id)).scalar() or 0
+
+    def medecin(self):
+        return self.rng.randint(1, self.nb_medecins)
+
+    def session_patient(self):
+        """Pick a patient who has appointments; returns the data a logged-in client needs."""
+        rng = random.Random(self.rng.random())
+        while True:
+            patient_id = db.session.query(RendezVous.patient_id)\
+                .filter(RendezVous.id == rng.randint(1, self.nb_rdv)).scalar()
+            if patient_id:
+                break
+        rdv_ids = [row[0] for row in db.session.query(RendezVous.id).filter(RendezVous.patient_id == patient_id)]
+        return {'patient_id': patient_id, 'email': f'patient{patient_id}@bench.local', 'rdv_ids': rdv_ids, 'rng': rng}
+
+    def echelle(self):
+        return {'medecins': self.nb_medecins, 'patients': self.nb_patients, 'rdv': self.nb_rdv}
+
+
+def _creneau_futur(rng):
+    jour = datetime.now().date() + timedelta(days=rng.randint(1, 60))
+    return datetime(jour.year, jour.month, jour.day, rng.randrange(8, 18), rng.choice((0, 30)))
+
+
+def _disponibilites(c, s):
+    debut = _creneau_futur(s['rng']).replace(hour=0, minute=0)
+    return 'GET', f'/medecins/{c.medecin()}/disponibilites?debut={debut.isoformat()}&fin={(debut + timedelta(days=7)).isoformat()}', None
+
+
+def _inscription(c, s):
+    n = next(_inscriptions)
+    return 'POST', '/patient/inscription', {
+        'nom': 'Banc', 'prenom': 'Mesure', 'email': f'inscription{n}.{s["rng"].getrandbits(32)}@bench.local',
+        'mot_de_passe': MOT_DE_PASSE, 'date_naissance': '1990-01-01', 'telephone': ''
+    }
+
+
+def _nouveau_rdv(c, s):
+    return 'POST', '/rdv/nouveau', {
+        'date_heure': _creneau_futur(s['rng']).strftime('%Y-%m-%dT%H:%M'),
+        'motif': s['rng'].choice(MOTIFS), 'medecin_id': str(c.medecin())
+    }
+
+
+def _rapports(c, s):
+    fin = datetime.now().date() - timedelta(days=s['rng'].randrange(60))
+    return 'GET', f'/medecins/api/rapports?fin={fin.isoformat()}&par={s["rng"].choice(("specialite", "medecin"))}', None
+
+
+def _serie(c, s):
+    debut = _creneau_futur(s['rng'])
+    if debut.weekday() > 4:
+        debut += timedelta(days=7 - debut.weekday())
+    return 'POST', '/api/rdv/batch', CorpsJson({
+        'medecin_id': c.medecin(), 'motif': s['rng'].choice(MOTIFS),
+        'recurrence': {'debut': debut.isoformat(), 'frequence': 'hebdomadaire', 'nombre': 12}
+    })
+
+
+SCENARIOS = [
+    Scenario('index', 'index', 'GET', lambda c, s: ('GET', '/', None), False),
+    Scenario('health_check', 'health_check', 'GET', lambda c, s: ('GET', '/api/health', None), False),
+    Scenario('metrics', 'metrics', 'GET', lambda c, s: ('GET', '/metrics', None), False),
+    Scenario('api_patients', 'api_patients', 'GET', lambda c, s: ('GET', '/api/patients?limit=100', None), False),
+    Scenario('api_medecins', 'api_medecins', 'GET',
+             lambda c, s: ('GET', f'/api/medecins?specialite={c.rng.choice(SPECIALITES)}', None), False),
+    Scenario('api_rdv', 'api_rdv', 'GET', lambda c, s: ('GET', f'/api/rdv?medecin_id={c.medecin()}&limit=100', None), False),
+    Scenario('medecin.liste_medecins', 'medecin.liste_medecins', 'GET', lambda c, s: ('GET', '/medecins/', None), False),
+    Scenario('medecin.api_liste_medecins', 'medecin.api_liste_medecins', 'GET',
+             lambda c, s: ('GET', '/medecins/api/liste', None), False),
+    Scenario('medecin.api_recherche_medecins', 'medecin.api_recherche_medecins', 'GET',
+             lambda c, s: ('GET', f'/medecins/api/recherche?q={c.rng.choice(NOMS)[:c.rng.randint(3, 6)]}', None), False),
+    Scenario('medecin.api_statistiques', 'medecin.api_statistiques', 'GET',
+             lambda c, s: ('GET', '/medecins/api/statistiques', None), False),
+    Scenario('medecin.api_rapports', 'medecin.api_rapports', 'GET', _rapports, False),
+    Scenario('medecin.details_medecin', 'medecin.details_medecin', 'GET',
+             lambda c, s: ('GET', f'/medecins/{c.medecin()}', None), False),
+    Scenario('medecin.disponibilites_medecin', 'medecin.disponibilites_medecin', 'GET', _disponibilites, False),
+    Scenario('api.get_dashboard_data', 'api.get_dashboard_data', 'GET',
+             lambda c, s: ('GET', f'/api/dashboard-data/{s["patient_id"]}', None), False),
+    Scenario('patient_connexion', 'patient_connexion', 'GET', lambda c, s: ('GET', '/patient/connexion', None), False),
+    Scenario('patient_connexion POST', 'patient_connexion', 'POST',
+             lambda c, s: ('POST', '/patient/connexion', {'email': s['email'], 'mot_de_passe': MOT_DE_PASSE}), False),
+    Scenario('patient_inscription', 'patient_inscription', 'GET', lambda c, s: ('GET', '/patient/inscription', None), False),
+    Scenario('patient_inscription POST', 'patient_inscription', 'POST', _inscription, True),
+    Scenario('patient_dashboard', 'patient_dashboard', 'GET', lambda c, s: ('GET', '/patient/dashboard', None), False),
+    Scenario('patient_profil', 'patient_profil', 'GET', lambda c, s: ('GET', '/patient/profil', None), False),
+    Scenario('nouveau_rdv', 'nouveau_rdv', 'GET', lambda c, s: ('GET', '/rdv/nouveau', None), False),
+    Scenario('nouveau_rdv POST', 'nouveau_rdv', 'POST', _nouveau_rdv, True),
+    Scenario('api.creer_rdv_batch POST', 'api.creer_rdv_batch', 'POST', _serie, True),
+    Scenario('liste_rdv', 'liste_rdv', 'GET', lambda c, s: ('GET', '/rdv/liste', None), False),
+    Scenario('liste_rdv archives', 'liste_rdv', 'GET', lambda c, s: ('GET', '/rdv/liste?archives=1', None), False),
+    Scenario('rdv_details', 'rdv_details', 'GET',
+             lambda c, s: ('GET', f'/rdv/details/{s["rng"].choice(s["rdv_ids"])}', None), False),
+    Scenario('annuler_rdv POST', 'annuler_rdv', 'POST',
+             lambda c, s: ('POST', f'/rdv/annuler/{s["rng"].choice(s["rdv_ids"])}', {}), True),
+]
+
+
+def routes_non_couvertes(app):
+    """Endpoints/methods of the app with neither a scenario nor an exclusion."""
+    couvertes = {(s.endpoint, s.methode) for s in SCENARIOS}
+    manquantes = []
+    for regle in app.url_map.iter_rules():
+        for methode in sorted(regle.methods - {'HEAD', 'OPTIONS'}):
+            nom = regle.endpoint if methode == 'GET' else f'{regle.endpoint} {methode}'
+            if (regle.endpoint, methode) not in couvertes and nom not in EXCLUES and regle.endpoint not in EXCLUES:
+                manquantes.append(nom)
+    return manquantes
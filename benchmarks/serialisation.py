@@ -0,0 +1,64 @@
+from statistics import median
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from controllers.serialisation import FournisseurJSON
+from models import db
+from models.projection import as_dicts, query_columns
+from models.rdv_model import RDV_COLUMNS, RendezVous
+
+# Sérialisation d'une liste de rendez-vous : chemin d'origine (entités ORM
+# copiées dans des dicts, jsonify standard) contre projection sur des tuples
+# et encodeur orjson, avec et sans ?fields=.
+
+
+def _entites(lignes):
+    rdvs = RendezVous.query.order_by(RendezVous.id).limit(lignes).all()
+    return [{cle: getattr(rdv, cle) for cle in RDV_COLUMNS} for rdv in rdvs]
+
+
+def _mapping(lignes):
+    return [dict(row._mapping) for row in query_columns(RDV_COLUMNS).order_by(RendezVous.id).limit(lignes)]
+
+
+def _tuples(lignes, fields=None):
+    return as_dicts(query_columns(RDV_COLUMNS, fields).order_by(RendezVous.id).limit(lignes))
+
+
+def chemins(app):
+    standard, rapide = DefaultJSONProvider(app), FournisseurJSON(app)
+    return [
+        ('entités ORM + jsonify', _entites, standard),
+        ('projection + jsonify', _mapping, standard),
+        ('projection + orjson', _tuples, rapide),
+        ('fields=id,date_heure + orjson', lambda n: _tuples(n, ('id', 'date_heure')), rapide),
+    ]
+
+
+def mesurer(app, lignes=10000, repetitions=15, log=print):
+    """Median time (ms) to build then encode `lignes` rows, for each path."""
+    resultats = {}
+    with app.test_request_context():
+        for nom, construire, fournisseur in chemins(app):
+            durees_requete, durees_encodage = [], []
+            for _ in range(repetitions):
+                db.session.expunge_all()
+                debut = time.perf_counter()
+                donnees = construire(lignes)
+                milieu = time.perf_counter()
+                corps = fournisseur.response(donnees).get_data()
+                fin = time.perf_counter()
+                durees_requete.append(milieu - debut)
+                durees_encodage.append(fin - milieu)
+            resultats[nom] = {
+                'lignes': len(donnees),
+                'requete': round(1000 * median(durees_requete), 2),
+                'encodage': round(1000 * median(durees_encodage), 2),
+                'total': round(1000 * median(a + b for a, b in zip(durees_requete, durees_encodage)), 2),
+                'octets': len(corps),
+            }
+            m = resultats[nom]
+            log(f"  {nom:32} {m['lignes']:6d} lignes  requête {m['requete']:8.2f} ms  "
+                f"encodage {m['encodage']:8.2f} ms  total {m['total']:8.2f} ms  {m['octets']:9d} octets")
+    return resultats
@@ -1,6 +1,16 @@
 import os
+import tempfile
 
-SECRET_KEY = os.urandom(24)
+# Clé de signature des sessions : identique pour tous les workers et stable entre
+# deux démarrages (sinon create_app en génère une dans instance/secret_key)
+SECRET_KEY = os.environ.get('SECRET_KEY')
+
+# Sessions côté serveur, partagées par les workers d'une machine (le cookie ne porte qu'un identifiant signé)
+SESSIONS_STOCKAGE = os.environ.get('SESSIONS_STOCKAGE', 'sqlite')  # 'sqlite' (fichier partagé) ou 'memoire' (un seul processus)
+SESSIONS_FICHIER = os.environ.get('SESSIONS_FICHIER', os.path.join(tempfile.gettempdir(), 'rdv_m_sessions.sqlite3'))
+SESSIONS_CACHE_TTL = 10  # secondes : retard maximal d'un worker sur une session supprimée par un autre (déconnexion)
+SESSIONS_CACHE_MAX = 10000  # sessions gardées en mémoire par worker
+SESSIONS_PURGE_INTERVALLE = 300  # secondes entre deux purges des sessions expirées (par worker)
 
 # Configuration MariaDB
 DB_CONFIG = {
@@ -12,7 +22,127 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# Pool de connexions (MariaDB)
+DB_POOL = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+    'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # secondes d'attente d'une connexion libre
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),  # sous le wait_timeout du serveur
+    'pool_pre_ping': True  # évite "MySQL server has gone away" après une période d'inactivité
+}
+
+def engine_options(uri):
+    """Options de create_engine selon la base (le pool ne concerne que MariaDB)"""
+    if uri.startswith('mysql'):
+        return dict(DB_POOL)
+    return {'pool_pre_ping': True}
+
 # Configuration SQLAlchemy
-SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}?charset={DB_CONFIG['charset']}"
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL',
+    f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}?charset={DB_CONFIG['charset']}"
+)
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Réplica en lecture (optionnel), ex. REPLICA_DATABASE_URL=mysql+pymysql://lecteur@replica/rdv_m
+REPLICA_DATABASE_URI = os.environ.get('REPLICA_DATABASE_URL')
+SQLALCHEMY_BINDS = {}
+if REPLICA_DATABASE_URI:
+    SQLALCHEMY_BINDS['replica'] = {'url': REPLICA_DATABASE_URI, **engine_options(REPLICA_DATABASE_URI)}
+# Routes GET servies par le réplica
+REPLICA_ROUTES = ('/api/', '/medecins/api/', '/patient/dashboard')
+REPLICA_LAG_MAX = 5  # secondes pendant lesquelles un utilisateur relit le primaire après une écriture
+
+
+# Disponibilités des médecins
+HEURE_OUVERTURE = 8
+HEURE_FERMETURE = 18
+JOURS_OUVRES = (0, 1, 2, 3, 4)  # lundi à vendredi
+DISPONIBILITE_TTL = 300  # secondes avant reconstruction de l'index d'un médecin
+
+# API de listes (/api/patients, /api/medecins, /api/rdv)
+API_PAGE_SIZE = 100  # taille de page par défaut
+API_PAGE_MAX = 1000  # taille de page maximale
+API_STREAM_CHUNK = 500  # lignes lues et envoyées par paquet en mode flux
+
+# Recherche de médecins
+RECHERCHE_TTL = 600  # secondes avant reconstruction complète de l'index
+
+# Statistiques de l'annuaire des médecins
+STATISTIQUES_RECONCILIATION = 300  # secondes entre deux recalculs complets depuis la base
+
+# Flux temps réel (Server-Sent Events) de l'annuaire
+FLUX_JOURNAL = os.path.join(tempfile.gettempdir(), 'rdv_m_flux.sqlite3')  # journal partagé entre workers
+FLUX_INTERVALLE = 1  # secondes entre deux lectures du journal
+FLUX_RETENTION = 3600  # secondes de conservation des événements
+FLUX_HEARTBEAT = 15  # secondes entre deux commentaires de maintien de connexion
+FLUX_MAX_ABONNES = 200  # connexions SSE simultanées par worker
+
+# Réponses conditionnelles (ETag / Last-Modified)
+CACHE_REPONSES_MAX = 256  # corps JSON sérialisés gardés en mémoire (par URL)
+
+# Feuilles de style et scripts construits (flask --app app assets-construire) et compression
+ASSETS_DOSSIER = 'build'  # sous static/ : fichiers versionnés, variantes .gz/.br et manifest.json
+ASSETS_DUREE_CACHE = 31536000  # secondes (max-age des fichiers versionnés, immutable)
+ASSETS_GZIP_NIVEAU = 6  # niveau gzip des réponses JSON compressées à la volée
+JSON_GZIP_SEUIL = int(os.environ.get('JSON_GZIP_SEUIL', 1024))  # octets : corps JSON plus petits envoyés tels quels
+
+# Import / export en masse (flask --app app donnees-importer / donnees-exporter)
+IMPORT_TAILLE_LOT = int(os.environ.get('IMPORT_TAILLE_LOT', 1000))  # lignes par INSERT multiple (et par commit)
+EXPORT_TAILLE_LOT = int(os.environ.get('EXPORT_TAILLE_LOT', 1000))  # lignes lues par paquet du curseur serveur
+
+# Hachage des mots de passe (pool dédié, hors des threads de requête)
+HASH_METHODE = os.environ.get('HASH_METHODE', 'pbkdf2:sha256:600000')  # méthode werkzeug ; les anciens hashs sont mis à niveau à la connexion
+HASH_LONGUEUR_SEL = int(os.environ.get('HASH_LONGUEUR_SEL', 16))
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 2))  # hachages simultanés par processus
+HASH_FILE_MAX = int(os.environ.get('HASH_FILE_MAX', 64))  # demandes en attente au-delà desquelles on refuse
+HASH_ATTENTE_MAX = 10  # secondes d'attente maximale d'un résultat
+
+# Profilage des requêtes et /metrics (format texte Prometheus)
+PROFILAGE_ACTIF = os.environ.get('PROFILAGE_ACTIF', '1') == '1'
+PROFILAGE_BUDGET_SQL = int(os.environ.get('PROFILAGE_BUDGET_SQL', 20))  # instructions SQL par requête HTTP au-delà desquelles elle est signalée
+PROFILAGE_SQL_LENTE = float(os.environ.get('PROFILAGE_SQL_LENTE', 0.1))  # secondes : instruction journalisée avec ses paramètres
+
+# Réservations (verrou par médecin et par jour, clés d'idempotence)
+RESERVATION_TENTATIVES = 5  # essais d'une réservation en cas de contention
+RESERVATION_ATTENTE = 0.02  # secondes, attente de base entre deux essais (doublée à chaque essai)
+IDEMPOTENCE_RETENTION = 86400  # secondes de conservation des clés Idempotency-Key
+IDEMPOTENCE_PURGE = 3600  # secondes : une tâche de purge des clés expirées par tranche
+RDV_LOT_MAX = 52  # occurrences au plus par appel de /api/rdv/batch
+
+# Cache des fragments HTML (page détail d'un médecin), par worker
+FRAGMENTS_TAILLE_MAX = 8 * 1024 * 1024  # octets de HTML gardés au plus (éviction LRU au-delà)
+FRAGMENTS_TTL = 60  # secondes : borne le retard sur les écritures faites par les autres workers
+
+# Cache des patients et des médecins (lectures par id, liste des médecins), par worker
+ENTITES_TAILLE_MAX = 20000  # enregistrements gardés au plus (éviction LRU au-delà)
+ENTITES_TTL = 300  # secondes : borne le retard sur les écritures faites hors de l'application
+ENTITES_SIGNAL = os.path.join(tempfile.gettempdir(), 'rdv_m_entites.sqlite3')  # invalidations partagées entre workers
+ENTITES_SIGNAL_INTERVALLE = 0.5  # secondes : retard maximal d'un worker sur une écriture d'un autre
+ENTITES_SIGNAL_RETENTION = 3600  # secondes de conservation des invalidations
+
+# Rapports d'occupation (agrégats journaliers rdv_daily_rollup)
+RAPPORTS_MARGE = 300  # secondes relues avant le dernier updated_at agrégé (transactions validées en retard)
+RAPPORTS_JOURS_INCREMENTAL = 90  # jours modifiés au-delà desquels l'actualisation reconstruit tout
+RAPPORTS_PERIODE_MAX = 1100  # jours couverts au plus par un rapport
+
+# Archivage des rendez-vous terminés ou annulés (flask --app app rdv-archiver)
+ARCHIVE_HORIZON = int(os.environ.get('ARCHIVE_HORIZON', 365))  # jours après la date du rendez-vous
+ARCHIVE_TAILLE_LOT = 500  # lignes déplacées par transaction (verrous courts)
+ARCHIVE_PAUSE = 0.05  # secondes entre deux lots, pour laisser passer les réservations
+
+# Tâches de fond (table taches ; flask --app app taches-worker)
+TACHES_EXECUTEUR_WEB = os.environ.get('TACHES_EXECUTEUR_WEB', '0') == '1'  # sans processus taches-worker : chaque worker web exécute aussi des tâches, une à la fois
+TACHES_WORKERS = int(os.environ.get('TACHES_WORKERS', 2))  # tâches exécutées en même temps par processus
+TACHES_TENTATIVES = 5  # essais avant l'état 'echec'
+TACHES_ATTENTE = 10  # secondes avant le 2e essai (doublées à chaque essai, avec gigue)
+TACHES_INTERVALLE = 1  # secondes : tic de la roue et lecture des nouvelles tâches
+TACHES_HORIZON = 3600  # secondes d'échéances futures gardées en mémoire par processus
+TACHES_BALAYAGE = 60  # secondes entre deux relectures des tâches échues (filet de sécurité) et purges
+TACHES_DELAI_VERROU = 600  # secondes après lesquelles une tâche 'en_cours' d'un processus arrêté est reprise
+TACHES_RETENTION = 7 * 86400  # secondes de conservation des tâches terminées
+TACHES_LOT = 500  # lignes lues ou purgées par requête
+RAPPEL_AVANCE = 86400  # secondes entre le rappel et le rendez-vous
+RAPPEL_MINIMUM = 3600  # pas de rappel pour un rendez-vous plus proche que cela
+RAPPORTS_DELAI = 60  # secondes : agrégats actualisés au plus une fois par tranche après des réservations
@@ -1,5 +1,9 @@
-from flask import Blueprint, jsonify, session
-from models import rdv_model, patient_model
+from flask import Blueprint, jsonify, request, session
+from models import rdv_model, patient_model, reservation_model
+from models.medecin_model import get_medecin_by_id
+from models.projection import parse_fields
+from models.reservation_model import ResultatReservation
+from config import RDV_LOT_MAX
 from datetime import datetime
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -12,25 +16,19 @@ def get_dashboard_data(patient_id):
             return jsonify({'error': 'Unauthorized'}), 401
         
         # Get patient info
-        patient = patient_model.get_patient_by_id(patient_id)
+        patient = patient_model.get_patient_by_id(patient_id, fields=('id', 'nom', 'prenom', 'email'))
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
         
-        # Get all appointments for this patient
-        rendez_vous = rdv_model.get_rdv_by_patient_id(patient_id)
-        
-        # Calculate statistics
-        total_rdv = len(rendez_vous)
-        rdv_programmes = len([rdv for rdv in rendez_vous if rdv['statut'] == 'Programmé'])
-        rdv_termines = len([rdv for rdv in rendez_vous if rdv['statut'] == 'termine'])
-        rdv_annules = len([rdv for rdv in rendez_vous if rdv['statut'] == 'annule'])
-        
-        # Get upcoming appointments (next 3)
-        rdv_futurs = [rdv for rdv in rendez_vous if rdv['statut'] == 'Programmé']
-        rdv_futurs_sorted = sorted(rdv_futurs, key=lambda x: x['date_heure'])[:3]
-        
-        # Get recent activity (last 5 appointments)
-        rdv_recents = sorted(rendez_vous, key=lambda x: x['date_heure'], reverse=True)[:5]
+        # Constant work per request, whatever the patient's history:
+        # one GROUP BY statut and two ORDER BY date_heure LIMIT n queries.
+        statistiques = rdv_model.get_dashboard_statistics(patient_id)
+        # ?fields=id,date_heure,... : colonnes des rendez-vous renvoyés
+        fields = parse_fields(request.args.get('fields'))
+        rdv_futurs_sorted = rdv_model.get_upcoming_rdv(patient_id, limit=3, fields=fields)
+        # ?archives=1 : complète l'activité récente avec les rendez-vous archivés
+        rdv_recents = rdv_model.get_recent_rdv(patient_id, limit=5, fields=fields,
+                                               archives=request.args.get('archives') == '1')
         
         return jsonify({
             'success': True,
@@ -40,12 +38,7 @@ def get_dashboard_data(patient_id):
                 'prenom': patient['prenom'],
                 'email': patient['email']
             },
-            'statistics': {
-                'total_rdv': total_rdv,
-                'rdv_programmes': rdv_programmes,
-                'rdv_termines': rdv_termines,
-                'rdv_annules': rdv_annules
-            },
+            'statistics': statistiques,
             'upcoming_appointments': rdv_futurs_sorted,
             'recent_activity': rdv_recents,
             'last_updated': datetime.now().isoformat()
@@ -53,3 +46,65 @@ def get_dashboard_data(patient_id):
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def _lire_date(valeur):
+    date_heure = datetime.fromisoformat(valeur)
+    if date_heure.tzinfo is not None:
+        raise ValueError(f'date locale attendue, sans fuseau : {valeur}')
+    return date_heure
+
+
+@api_bp.route('/rdv/batch', methods=['POST'])
+def creer_rdv_batch():
+    """Create a series of appointments in one transaction, with a per-occurrence report.
+
+    JSON body: medecin_id, motif, duree (30), occurrences (list of dates)
+    and/or recurrence {debut, frequence, nombre, intervalle}, tout_ou_rien.
+    """
+    if 'patient_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    donnees = request.get_json(silent=True)
+    if not isinstance(donnees, dict):
+        return jsonify({'error': 'Corps JSON attendu'}), 400
+    try:
+        medecin_id = int(donnees['medecin_id'])
+        duree = int(donnees.get('duree', 30))
+        if not 0 < duree <= 24 * 60:
+            raise ValueError(f'durée invalide : {duree}')
+        dates = [_lire_date(valeur) for valeur in donnees.get('occurrences', [])]
+        recurrence = donnees.get('recurrence')
+        if recurrence:
+            nombre = int(recurrence['nombre'])
+            if not 0 < nombre <= RDV_LOT_MAX:
+                raise ValueError(f'nombre d\'occurrences invalide : {nombre}')
+            dates += reservation_model.developper_recurrence(
+                _lire_date(recurrence['debut']), recurrence.get('frequence', 'hebdomadaire'),
+                nombre, max(1, int(recurrence.get('intervalle', 1))))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Requête invalide : {e}'}), 400
+    if not dates or len(dates) > RDV_LOT_MAX:
+        return jsonify({'error': f'Entre 1 et {RDV_LOT_MAX} occurrences par appel'}), 400
+    if not get_medecin_by_id(medecin_id, fields=('id',)):
+        return jsonify({'error': 'Medecin not found'}), 404
+
+    try:
+        rapport = reservation_model.reserver_serie(session['patient_id'], medecin_id, dates,
+                                                   donnees.get('motif', ''), duree,
+                                                   bool(donnees.get('tout_ou_rien')))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    crees = sum(1 for _, resultat, _ in rapport if resultat == ResultatReservation.CREE)
+    if any(resultat == ResultatReservation.SATURE for _, resultat, _ in rapport):
+        code = 503
+    else:
+        code = 201 if crees else 409
+    return jsonify({
+        'success': crees > 0,
+        'crees': crees,
+        'refuses': len(rapport) - crees,
+        'occurrences': [{'date_heure': date_heure.isoformat(), 'resultat': resultat, 'rdv_id': rdv_id}
+                        for date_heure, resultat, rdv_id in rapport],
+    }), code
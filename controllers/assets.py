@@ -0,0 +1,267 @@
+from hashlib import sha256
+import gzip
+import json
+import os
+import re
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+from config import ASSETS_DOSSIER, ASSETS_DUREE_CACHE, ASSETS_GZIP_NIVEAU, JSON_GZIP_SEUIL
+
+try:
+    import brotli
+except ImportError:  # dépendance facultative : pas de variantes .br
+    brotli = None
+
+# Feuilles de style et scripts des templates : les sources sont dans static/
+# (css/, js/) ; `flask --app app assets-construire` les minifie, les écrit
+# sous static/<ASSETS_DOSSIER>/ avec l'empreinte du contenu dans le nom et
+# leurs variantes .gz (et .br si le module brotli est installé), plus un
+# manifeste source -> fichier construit. asset_url() dans les templates
+# renvoie l'URL du fichier construit, servi par /assets/ avec
+# Cache-Control: immutable ; sans manifeste, celle de la source sous /static/.
+
+EXTENSIONS = ('.css', '.js')
+MANIFESTE = 'manifest.json'
+
+# Encodages précompressés, par ordre de préférence : (Content-Encoding, suffixe)
+ENCODAGES = (('br', '.br'), ('gzip', '.gz'))
+
+assets_bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+
+def minifier_css(texte):
+    """Drop comments and the whitespace that CSS does not need."""
+    texte = re.sub(r'/\*.*?\*/', '', texte, flags=re.S)
+    texte = re.sub(r'\s+', ' ', texte)
+    texte = re.sub(r'\s*([{};,>])\s*', r'\1', texte)
+    texte = re.sub(r':\s+', ':', texte)
+    return texte.replace(';}', '}').strip()
+
+
+_MOT = re.compile(r'[\w$]')
+
+
+def _avant_regex(fin_sortie, precedent):
+    """Whether a '/' after this output starts a regex literal rather than a division."""
+    if precedent == '' or precedent in '(,=:[!&|?{};+-*%<>~^':
+        return True
+    return re.search(r'\b(return|typeof|case|in|of)\s*$', fin_sortie) is not None
+
+
+def minifier_js(texte):
+    """Drop comments, indentation and blank lines; strings, template literals and regexes are kept as is.
+
+    Line breaks are kept (one per non-empty line), so automatic semicolon
+    insertion behaves as in the source.
+    """
+    sortie = []
+    i, n = 0, len(texte)
+
+    def precedent():
+        for morceau in reversed(sortie):
+            if morceau.strip():
+                return morceau.rstrip()[-1]
+        return ''
+
+    while i < n:
+        c = texte[i]
+        if c in '\'"`':
+            j = i + 1
+            while j < n and texte[j] != c:
+                j += 2 if texte[j] == '\\' else 1
+            sortie.append(texte[i:j + 1])
+            i = j + 1
+        elif texte.startswith('//', i):
+            i = texte.find('\n', i)
+            i = n if i < 0 else i
+        elif texte.startswith('/*', i):
+            fin = texte.find('*/', i + 2)
+            i = n if fin < 0 else fin + 2
+        elif c == '/' and _avant_regex(''.join(sortie[-3:]), precedent()):
+            # Expression régulière littérale (une division suit un opérande)
+            j, classe = i + 1, False
+            while j < n and (texte[j] != '/' or classe):
+                if texte[j] == '\\':
+                    j += 1
+                elif texte[j] in '[]':
+                    classe = texte[j] == '['
+                j += 1
+            sortie.append(texte[i:j + 1])
+            i = j + 1
+        elif c.isspace():
+            j = i
+            while j < n and texte[j].isspace():
+                j += 1
+            avant = sortie[-1][-1] if sortie and sortie[-1] else ''
+            apres = texte[j] if j < n else ''
+            if '\n' in texte[i:j]:
+                if avant and avant != '\n':
+                    sortie.append('\n')
+            elif (_MOT.match(avant) and _MOT.match(apres)) or (avant in '+-' and apres in '+-' and avant):
+                sortie.append(' ')
+            i = j
+        else:
+            sortie.append(c)
+            i += 1
+    return ''.join(sortie).strip() + '\n'
+
+
+MINIFICATEURS = {'.css': minifier_css, '.js': minifier_js}
+
+
+def _sources(dossier_static):
+    """Paths (relative to static/, with forward slashes) of the CSS and JS sources."""
+    for racine, dossiers, fichiers in os.walk(dossier_static):
+        dossiers[:] = sorted(d for d in dossiers if os.path.join(racine, d) != os.path.join(dossier_static, ASSETS_DOSSIER))
+        for fichier in sorted(fichiers):
+            if fichier.endswith(EXTENSIONS):
+                yield os.path.relpath(os.path.join(racine, fichier), dossier_static).replace(os.sep, '/')
+
+
+def _ecrire(chemin, contenu):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    with open(chemin, 'wb') as fichier:
+        fichier.write(contenu)
+
+
+def construire(dossier_static, nettoyer=False, log=print):
+    """Minify, fingerprint and precompress every source; returns the manifest.
+
+    Each entry maps a source path to its built file and sizes in bytes:
+    {'fichier', 'source', 'minifie', 'gzip', 'br'} ('br' is None without
+    the brotli module). Files of earlier builds are kept, for the workers
+    still running with the previous manifest, unless `nettoyer` is set.
+    """
+    sortie = os.path.join(dossier_static, ASSETS_DOSSIER)
+    manifeste = {}
+    for source in _sources(dossier_static):
+        base, extension = os.path.splitext(source)
+        with open(os.path.join(dossier_static, source), encoding='utf-8') as fichier:
+            texte = fichier.read()
+        contenu = MINIFICATEURS[extension](texte).encode()
+        nom = f'{base}.{sha256(contenu).hexdigest()[:12]}{extension}'
+        chemin = os.path.join(sortie, nom)
+        compresse = gzip.compress(contenu, compresslevel=9, mtime=0)
+        _ecrire(chemin, contenu)
+        _ecrire(chemin + '.gz', compresse)
+        if brotli is not None:
+            _ecrire(chemin + '.br', brotli.compress(contenu, quality=11))
+        manifeste[source] = {
+            'fichier': nom,
+            'source': len(texte.encode()),
+            'minifie': len(contenu),
+            'gzip': len(compresse),
+            'br': os.path.getsize(chemin + '.br') if brotli is not None else None,
+        }
+        log(f'  {source:28} -> {nom}')
+    _ecrire(os.path.join(sortie, MANIFESTE), json.dumps(manifeste, indent=2).encode())
+
+    if not nettoyer:
+        return manifeste
+    # Anciennes versions : plus référencées par le manifeste
+    gardes = {os.path.normpath(os.path.join(sortie, entree['fichier'])) for entree in manifeste.values()}
+    for racine, _, fichiers in os.walk(sortie):
+        for fichier in fichiers:
+            chemin = os.path.join(racine, fichier)
+            if fichier != MANIFESTE and re.sub(r'\.(gz|br)$', '', os.path.normpath(chemin)) not in gardes:
+                os.remove(chemin)
+                log(f'  supprimé : {os.path.relpath(chemin, sortie)}')
+    return manifeste
+
+
+def charger_manifeste(dossier_static):
+    """Manifest of the last build, or {} when the assets were not built."""
+    try:
+        with open(os.path.join(dossier_static, ASSETS_DOSSIER, MANIFESTE), encoding='utf-8') as fichier:
+            return json.load(fichier)
+    except FileNotFoundError:
+        return {}
+
+
+def poids_templates(dossier_templates, manifeste):
+    """Assets loaded by each template through asset_url(), its parents' included ({% extends %}).
+
+    Returns {template: {source: manifest entry}} for the templates that
+    load at least one built asset.
+    """
+    references, parents = {}, {}
+    for racine, _, fichiers in os.walk(dossier_templates):
+        for fichier in fichiers:
+            chemin = os.path.join(racine, fichier)
+            nom = os.path.relpath(chemin, dossier_templates).replace(os.sep, '/')
+            with open(chemin, encoding='utf-8') as f:
+                texte = f.read()
+            references[nom] = re.findall(r"asset_url\('([^']+)'\)", texte)
+            parent = re.search(r'{%\s*extends\s+["\']([^"\']+)["\']', texte)
+            parents[nom] = parent.group(1) if parent else None
+
+    resultat = {}
+    for nom in sorted(references):
+        sources, courant = [], nom
+        while courant is not None:
+            sources = references.get(courant, []) + sources
+            courant = parents.get(courant)
+        entrees = {source: manifeste[source] for source in sources if source in manifeste}
+        if entrees:
+            resultat[nom] = entrees
+    return resultat
+
+
+def asset_url(source):
+    """URL of a CSS/JS source: its fingerprinted build when there is one, the source itself otherwise."""
+    entree = current_app.extensions['assets'].get(source)
+    if entree is None:
+        return url_for('static', filename=source)
+    return url_for('assets.fichier', nom=entree['fichier'])
+
+
+@assets_bp.route('/<path:nom>')
+def fichier(nom):
+    """Fichier construit, précompressé selon Accept-Encoding ; son nom change avec son contenu"""
+    if not nom.endswith(EXTENSIONS):
+        abort(404)
+    dossier = os.path.join(current_app.static_folder, ASSETS_DOSSIER)
+    for encodage, suffixe in ENCODAGES:
+        if request.accept_encodings[encodage] and os.path.isfile(os.path.join(dossier, nom + suffixe)):
+            response = send_from_directory(dossier, nom + suffixe, mimetype=_mimetype(nom), max_age=ASSETS_DUREE_CACHE)
+            response.headers['Content-Encoding'] = encodage
+            break
+    else:
+        response = send_from_directory(dossier, nom, max_age=ASSETS_DUREE_CACHE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _mimetype(nom):
+    return 'text/css' if nom.endswith('.css') else 'text/javascript'
+
+
+def compresser_json(response):
+    """after_request: gzip JSON bodies of at least JSON_GZIP_SEUIL bytes when the client accepts it"""
+    if (response.status_code != 200 or response.mimetype != 'application/json' or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+    corps = response.get_data()
+    if len(corps) < current_app.config.get('JSON_GZIP_SEUIL', JSON_GZIP_SEUIL):
+        return response
+    response.set_data(gzip.compress(corps, compresslevel=ASSETS_GZIP_NIVEAU, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    # Autre représentation du même contenu : l'ETag devient faible
+    etag, faible = response.get_etag()
+    if etag and not faible:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_assets(app):
+    """Register /assets/, asset_url() for the templates and the gzip of JSON responses."""
+    app.extensions['assets'] = charger_manifeste(app.static_folder)
+    app.register_blueprint(assets_bp)
+    app.add_template_global(asset_url)
+    app.after_request(compresser_json)
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from datetime import timezone
+from hashlib import sha1
+from threading import Lock
+
+from flask import Response, request
+
+from config import CACHE_REPONSES_MAX
+
+# Corps déjà sérialisés, par URL et par version : (etag, corps, en-têtes)
+_corps = OrderedDict()
+_lock = Lock()
+
+# En-têtes de la réponse d'origine conservés avec le corps
+EN_TETES_CACHES = ('Content-Type', 'Link', 'X-Next-Cursor')
+
+
+def reponse_conditionnelle(version, construire):
+    """Answer a GET from a data version, with ETag / Last-Modified.
+
+    `version` is (marker, MAX(updated_at)) from get_table_version.
+    Returns 304 when the client already has this version; otherwise reuses
+    the body serialized for this URL and version, or calls `construire()`
+    (which returns a Response) and keeps its body for the next request.
+    """
+    marque, derniere_modif = version
+    etag = sha1(f'{request.full_path}|{marque}|{derniere_modif}'.encode()).hexdigest()[:20]
+    if derniere_modif is not None:
+        derniere_modif = derniere_modif.replace(microsecond=0, tzinfo=timezone.utc)
+
+    if request.if_none_match:
+        # Comparaison faible : l'ETag devient W/"..." quand le corps est compressé (controllers/assets.py)
+        non_modifie = request.if_none_match.contains_weak(etag)
+    else:
+        non_modifie = (derniere_modif is not None and request.if_modified_since is not None
+                       and derniere_modif <= request.if_modified_since)
+    if non_modifie:
+        response = Response(status=304)
+    else:
+        with _lock:
+            en_cache = _corps.get(request.full_path)
+            if en_cache is not None and en_cache[0] == etag:
+                _corps.move_to_end(request.full_path)
+        if en_cache is not None and en_cache[0] == etag:
+            response = Response(en_cache[1], headers=en_cache[2])
+        else:
+            response = construire()
+            if response.status_code != 200:
+                return response
+            en_tetes = [(cle, response.headers[cle]) for cle in EN_TETES_CACHES if cle in response.headers]
+            with _lock:
+                _corps[request.full_path] = (etag, response.get_data(), en_tetes)
+                _corps.move_to_end(request.full_path)
+                while len(_corps) > CACHE_REPONSES_MAX:
+                    _corps.popitem(last=False)
+
+    response.set_etag(etag)
+    if derniere_modif is not None:
+        response.last_modified = derniere_modif
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, jsonify, request
-from datetime import datetime
+import json
+from flask import Blueprint, Response, render_template, jsonify, request, stream_with_context
+from markupsafe import Markup
+from datetime import date, datetime, timedelta
 from models.medecin_model import get_medecins as lister_medecins, get_medecin_by_id as trouver_medecin_par_id, Medecin
+from models.patient_model import Patient
 from models.rdv_model import RendezVous
-from models import db
+from models.version_model import get_table_version
+from models.projection import parse_fields
+from controllers.http_cache import reponse_conditionnelle
+from models import db, disponibilite_model, recherche_model, statistiques_model, flux_model, fragments, rapports_model
+from config import FLUX_HEARTBEAT, RAPPORTS_PERIODE_MAX
 
 medecin_bp = Blueprint('medecin', __name__, url_prefix='/medecins')
 
@@ -17,18 +24,16 @@ def liste_medecins():
 
 @medecin_bp.route('/api/liste')
 def api_liste_medecins():
-    """API endpoint pour récupérer la liste des médecins en JSON"""
+    """API endpoint pour récupérer la liste des médecins en JSON (ETag / Last-Modified)"""
     try:
-        medecins = lister_medecins()
-        response = jsonify({
-            'success': True,
-            'medecins': medecins,
-            'total': len(medecins)
-        })
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
+        def construire():
+            medecins = lister_medecins(fields=parse_fields(request.args.get('fields')))
+            return jsonify({
+                'success': True,
+                'medecins': medecins,
+                'total': len(medecins)
+            })
+        return reponse_conditionnelle(get_table_version(Medecin), construire)
     except Exception as e:
         response = jsonify({
             'success': False,
@@ -39,34 +44,42 @@ def api_liste_medecins():
         response.headers['Expires'] = '0'
         return response, 500
 
+@medecin_bp.route('/api/recherche')
+def api_recherche_medecins():
+    """API endpoint de recherche (nom, prénom, spécialité, adresse), sans accents ni casse"""
+    try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        par_page = min(max(request.args.get('par_page', 20, type=int), 1), 100)
+        resultats, total, facettes = recherche_model.search_medecins(
+            request.args.get('q', ''),
+            specialite=request.args.get('specialite') or None,
+            page=page,
+            par_page=par_page
+        )
+        return jsonify({
+            'success': True,
+            'medecins': resultats,
+            'total': total,
+            'page': page,
+            'par_page': par_page,
+            'facettes': {'specialite': facettes}
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @medecin_bp.route('/api/statistiques')
 def api_statistiques():
     """API endpoint pour les statistiques en temps réel"""
     try:
-        # Nombre total de médecins
-        total_medecins = Medecin.query.count()
-
-        # Maintenant
-        maintenant = datetime.now()
-
-        # Médecins avec des RDV à venir
-        medecins_disponibles = db.session.query(db.func.count(db.distinct(RendezVous.medecin_id)))\
-            .filter(RendezVous.date_heure >= maintenant).scalar() or 0
-
-        # Total RDV
-        total_rdv = RendezVous.query.count()
-
-        # RDV programmés (futurs)
-        rdv_programmes = RendezVous.query.filter(RendezVous.date_heure >= maintenant).count()
+        # Compteurs tenus à jour en mémoire (voir models/statistiques_model.py)
+        statistiques = statistiques_model.get_statistiques()
 
         response = jsonify({
             'success': True,
-            'statistiques': {
-                'total_medecins': total_medecins,
-                'medecins_disponibles': medecins_disponibles,
-                'total_rdv': total_rdv,
-                'rdv_programmes': rdv_programmes
-            }
+            'statistiques': statistiques
         })
         response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
         response.headers['Pragma'] = 'no-cache'
@@ -82,38 +95,164 @@ def api_statistiques():
         response.headers['Expires'] = '0'
         return response, 500
 
+@medecin_bp.route('/api/rapports')
+def api_rapports():
+    """API endpoint des rapports d'occupation, calculés sur les agrégats journaliers (ETag / Last-Modified)"""
+    try:
+        aujourd_hui = datetime.now().date()
+        try:
+            fin = date.fromisoformat(request.args['fin']) if request.args.get('fin') else aujourd_hui
+            debut = date.fromisoformat(request.args['debut']) if request.args.get('debut') else fin - timedelta(days=364)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Format de date invalide (AAAA-MM-JJ)'}), 400
+        par = request.args.get('par', 'specialite')
+        rapports = parse_fields(request.args.get('rapports')) or rapports_model.RAPPORTS
+        if fin < debut or (fin - debut).days >= RAPPORTS_PERIODE_MAX:
+            return jsonify({'success': False, 'error': f'Période invalide ({RAPPORTS_PERIODE_MAX} jours au plus)'}), 400
+        if par not in ('specialite', 'medecin') or not set(rapports) <= set(rapports_model.RAPPORTS):
+            return jsonify({'success': False, 'error': 'Paramètre par ou rapports invalide'}), 400
+
+        def construire():
+            resultat = rapports_model.generer_rapports(
+                debut, fin, par, rapports,
+                medecin_id=request.args.get('medecin_id', type=int),
+                specialite=request.args.get('specialite') or None
+            )
+            return jsonify({'success': True, **resultat})
+        return reponse_conditionnelle(rapports_model.get_version(), construire)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@medecin_bp.route('/api/flux')
+def api_flux():
+    """Flux Server-Sent Events des changements (médecins, RDV, statistiques)"""
+    file = flux_model.broker.abonner()
+    if file is None:
+        # Trop d'abonnés sur ce worker : le client repasse en interrogation périodique
+        return jsonify({'success': False, 'error': 'Flux indisponible'}), 503
+
+    dernier_id = request.headers.get('Last-Event-ID', type=int)
+
+    def generer():
+        try:
+            yield 'retry: 5000\n\n'
+            envoye = 0
+            if dernier_id is not None:
+                # Reprise après reconnexion : rejouer ce qui a été manqué
+                envoye = dernier_id
+                while True:
+                    evenements = flux_model.lire_depuis(envoye)
+                    if not evenements:
+                        break
+                    for evenement in evenements:
+                        envoye = evenement[0]
+                        yield _format_sse(*evenement)
+            while True:
+                evenement = flux_model.ecouter(file, FLUX_HEARTBEAT)
+                if evenement is None:
+                    yield ': ping\n\n'
+                elif evenement[0] > envoye:
+                    # Abonné avant la relecture : ce qui a déjà été rejoué arrive aussi ici
+                    yield _format_sse(*evenement)
+        finally:
+            flux_model.broker.desabonner(file)
+
+    response = Response(stream_with_context(generer()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _format_sse(id_evenement, type_evenement, donnees):
+    return f'id: {id_evenement}\nevent: {type_evenement}\ndata: {json.dumps(donnees)}\n\n'
+
+def _rendre_details(medecin_id):
+    """Rendre le fragment de la page détail : (medecin, contenu, expire_le) ou None"""
+    medecin = trouver_medecin_par_id(medecin_id)
+    if not medecin:
+        return None
+
+    # Récupérer les prochains rendez-vous (à partir de maintenant)
+    maintenant = datetime.now()
+    rdvs = db.session.query(RendezVous.date_heure, RendezVous.motif, Patient.nom, Patient.prenom)\
+        .join(Patient, RendezVous.patient_id == Patient.id)\
+        .filter(RendezVous.medecin_id == medecin_id, RendezVous.date_heure >= maintenant)\
+        .order_by(RendezVous.date_heure).all()
+
+    # Adapter les données au template existant
+    prochains_rdv = [
+        {
+            'date_rdv': date_heure.date(),
+            'heure_rdv': date_heure.strftime('%H:%M'),
+            'patient': {
+                'nom': nom,
+                'prenom': prenom
+            },
+            'motif': motif
+        }
+        for date_heure, motif, nom, prenom in rdvs
+    ]
+
+    contenu = Markup(render_template('medecins/details_contenu.html',
+                                     medecin=medecin,
+                                     prochains_rdv=prochains_rdv))
+    # Le fragment est périmé dès que le premier rendez-vous affiché est passé
+    return medecin, contenu, rdvs[0][0] if rdvs else None
+
 @medecin_bp.route('/<int:medecin_id>')
 def details_medecin(medecin_id):
-    """Afficher les détails d'un médecin spécifique"""
+    """Afficher les détails d'un médecin spécifique (fragment en cache par médecin)"""
+    try:
+        version = fragments.cache.version(medecin_id)
+        page = fragments.cache.lire(medecin_id, version)
+        if page is None:
+            rendu = _rendre_details(medecin_id)
+            if rendu is None:
+                # Pas de template 404.html : le fragment affiche "Médecin non trouvé."
+                contenu = Markup(render_template('medecins/details_contenu.html', medecin=None))
+                return render_template('medecins/details.html', medecin=None, contenu=contenu), 404
+            medecin, contenu, expire_le = rendu
+            page = (medecin, contenu)
+            fragments.cache.ecrire(medecin_id, version, page, len(contenu.encode()), expire_le)
+        medecin, contenu = page
+        return render_template('medecins/details.html', medecin=medecin, contenu=contenu)
+    except Exception as e:
+        contenu = Markup(render_template('medecins/details_contenu.html', medecin=None, error=str(e)))
+        return render_template('medecins/details.html', medecin=None, contenu=contenu)
+
+@medecin_bp.route('/<int:medecin_id>/disponibilites')
+def disponibilites_medecin(medecin_id):
+    """API endpoint pour les créneaux libres d'un médecin"""
     try:
-        medecin = trouver_medecin_par_id(medecin_id)
-        if not medecin:
-            return render_template('404.html'), 404
-
-        # Récupérer les prochains rendez-vous (à partir de maintenant) en ORM
-        maintenant = datetime.now()
-        rdvs = db.session.query(RendezVous, Patient).join(Patient, RendezVous.patient_id == Patient.id)\
-            .filter(RendezVous.medecin_id == medecin_id, RendezVous.date_heure >= maintenant)\
-            .order_by(RendezVous.date_heure).all()
-
-        # Adapter les données au template existant
-        prochains_rdv = [
-            {
-                'date_rdv': rdv.date_heure.date(),
-                'heure_rdv': rdv.date_heure.strftime('%H:%M'),
-                'patient': {
-                    'nom': patient.nom,
-                    'prenom': patient.prenom
-                },
-                'motif': rdv.motif
-            }
-            for rdv, patient in rdvs
-        ]
-
-        return render_template('medecins/details.html', 
-                             medecin=medecin, 
-                             prochains_rdv=prochains_rdv)
+        if not trouver_medecin_par_id(medecin_id):
+            return jsonify({'success': False, 'error': 'Médecin introuvable'}), 404
+
+        maintenant = datetime.now().replace(second=0, microsecond=0)
+        debut = request.args.get('debut')
+        fin = request.args.get('fin')
+        duree = request.args.get('duree', 30, type=int)
+        try:
+            debut = datetime.fromisoformat(debut) if debut else maintenant
+            fin = datetime.fromisoformat(fin) if fin else debut + timedelta(days=7)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Format de date invalide'}), 400
+
+        debut = max(debut, maintenant)
+        if duree <= 0 or fin <= debut or fin - debut > timedelta(days=31):
+            return jsonify({'success': False, 'error': 'Période ou durée invalide'}), 400
+
+        creneaux = disponibilite_model.get_free_slots(medecin_id, debut, fin, duree)
+        return jsonify({
+            'success': True,
+            'medecin_id': medecin_id,
+            'duree': duree,
+            'creneaux': [
+                {'debut': c_debut.isoformat(), 'fin': c_fin.isoformat()}
+                for c_debut, c_fin in creneaux
+            ],
+            'total': len(creneaux)
+        })
     except Exception as e:
-        return render_template('medecins/details.html', 
-                             medecin=None, 
-                             error=str(e))
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,6 +1,5 @@
 from flask import render_template, request, redirect, url_for, flash, session
-from models import patient_model, rdv_model
-from werkzeug.security import generate_password_hash, check_password_hash
+from models import patient_model, rdv_model, credentials
 
 def index():
     return render_template("index.html")
@@ -14,12 +13,17 @@ def patient_inscription():
         date_naissance = request.form['date_naissance']
         telephone = request.form['telephone']
 
-        hashed_password = generate_password_hash(mot_de_passe, method='pbkdf2:sha256')
-
-        if patient_model.get_patient_by_email(email):
+        # Vérifier l'email avant de hacher : un doublon ne coûte aucun hachage
+        if patient_model.get_patient_by_email(email, fields=('id',)):
             flash('Cet email est déjà enregistré.', 'danger')
             return redirect(url_for('patient_inscription'))
 
+        try:
+            hashed_password = credentials.hacher(mot_de_passe)
+        except credentials.ServiceSature:
+            flash('Le service est momentanément surchargé, veuillez réessayer.', 'warning')
+            return render_template('patient/inscription.html'), 503
+
         patient_id = patient_model.create_patient(nom, prenom, email, hashed_password, date_naissance, telephone)
         if patient_id:
             flash('Inscription réussie! Vous pouvez maintenant vous connecter.', 'success')
@@ -36,7 +40,19 @@ def patient_connexion():
 
         patient = patient_model.get_patient_by_email(email)
 
-        if patient and check_password_hash(patient['mot_de_passe'], mot_de_passe):
+        # Compte inconnu : un hash factice est vérifié quand même, la durée
+        # de la réponse ne dit pas si l'e-mail existe
+        try:
+            valide, nouveau_hash = credentials.verifier(patient['mot_de_passe'] if patient else None, mot_de_passe)
+        except credentials.ServiceSature:
+            flash('Le service est momentanément surchargé, veuillez réessayer.', 'warning')
+            return render_template('patient/connexion.html'), 503
+        if nouveau_hash:
+            # Hash créé avec d'anciens paramètres : mis à niveau maintenant qu'on connaît le mot de passe
+            patient_model.update_password(patient['id'], nouveau_hash)
+
+        if valide:
+            session.renouveler()  # nouvel identifiant de session à la connexion
             session['patient_id'] = patient['id']
             flash('Connexion réussie!', 'success')
             return redirect(url_for('patient_dashboard'))
@@ -47,6 +63,7 @@ def patient_connexion():
 
 def patient_deconnexion():
     session.pop('patient_id', None)
+    session.renouveler()
     flash('Vous avez été déconnecté.', 'info')
     return redirect(url_for('index'))
 
@@ -56,9 +73,12 @@ def patient_dashboard():
         return redirect(url_for('patient_connexion'))
     
     patient = patient_model.get_patient_by_id(session['patient_id'])
-    rendez_vous = rdv_model.get_rdv_by_patient_id(session["patient_id"])
+    statistiques = rdv_model.get_dashboard_statistics(session['patient_id'])
+    # Un de plus que le nombre affiché, pour savoir s'il faut le lien "Voir tous"
+    prochains_rdv = rdv_model.get_upcoming_rdv(session['patient_id'], limit=4)
 
-    return render_template('patient/dashboard.html', patient=patient, rendez_vous=rendez_vous)
+    return render_template('patient/dashboard.html', patient=patient,
+                           statistiques=statistiques, prochains_rdv=prochains_rdv)
 
 def patient_profil():
     if 'patient_id' not in session:
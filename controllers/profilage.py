@@ -0,0 +1,177 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from threading import Lock
+import time
+
+from flask import Response, g, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Mesures par processus : chaque worker expose les siennes sur /metrics.
+# Le coût par requête est de quelques appels à perf_counter et d'une prise
+# de verrou à la fin de la requête ; les instructions SQL ne touchent que g.
+
+BUCKETS_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # secondes
+BUCKETS_SQL = (1, 2, 3, 5, 10, 20, 50, 100)  # instructions par requête HTTP
+BUCKETS_OCTETS = (1024, 10240, 102400, 1048576, 10485760)
+LONGUEUR_MAX_PARAMETRES = 300  # caractères des paramètres gardés dans le journal
+
+
+class Histogramme:
+    __slots__ = ('bornes', 'compteurs', 'somme')
+
+    def __init__(self, bornes):
+        self.bornes = bornes
+        self.compteurs = [0] * (len(bornes) + 1)
+        self.somme = 0.0
+
+    def observer(self, valeur):
+        self.compteurs[bisect_left(self.bornes, valeur)] += 1
+        self.somme += valeur
+
+    def lignes(self, nom, etiquettes):
+        cumul = 0
+        for borne, compteur in zip(self.bornes + ('+Inf',), self.compteurs):
+            cumul += compteur
+            yield f'{nom}_bucket{{{etiquettes},le="{borne}"}} {cumul}'
+        yield f'{nom}_sum{{{etiquettes}}} {self.somme}'
+        yield f'{nom}_count{{{etiquettes}}} {cumul}'
+
+
+class Metriques:
+    """Per-endpoint counters and histograms of this process."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.durees = defaultdict(lambda: Histogramme(BUCKETS_DUREE))  # (endpoint, méthode)
+        self.sql_par_requete = defaultdict(lambda: Histogramme(BUCKETS_SQL))
+        self.tailles = defaultdict(lambda: Histogramme(BUCKETS_OCTETS))
+        self.reponses = Counter()  # (endpoint, méthode, code)
+        self.sql_instructions = Counter()
+        self.sql_secondes = Counter()
+        self.sql_lignes = Counter()
+        self.hors_budget = Counter()
+        self.sql_lentes = 0
+
+    def enregistrer(self, cle, code, duree, nb_sql, duree_sql, lignes, octets, hors_budget):
+        with self.lock:
+            self.durees[cle].observer(duree)
+            self.sql_par_requete[cle].observer(nb_sql)
+            if octets is not None:
+                self.tailles[cle].observer(octets)
+            self.reponses[cle + (code,)] += 1
+            self.sql_instructions[cle] += nb_sql
+            self.sql_secondes[cle] += duree_sql
+            self.sql_lignes[cle] += lignes
+            if hors_budget:
+                self.hors_budget[cle] += 1
+
+
+def _etiquettes(endpoint, methode):
+    endpoint = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+    return f'endpoint="{endpoint}",method="{methode}"'
+
+
+def exposition(metriques, extra=()):
+    """Render the metrics in the Prometheus text format."""
+    lignes = []
+
+    def famille(nom, type_, aide):
+        lignes.append(f'# HELP {nom} {aide}')
+        lignes.append(f'# TYPE {nom} {type_}')
+
+    with metriques.lock:
+        famille('http_request_duration_seconds', 'histogram', 'Durée des requêtes HTTP jusqu\'à l\'envoi des en-têtes')
+        for cle, histogramme in sorted(metriques.durees.items()):
+            lignes.extend(histogramme.lignes('http_request_duration_seconds', _etiquettes(*cle)))
+        famille('http_requests_total', 'counter', 'Réponses HTTP par code')
+        for (endpoint, methode, code), n in sorted(metriques.reponses.items()):
+            lignes.append(f'http_requests_total{{{_etiquettes(endpoint, methode)},status="{code}"}} {n}')
+        famille('http_response_size_bytes', 'histogram', 'Taille des corps de réponse (hors flux)')
+        for cle, histogramme in sorted(metriques.tailles.items()):
+            lignes.extend(histogramme.lignes('http_response_size_bytes', _etiquettes(*cle)))
+        famille('sql_statements_per_request', 'histogram', 'Instructions SQL par requête HTTP')
+        for cle, histogramme in sorted(metriques.sql_par_requete.items()):
+            lignes.extend(histogramme.lignes('sql_statements_per_request', _etiquettes(*cle)))
+        for nom, compteur, aide in (
+            ('sql_statements_total', metriques.sql_instructions, 'Instructions SQL exécutées'),
+            ('sql_duration_seconds_total', metriques.sql_secondes, 'Temps passé dans les instructions SQL'),
+            ('sql_rows_total', metriques.sql_lignes, 'Lignes signalées par le driver (rowcount)'),
+            ('sql_query_budget_exceeded_total', metriques.hors_budget, 'Requêtes HTTP au-delà du budget SQL'),
+        ):
+            famille(nom, 'counter', aide)
+            for cle, valeur in sorted(compteur.items()):
+                lignes.append(f'{nom}{{{_etiquettes(*cle)}}} {valeur}')
+        famille('sql_slow_statements_total', 'counter', 'Instructions SQL plus lentes que PROFILAGE_SQL_LENTE')
+        lignes.append(f'sql_slow_statements_total {metriques.sql_lentes}')
+    for nom, type_, aide, valeur in extra:
+        famille(nom, type_, aide)
+        lignes.append(f'{nom} {valeur}')
+    return '\n'.join(lignes) + '\n'
+
+
+metriques = Metriques()
+# Réglages des écouteurs SQL, communs à toutes les applications du processus
+_reglages = {'seuil_lent': 0.1, 'logger': None}
+
+
+def _avant_execution(conn, cursor, statement, parameters, context, executemany):
+    conn.info['profilage_debut'] = time.perf_counter()
+
+
+def _apres_execution(conn, cursor, statement, parameters, context, executemany):
+    duree = time.perf_counter() - conn.info.pop('profilage_debut', time.perf_counter())
+    if has_request_context():
+        mesure = g.get('profilage')
+        if mesure is not None:
+            mesure[1] += 1
+            mesure[2] += duree
+            if cursor.rowcount > 0:
+                mesure[3] += cursor.rowcount
+    if duree >= _reglages['seuil_lent']:
+        with metriques.lock:
+            metriques.sql_lentes += 1
+        if _reglages['logger'] is not None:
+            _reglages['logger'].warning('SQL lente (%.3f s) : %s -- paramètres %s', duree, ' '.join(statement.split()),
+                                        repr(parameters)[:LONGUEUR_MAX_PARAMETRES])
+
+
+def init_profilage(app, extra=None):
+    """Hook the request signals and SQL events, and register /metrics.
+
+    `extra` is an optional callable returning (nom, type, aide, valeur)
+    tuples appended to the exposition (gauges of other modules).
+    """
+    if not app.config.get('PROFILAGE_ACTIF', True):
+        return
+    budget = app.config['PROFILAGE_BUDGET_SQL']
+    logger = app.logger
+    _reglages.update(seuil_lent=app.config['PROFILAGE_SQL_LENTE'], logger=logger)
+
+    def debut_requete(sender, **kwargs):
+        g.profilage = [time.perf_counter(), 0, 0.0, 0]  # début, instructions, durée SQL, lignes
+
+    def fin_requete(sender, response, **kwargs):
+        mesure = g.pop('profilage', None)
+        if mesure is None:
+            return
+        debut, nb_sql, duree_sql, lignes = mesure
+        endpoint = request.endpoint or 'inconnu'
+        hors_budget = nb_sql > budget
+        if hors_budget:
+            logger.warning('%s %s : %d instructions SQL (budget %d)', request.method, request.path, nb_sql, budget)
+        octets = None if response.is_streamed else response.content_length
+        metriques.enregistrer((endpoint, request.method), response.status_code, time.perf_counter() - debut,
+                              nb_sql, duree_sql, lignes, octets, hors_budget)
+
+    request_started.connect(debut_requete, app, weak=False)
+    request_finished.connect(fin_requete, app, weak=False)
+    if not event.contains(Engine, 'before_cursor_execute', _avant_execution):
+        event.listen(Engine, 'before_cursor_execute', _avant_execution)
+        event.listen(Engine, 'after_cursor_execute', _apres_execution)
+
+    def metrics():
+        return Response(exposition(metriques, extra() if extra else ()),
+                        mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -1,14 +1,16 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import current_app, render_template, request, redirect, url_for, flash, session
 from models import rdv_model, patient_model
+from models.reservation_model import ResultatReservation, reserver
 from models.medecin_model import get_medecins as lister_medecins
-from models.rdv_model import create_rdv, get_rdv_by_id, cancel_rdv
+from models.rdv_model import get_rdv_by_id, cancel_rdv
 from datetime import datetime
+from uuid import uuid4
 
 def nouveau_rdv():
     if 'patient_id' not in session:
         return redirect(url_for('patient_connexion'))
     
-    medecins = lister_medecins()
+    medecins = lister_medecins(fields=('id', 'nom', 'prenom', 'specialite', 'telephone', 'email'))
 
     if request.method == 'POST':
         date_heure_str = request.form['date_heure']
@@ -22,21 +24,44 @@ def nouveau_rdv():
             flash('Format de date et heure invalide.', 'danger')
             return redirect(url_for('nouveau_rdv'))
 
-        if create_rdv(date_heure, motif, patient_id, medecin_id):
+        # Clé fournie par le client (en-tête) ou par le formulaire : une double
+        # soumission renvoie le rendez-vous déjà créé au lieu d'en prendre un second
+        cle = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+        try:
+            resultat, rdv_id = reserver(patient_id, medecin_id, date_heure, motif, cle=cle)
+        except Exception:
+            current_app.logger.exception('Réservation du patient %s chez le médecin %s', patient_id, medecin_id)
+            resultat = None
+
+        if resultat in (ResultatReservation.CREE, ResultatReservation.REJOUE):
             flash('Rendez-vous pris avec succès!', 'success')
             return redirect(url_for('patient_dashboard'))
+        elif resultat == ResultatReservation.CONFLIT:
+            flash('Ce créneau est déjà réservé. Choisissez un autre horaire parmi les disponibilités.', 'danger')
+            return redirect(url_for('nouveau_rdv'))
+        elif resultat == ResultatReservation.PASSE:
+            flash('Ce créneau est déjà passé. Choisissez une date à venir.', 'danger')
+            return redirect(url_for('nouveau_rdv'))
+        elif resultat == ResultatReservation.HORS_HORAIRES:
+            flash('Ce créneau est en dehors des heures d\'ouverture du cabinet.', 'danger')
+            return redirect(url_for('nouveau_rdv'))
+        elif resultat == ResultatReservation.SATURE:
+            flash('Ce médecin reçoit beaucoup de demandes en ce moment. Veuillez réessayer dans un instant.', 'warning')
+            return render_template('rdv/nouveau.html', medecins=medecins, idempotency_key=cle or uuid4().hex), 503
         else:
             flash('Une erreur est survenue lors de la prise de rendez-vous.', 'danger')
 
-    return render_template('rdv/nouveau.html', medecins=medecins)
+    return render_template('rdv/nouveau.html', medecins=medecins, idempotency_key=uuid4().hex)
 
 def liste_rdv():
     if 'patient_id' not in session:
         return redirect(url_for('patient_connexion'))
     
     from models.rdv_model import get_rdv_by_patient_id
-    rendez_vous = get_rdv_by_patient_id(session['patient_id'])
-    return render_template('rdv/liste.html', rendez_vous=rendez_vous)
+    # ?archives=1 : inclut les rendez-vous anciens déplacés dans rendez_vous_archive
+    archives = request.args.get('archives') == '1'
+    rendez_vous = get_rdv_by_patient_id(session['patient_id'], archives=archives)
+    return render_template('rdv/liste.html', rendez_vous=rendez_vous, archives=archives)
 
 def details_rdv(rdv_id):
     if 'patient_id' not in session:
@@ -61,7 +86,12 @@ def annuler_rdv(rdv_id):
         return redirect(url_for('liste_rdv'))
 
     if request.method == 'POST':
-        if cancel_rdv(rdv_id):
+        try:
+            annule = cancel_rdv(rdv_id)
+        except Exception:
+            current_app.logger.exception('Annulation du rendez-vous %s', rdv_id)
+            annule = False
+        if annule:
             flash('Rendez-vous annulé avec succès.', 'success')
         else:
             flash('Une erreur est survenue lors de l\'annulation du rendez-vous.', 'danger')
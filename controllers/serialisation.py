@@ -0,0 +1,43 @@
+from decimal import Decimal
+import json
+
+from flask.json.provider import JSONProvider
+import orjson
+
+# Encodage JSON de toutes les réponses (jsonify, request.get_json) par orjson :
+# dates et datetimes natifs au format ISO 8601, clés dans l'ordre des
+# colonnes projetées, tableaux NumPy des rapports, corps produit directement
+# en octets.
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _defaut(valeur):
+    """Types that orjson does not encode natively."""
+    if isinstance(valeur, Decimal):
+        return str(valeur)
+    if hasattr(valeur, '__html__'):
+        return str(valeur.__html__())
+    raise TypeError(f'Objet de type {type(valeur).__name__} non sérialisable en JSON')
+
+
+def encoder(valeur):
+    """Serialize to JSON bytes."""
+    return orjson.dumps(valeur, default=_defaut, option=OPTIONS)
+
+
+class FournisseurJSON(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return encoder(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            # object_hook du sérialiseur de session (valeurs étiquetées) : json standard
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encoder(obj), mimetype='application/json')
@@ -0,0 +1,309 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock, local
+import os
+import sqlite3
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+from config import SESSIONS_STOCKAGE, SESSIONS_FICHIER, SESSIONS_CACHE_TTL, SESSIONS_CACHE_MAX, SESSIONS_PURGE_INTERVALLE
+
+# Sessions côté serveur : le cookie ne porte qu'un identifiant signé et un
+# numéro de génération ; les données sont dans un stockage partagé par les
+# workers de la machine (SQLite par défaut), jamais dans MariaDB. Chaque
+# écriture de la session incrémente la génération et renvoie le cookie, si
+# bien qu'une copie en cache d'une génération plus ancienne n'est jamais
+# servie ; SESSIONS_CACHE_TTL ne borne que le retard sur une session
+# supprimée côté serveur par un autre worker. Un cookie d'une génération
+# antérieure (deux requêtes simultanées ont enregistré la session, le
+# navigateur a gardé la première réponse) reçoit la session enregistrée et
+# un cookie à jour : seule la suppression de la session déconnecte.
+
+
+class StockageSessions(ABC):
+    """Storage backend of the server-side sessions (one record per session id)."""
+
+    @abstractmethod
+    def lire(self, sid):
+        """Return (generation, donnees, expire_le) or None."""
+
+    @abstractmethod
+    def ecrire(self, sid, generation, donnees, expire_le):
+        """Store a record, replacing the previous one of the session."""
+
+    @abstractmethod
+    def supprimer(self, sid):
+        """Delete the record of a session, if any."""
+
+    @abstractmethod
+    def purger(self, maintenant):
+        """Delete expired records; returns how many were deleted."""
+
+
+class StockageSQLite(StockageSessions):
+    """SQLite file shared by the workers of a node, one connection per thread."""
+
+    LOT_PURGE = 500
+
+    def __init__(self, chemin=SESSIONS_FICHIER):
+        self.chemin = chemin
+        self.local = local()
+
+    def _connexion(self):
+        connexion = getattr(self.local, 'connexion', None)
+        if connexion is None or getattr(self.local, 'pid', None) != os.getpid():
+            connexion = sqlite3.connect(self.chemin, timeout=5, isolation_level=None)
+            connexion.execute('PRAGMA journal_mode=WAL')
+            connexion.execute('PRAGMA synchronous=NORMAL')
+            connexion.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'sid TEXT PRIMARY KEY, generation INTEGER NOT NULL, '
+                'donnees TEXT NOT NULL, expire_le REAL NOT NULL)'
+            )
+            connexion.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expire_le ON sessions (expire_le)')
+            self.local.connexion, self.local.pid = connexion, os.getpid()
+        return connexion
+
+    def lire(self, sid):
+        return self._connexion().execute(
+            'SELECT generation, donnees, expire_le FROM sessions WHERE sid = ?', (sid,)
+        ).fetchone()
+
+    def ecrire(self, sid, generation, donnees, expire_le):
+        self._connexion().execute(
+            'INSERT OR REPLACE INTO sessions (sid, generation, donnees, expire_le) VALUES (?, ?, ?, ?)',
+            (sid, generation, donnees, expire_le)
+        )
+
+    def supprimer(self, sid):
+        self._connexion().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purger(self, maintenant):
+        # Par lots : la base reste disponible pour les autres workers
+        total = 0
+        while True:
+            supprimees = self._connexion().execute(
+                'DELETE FROM sessions WHERE sid IN '
+                '(SELECT sid FROM sessions WHERE expire_le < ? LIMIT ?)', (maintenant, self.LOT_PURGE)
+            ).rowcount
+            total += supprimees
+            if supprimees < self.LOT_PURGE:
+                return total
+
+
+class StockageMemoire(StockageSessions):
+    """Dict of the current process: development server or a single worker only."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = Lock()
+
+    def lire(self, sid):
+        return self.sessions.get(sid)
+
+    def ecrire(self, sid, generation, donnees, expire_le):
+        with self.lock:
+            self.sessions[sid] = (generation, donnees, expire_le)
+
+    def supprimer(self, sid):
+        with self.lock:
+            self.sessions.pop(sid, None)
+
+    def purger(self, maintenant):
+        with self.lock:
+            expirees = [sid for sid, (_, _, expire_le) in self.sessions.items() if expire_le < maintenant]
+            for sid in expirees:
+                self.sessions.pop(sid, None)
+        return len(expirees)
+
+
+# Fabriques des stockages, à partir de la config de l'application
+STOCKAGES = {
+    'sqlite': lambda config: StockageSQLite(config.get('SESSIONS_FICHIER', SESSIONS_FICHIER)),
+    'memoire': lambda config: StockageMemoire(),
+}
+
+
+class SessionServeur(SecureCookieSession):
+    """Session dict with its server-side id and generation."""
+
+    def __init__(self, initial=None, sid=None, generation=0, expire_le=0):
+        super().__init__(initial)
+        self.sid = sid
+        self.generation = generation
+        self.expire_le = expire_le
+        self.ancien_sid = None
+        self.cookie_perime = False  # cookie d'une génération antérieure : renvoyé à jour
+
+    def renouveler(self):
+        """Give the session a new id (on login), so that an id known before cannot be reused."""
+        if self.sid is not None:
+            self.ancien_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class CacheSessions:
+    """Serialized sessions recently read or written by this worker, keyed by (sid, generation)."""
+
+    def __init__(self, ttl=SESSIONS_CACHE_TTL, taille_max=SESSIONS_CACHE_MAX):
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()  # sid -> (generation, donnees, expire_le, lu_le)
+        self.lock = Lock()
+        self.succes = self.lectures = self.ecritures = self.purgees = 0
+
+    def lire(self, sid, generation, maintenant):
+        with self.lock:
+            entree = self.entrees.get(sid)
+            if entree is None or entree[0] < generation or maintenant - entree[3] > self.ttl:
+                return None
+            self.entrees.move_to_end(sid)
+            self.succes += 1
+            return entree
+
+    def ecrire(self, sid, generation, donnees, expire_le, maintenant):
+        with self.lock:
+            self.entrees[sid] = (generation, donnees, expire_le, maintenant)
+            self.entrees.move_to_end(sid)
+            while len(self.entrees) > self.taille_max:
+                self.entrees.popitem(last=False)
+
+    def retirer(self, sid):
+        with self.lock:
+            self.entrees.pop(sid, None)
+
+    def metriques(self):
+        with self.lock:
+            return {
+                'entrees': len(self.entrees),
+                'succes': self.succes,
+                'lectures': self.lectures,
+                'ecritures': self.ecritures,
+                'purgees': self.purgees,
+            }
+
+
+class InterfaceSessionsServeur(SessionInterface):
+    """Flask session interface backed by a StockageSessions, with a per-worker read cache."""
+
+    session_class = SessionServeur
+    serializer = TaggedJSONSerializer()
+    salt = 'session-serveur'
+
+    def __init__(self, stockage, cache=None):
+        self.stockage = stockage
+        self.cache = cache or CacheSessions()
+        self.derniere_purge = time.time()
+        self.lock_purge = Lock()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _lire(self, sid, generation, maintenant):
+        """Return (generation, donnees, expire_le) of the stored session, or None.
+
+        The stored generation may be newer than the cookie's: two concurrent
+        requests both saved the session and the browser kept the first
+        response's cookie. The newer row is returned.
+        """
+        entree = self.cache.lire(sid, generation, maintenant)
+        if entree is not None:
+            return entree[:3]
+        with self.cache.lock:
+            self.cache.lectures += 1
+        ligne = self.stockage.lire(sid)
+        if ligne is None or ligne[0] < generation:
+            return None  # supprimée (déconnexion, expiration) ou cookie incohérent
+        self.cache.ecrire(sid, *ligne, maintenant)
+        return ligne
+
+    def open_session(self, app, request):
+        maintenant = time.time()
+        self._purger_si_besoin(maintenant)
+        valeur = request.cookies.get(self.get_cookie_name(app))
+        if not valeur or not app.secret_key:
+            return self.session_class()
+        try:
+            sid, generation = self._signer(app).unsign(valeur).decode().rsplit('.', 1)
+            generation = int(generation)
+        except (BadSignature, ValueError):
+            return self.session_class()
+        lu = self._lire(sid, generation, maintenant)
+        if lu is None or lu[2] < maintenant:
+            return self.session_class()  # expirée : supprimée par la prochaine purge
+        generation_lue, donnees, expire_le = lu
+        session = self.session_class(self.serializer.loads(donnees), sid, generation_lue, expire_le)
+        session.cookie_perime = generation_lue != generation
+        return session
+
+    def save_session(self, app, session, response):
+        nom = self.get_cookie_name(app)
+        domaine = self.get_cookie_domain(app)
+        chemin = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.ancien_sid is not None:
+            self._supprimer(session.ancien_sid)
+        if not session:
+            if session.sid is not None or session.ancien_sid is not None:
+                if session.sid is not None:
+                    self._supprimer(session.sid)
+                response.delete_cookie(nom, domain=domaine, path=chemin, secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app), httponly=self.get_cookie_httponly(app))
+            return
+
+        maintenant = time.time()
+        duree = app.permanent_session_lifetime.total_seconds()
+        # Session non modifiée : l'expiration n'est repoussée qu'une fois la moitié de la durée écoulée
+        if not session.modified and session.expire_le - maintenant > duree / 2:
+            if session.cookie_perime:
+                self._poser_cookie(app, session, response)
+            return
+        if session.sid is None:
+            session.sid = os.urandom(32).hex()
+            session.generation = 0
+        session.generation += 1
+        donnees = self.serializer.dumps(dict(session))
+        expire_le = maintenant + duree
+        self.stockage.ecrire(session.sid, session.generation, donnees, expire_le)
+        self.cache.ecrire(session.sid, session.generation, donnees, expire_le, maintenant)
+        with self.cache.lock:
+            self.cache.ecritures += 1
+        self._poser_cookie(app, session, response)
+
+    def _poser_cookie(self, app, session, response):
+        valeur = self._signer(app).sign(f'{session.sid}.{session.generation}').decode()
+        response.set_cookie(self.get_cookie_name(app), valeur, expires=self.get_expiration_time(app, session),
+                            domain=self.get_cookie_domain(app), path=self.get_cookie_path(app),
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+                            httponly=self.get_cookie_httponly(app))
+
+    def _supprimer(self, sid):
+        self.stockage.supprimer(sid)
+        self.cache.retirer(sid)
+
+    def _purger_si_besoin(self, maintenant):
+        """Lazy expiry: at most one sweep every SESSIONS_PURGE_INTERVALLE seconds per worker."""
+        if maintenant - self.derniere_purge < SESSIONS_PURGE_INTERVALLE or not self.lock_purge.acquire(blocking=False):
+            return
+        try:
+            self.derniere_purge = maintenant
+            purgees = self.stockage.purger(maintenant)
+            with self.cache.lock:
+                self.cache.purgees += purgees
+        except sqlite3.Error:
+            pass  # base occupée : nouvel essai à la prochaine échéance
+        finally:
+            self.lock_purge.release()
+
+
+def init_sessions(app, stockage=None):
+    """Install the server-side sessions; `stockage` defaults to SESSIONS_STOCKAGE from the config."""
+    if stockage is None:
+        stockage = STOCKAGES[app.config.get('SESSIONS_STOCKAGE', SESSIONS_STOCKAGE)](app.config)
+    app.session_interface = InterfaceSessionsServeur(stockage)
+    return app.session_interface
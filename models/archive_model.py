@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+import time
+
+from sqlalchemy import delete, insert, literal, select, text, union_all
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+
+from config import ARCHIVE_HORIZON, ARCHIVE_TAILLE_LOT, ARCHIVE_PAUSE
+from models import db
+from models.rdv_model import RendezVous, StatutRdv
+
+# Archivage des rendez-vous terminés ou annulés depuis plus de ARCHIVE_HORIZON
+# jours : ils sont déplacés (même id) de rendez_vous vers rendez_vous_archive,
+# par lots de ARCHIVE_TAILLE_LOT lignes, une transaction courte par lot. Les
+# vues d'historique ne lisent l'archive que si l'utilisateur demande les
+# rendez-vous plus anciens (?archives=1).
+
+
+class RendezVousArchive(db.Model):
+    __tablename__ = 'rendez_vous_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # id d'origine dans rendez_vous
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
+    medecin_id = db.Column(db.Integer, db.ForeignKey('medecins.id'), nullable=False)
+    date_heure = db.Column(db.DateTime, nullable=False)
+    duree = db.Column(db.Integer, default=30)
+    motif = db.Column(db.String(500), nullable=True)
+    statut = db.Column(db.String(20), nullable=False)
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archive_le = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_rdv_archive_patient_date', 'patient_id', 'date_heure'),
+        db.Index('ix_rdv_archive_patient_statut', 'patient_id', 'statut'),
+        db.Index('ix_rdv_archive_medecin_date', 'medecin_id', 'date_heure'),
+    )
+
+
+# Colonnes copiées telles quelles de rendez_vous
+COLONNES_COPIEES = ['id', 'patient_id', 'medecin_id', 'date_heure', 'duree', 'motif', 'statut', 'notes',
+                    'created_at', 'updated_at']
+
+
+def colonnes_archive(colonnes):
+    """Same {key: column} mapping, RendezVous columns replaced by their RendezVousArchive twin."""
+    return {
+        cle: getattr(RendezVousArchive, col.key)
+        if isinstance(col, InstrumentedAttribute) and col.class_ is RendezVous else col
+        for cle, col in colonnes.items()
+    }
+
+
+def union_archives(active, archive, ordre, decroissant=False, limite=None):
+    """UNION ALL of two projected queries with the same labels, ordered by the label `ordre`.
+
+    The order label is selected by both queries; it is dropped from the
+    result when the caller did not ask for it (see avec_ordre).
+    """
+    union = union_all(active.statement, archive.statement).subquery()
+    colonne = union.c[ordre]
+    requete = select(union).order_by(colonne.desc() if decroissant else colonne)
+    if limite is not None:
+        requete = requete.limit(limite)
+    return db.session.execute(requete)
+
+
+def avec_ordre(fields, ordre):
+    """Fields to select so that the rows can be ordered by `ordre`."""
+    if fields is None or ordre in fields:
+        return fields
+    return tuple(fields) + (ordre,)
+
+
+def sans_ordre(lignes, fields, ordre):
+    """Drop the order key added by avec_ordre."""
+    if fields is not None and ordre not in fields:
+        for ligne in lignes:
+            ligne.pop(ordre, None)
+    return lignes
+
+
+def _candidats(limite, taille_lot):
+    # Jamais la ligne d'id maximal : sans AUTOINCREMENT (SQLite) ou après un
+    # redémarrage (anciennes versions d'InnoDB), son id serait réattribué
+    # au prochain rendez-vous et entrerait en collision dans l'archive.
+    id_max = select(db.func.max(RendezVous.id)).scalar_subquery()
+    return db.session.query(RendezVous.id)\
+        .filter(RendezVous.statut.in_((StatutRdv.TERMINE, StatutRdv.ANNULE)),
+                RendezVous.date_heure < limite,
+                RendezVous.id < id_max)\
+        .limit(taille_lot)
+
+
+def tailles():
+    """Row count of rendez_vous and rendez_vous_archive, and their size in bytes when the database reports it."""
+    resultat = {}
+    for model in (RendezVous, RendezVousArchive):
+        table = model.__tablename__
+        lignes = db.session.query(db.func.count(model.id)).scalar()
+        octets = None
+        try:
+            if db.engine.dialect.name == 'sqlite':
+                octets = db.session.execute(text('SELECT SUM(pgsize) FROM dbstat WHERE name = :t'),
+                                            {'t': table}).scalar()
+            elif db.engine.dialect.name in ('mysql', 'mariadb'):
+                octets = db.session.execute(text(
+                    'SELECT data_length + index_length FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE() AND table_name = :t'), {'t': table}).scalar()
+        except DBAPIError:
+            db.session.rollback()  # SQLite compilé sans dbstat
+        resultat[table] = {'lignes': lignes, 'octets': int(octets) if octets is not None else None}
+    db.session.commit()
+    return resultat
+
+
+def archiver(horizon=ARCHIVE_HORIZON, taille_lot=ARCHIVE_TAILLE_LOT, pause=ARCHIVE_PAUSE, maximum=None, log=print):
+    """Move finished or cancelled rendez-vous older than `horizon` days to the archive.
+
+    Each batch is selected, copied and deleted in its own short
+    transaction, then the job sleeps `pause` seconds so that bookings are
+    not held behind it. Returns the number of rows moved.
+    """
+    from models.reservation_model import CleIdempotence
+
+    limite = datetime.now() - timedelta(days=horizon)
+    deplaces = 0
+    while maximum is None or deplaces < maximum:
+        lot = taille_lot if maximum is None else min(taille_lot, maximum - deplaces)
+        ids = [row[0] for row in _candidats(limite, lot)]
+        if not ids:
+            break
+        db.session.execute(insert(RendezVousArchive).from_select(
+            COLONNES_COPIEES + ['archive_le'],
+            select(*[getattr(RendezVous, cle) for cle in COLONNES_COPIEES],
+                   literal(datetime.utcnow(), db.DateTime)).where(RendezVous.id.in_(ids))))
+        # Clés d'idempotence de ces rendez-vous (expirées depuis longtemps) : leur
+        # clé étrangère vers rendez_vous bloquerait la suppression (InnoDB)
+        db.session.execute(delete(CleIdempotence).where(CleIdempotence.rdv_id.in_(ids)),
+                           execution_options={'synchronize_session': False})
+        db.session.execute(delete(RendezVous).where(RendezVous.id.in_(ids)),
+                           execution_options={'synchronize_session': False})
+        db.session.commit()
+        deplaces += len(ids)
+        log(f'  {deplaces} rendez-vous archivé(s)')
+        if len(ids) < lot:
+            break
+        time.sleep(pause)
+    return deplaces
@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import BoundedSemaphore, Lock
+import secrets
+import time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from config import HASH_METHODE, HASH_LONGUEUR_SEL, HASH_WORKERS, HASH_FILE_MAX, HASH_ATTENTE_MAX
+
+# Le hachage (pbkdf2/scrypt de hashlib) libère le GIL : il tourne dans un pool
+# borné à HASH_WORKERS hachages simultanés, si bien qu'un afflux de connexions
+# n'occupe pas tous les cœurs et que les autres requêtes gardent du CPU. Le
+# thread de la requête reste bloqué sur le résultat : avec des workers
+# synchrones, il n'est pas libéré pendant le hachage. Seules la file bornée
+# (HASH_FILE_MAX, au-delà 503) et le coût du hash (HASH_METHODE) limitent le
+# nombre de threads ainsi occupés.
+
+
+class ServiceSature(RuntimeError):
+    """Raised when too many hashing requests are already waiting."""
+
+
+class _Metriques:
+    def __init__(self):
+        self.lock = Lock()
+        self.en_attente = 0
+        self.en_cours = 0
+        self.file_max_observee = 0
+        self.traites = 0
+        self.refuses = 0
+        self.rehash = 0
+        self.duree_totale = 0.0
+
+    def valeurs(self):
+        with self.lock:
+            return {
+                'en_attente': self.en_attente,
+                'en_cours': self.en_cours,
+                'file_max_observee': self.file_max_observee,
+                'traites': self.traites,
+                'refuses': self.refuses,
+                'rehash': self.rehash,
+                'duree_moyenne_ms': round(1000 * self.duree_totale / self.traites, 1) if self.traites else 0
+            }
+
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='hachage')
+_places = BoundedSemaphore(HASH_WORKERS + HASH_FILE_MAX)
+_metriques = _Metriques()
+_prefixe_courant = None
+_hash_factice = None
+
+
+def generer_hash(mot_de_passe):
+    """Hash synchronously with the configured parameters (CLI, scripts)."""
+    return generate_password_hash(mot_de_passe, method=HASH_METHODE, salt_length=HASH_LONGUEUR_SEL)
+
+
+def _executer(fonction, *args):
+    debut = time.perf_counter()
+    with _metriques.lock:
+        _metriques.en_attente -= 1
+        _metriques.en_cours += 1
+    try:
+        return fonction(*args)
+    finally:
+        with _metriques.lock:
+            _metriques.en_cours -= 1
+            _metriques.traites += 1
+            _metriques.duree_totale += time.perf_counter() - debut
+        _places.release()
+
+
+def _soumettre(fonction, *args):
+    """Run fonction on the hashing pool and wait for its result."""
+    if not _places.acquire(blocking=False):
+        with _metriques.lock:
+            _metriques.refuses += 1
+        raise ServiceSature('Trop de demandes de hachage en attente')
+    with _metriques.lock:
+        _metriques.en_attente += 1
+        _metriques.file_max_observee = max(_metriques.file_max_observee, _metriques.en_attente)
+    try:
+        future = _pool.submit(_executer, fonction, *args)
+    except RuntimeError:
+        with _metriques.lock:
+            _metriques.en_attente -= 1
+        _places.release()
+        raise
+    try:
+        return future.result(timeout=HASH_ATTENTE_MAX)
+    except TimeoutError:
+        raise ServiceSature('Hachage trop long')
+
+
+def hacher(mot_de_passe):
+    """Hash a new password on the worker pool."""
+    return _soumettre(generer_hash, mot_de_passe)
+
+
+def doit_rehacher(hash_):
+    """True when a stored hash was made with other parameters than the configured ones."""
+    global _prefixe_courant
+    if _prefixe_courant is None:
+        # werkzeug complète la méthode (itérations par défaut...) : on la lit sur un hash réel
+        _prefixe_courant = generer_hash('').split('$', 1)[0]
+    methode, _, reste = hash_.partition('$')
+    return methode != _prefixe_courant or len(reste.partition('$')[0]) != HASH_LONGUEUR_SEL
+
+
+def _verifier(hash_, mot_de_passe):
+    if not check_password_hash(hash_, mot_de_passe):
+        return False, None
+    return True, generer_hash(mot_de_passe) if doit_rehacher(hash_) else None
+
+
+def verifier(hash_, mot_de_passe):
+    """Check a password on the worker pool.
+
+    Returns (valide, nouveau_hash); nouveau_hash is set when the password is
+    valid but the stored hash should be replaced by one using the current
+    parameters. With hash_ None (unknown account) a dummy hash made with
+    the current parameters is checked, so the answer takes as long as for
+    an existing account; the result is always (False, None).
+    """
+    global _hash_factice
+    if hash_ is None:
+        if _hash_factice is None:
+            _hash_factice = generer_hash(secrets.token_hex(16))
+        _soumettre(check_password_hash, _hash_factice, mot_de_passe)
+        return False, None
+    valide, nouveau_hash = _soumettre(_verifier, hash_, mot_de_passe)
+    if nouveau_hash:
+        with _metriques.lock:
+            _metriques.rehash += 1
+    return valide, nouveau_hash
+
+
+def metriques():
+    """Queue depth and counters of the hashing pool."""
+    return dict(_metriques.valeurs(), workers=HASH_WORKERS, file_max=HASH_FILE_MAX)
@@ -0,0 +1,182 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from threading import RLock
+import time
+
+from config import HEURE_OUVERTURE, HEURE_FERMETURE, JOURS_OUVRES, DISPONIBILITE_TTL
+from models import entites
+
+# Index des créneaux occupés, par médecin. Un index est construit hors du
+# verrou ; il n'est gardé que si aucun changement du médecin (réservation,
+# annulation, invalidation) n'est arrivé pendant sa construction.
+_index = {}
+_changements = {}  # medecin_id -> changements appliqués ; None -> invalidations complètes
+_lock = RLock()
+
+
+class IntervalIndex:
+    """Sorted busy intervals of one medecin, keyed by start time."""
+
+    def __init__(self):
+        self.debuts = []
+        self.intervalles = []  # (debut, fin, rdv_id), same order as debuts
+        self.duree_max = timedelta(0)
+        self.construit_le = time.monotonic()
+
+    def ajouter(self, rdv_id, debut, fin):
+        """Insert an interval, keeping both lists sorted."""
+        i = bisect_right(self.debuts, debut)
+        self.debuts.insert(i, debut)
+        self.intervalles.insert(i, (debut, fin, rdv_id))
+        if fin - debut > self.duree_max:
+            self.duree_max = fin - debut
+
+    def retirer(self, rdv_id, debut):
+        """Remove the interval of a rendez-vous, if present."""
+        i = bisect_left(self.debuts, debut)
+        while i < len(self.debuts) and self.debuts[i] == debut:
+            if self.intervalles[i][2] == rdv_id:
+                del self.debuts[i]
+                del self.intervalles[i]
+                return True
+            i += 1
+        return False
+
+    def chevauchements(self, debut, fin):
+        """Return the intervals overlapping [debut, fin).
+
+        An overlapping interval must start after debut - duree_max, so the
+        scan only covers a bounded window found by bisection.
+        """
+        i = bisect_right(self.debuts, debut - self.duree_max)
+        j = bisect_left(self.debuts, fin)
+        return [iv for iv in self.intervalles[i:j] if iv[1] > debut]
+
+
+def _fin_rdv(date_heure, duree):
+    return date_heure + timedelta(minutes=duree or 30)
+
+
+def _construire_index(medecin_id):
+    """Build the index of a medecin from rendez_vous (cancelled ones excluded)."""
+    from models import db
+    from models.rdv_model import RendezVous, StatutRdv
+    from models.replica import primaire
+
+    index = IntervalIndex()
+    # L'index sert à refuser les réservations en conflit : jamais depuis le réplica
+    with primaire(db.session):
+        rows = db.session.query(RendezVous.id, RendezVous.date_heure, RendezVous.duree)\
+            .filter(RendezVous.medecin_id == medecin_id, RendezVous.statut != StatutRdv.ANNULE)\
+            .order_by(RendezVous.date_heure).all()
+    for rdv_id, date_heure, duree in rows:
+        index.ajouter(rdv_id, date_heure, _fin_rdv(date_heure, duree))
+    return index
+
+
+def _version(medecin_id):
+    return _changements.get(None, 0), _changements.get(medecin_id, 0)
+
+
+def _changement(medecin_id):
+    # Appelé verrou pris
+    _changements[medecin_id] = _changements.get(medecin_id, 0) + 1
+
+
+def get_index(medecin_id):
+    """Return the index of a medecin, building it lazily (and again after DISPONIBILITE_TTL).
+
+    The query runs without the lock, so the other medecins stay available
+    meanwhile; read the returned index under the lock.
+    """
+    medecin_id = int(medecin_id)
+    with _lock:
+        index = _index.get(medecin_id)
+        if index is not None and time.monotonic() - index.construit_le <= DISPONIBILITE_TTL:
+            return index
+        version = _version(medecin_id)
+    index = _construire_index(medecin_id)
+    with _lock:
+        if _version(medecin_id) == version:
+            _index[medecin_id] = index
+    return index
+
+
+def invalidate_index(medecin_id=None):
+    """Drop the index of one medecin, or of all of them."""
+    with _lock:
+        if medecin_id is None:
+            _index.clear()
+        else:
+            medecin_id = int(medecin_id)
+            _index.pop(medecin_id, None)
+        _changement(medecin_id)
+
+
+def signaler(medecin_id):
+    """Tell the other workers of the node that the bookings of a medecin changed."""
+    entites.signaler({('disponibilites', int(medecin_id))})
+
+
+# Index d'un médecin modifié par un autre worker, ou import en masse
+entites.abonner('disponibilites', invalidate_index)
+
+
+def has_conflict(medecin_id, date_heure, duree=30, exclude_rdv_id=None):
+    """Check whether a booking would overlap an existing one."""
+    index = get_index(medecin_id)
+    with _lock:
+        conflits = index.chevauchements(date_heure, _fin_rdv(date_heure, duree))
+    return any(rdv_id != exclude_rdv_id for _, _, rdv_id in conflits)
+
+
+def add_rdv_to_index(rdv_id, medecin_id, date_heure, duree=30):
+    """Record a new booking in an already built index."""
+    medecin_id = int(medecin_id)
+    with _lock:
+        _changement(medecin_id)
+        index = _index.get(medecin_id)
+        if index is not None:
+            index.ajouter(rdv_id, date_heure, _fin_rdv(date_heure, duree))
+
+
+def remove_rdv_from_index(rdv_id, medecin_id, date_heure):
+    """Release the slot of a cancelled booking."""
+    medecin_id = int(medecin_id)
+    with _lock:
+        _changement(medecin_id)
+        index = _index.get(medecin_id)
+        if index is not None:
+            index.retirer(rdv_id, date_heure)
+
+
+def _plages_ouvertes(debut, fin):
+    """Yield the opening-hours ranges between debut and fin."""
+    jour = debut.replace(hour=0, minute=0, second=0, microsecond=0)
+    while jour < fin:
+        if jour.weekday() in JOURS_OUVRES:
+            ouverture = max(jour.replace(hour=HEURE_OUVERTURE), debut)
+            fermeture = min(jour.replace(hour=HEURE_FERMETURE), fin)
+            if ouverture < fermeture:
+                yield ouverture, fermeture
+        jour += timedelta(days=1)
+
+
+def get_free_slots(medecin_id, debut, fin, duree=30):
+    """List the free slots of `duree` minutes for a medecin between debut and fin."""
+    pas = timedelta(minutes=duree)
+    creneaux = []
+    index = get_index(medecin_id)
+    with _lock:
+        for ouverture, fermeture in _plages_ouvertes(debut, fin):
+            curseur = ouverture
+            for occ_debut, occ_fin, _ in index.chevauchements(ouverture, fermeture):
+                while curseur + pas <= min(occ_debut, fermeture):
+                    creneaux.append((curseur, curseur + pas))
+                    curseur += pas
+                if occ_fin > curseur:
+                    curseur = occ_fin
+            while curseur + pas <= fermeture:
+                creneaux.append((curseur, curseur + pas))
+                curseur += pas
+    return creneaux
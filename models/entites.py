@@ -0,0 +1,396 @@
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from itertools import chain
+from threading import Lock, RLock
+import os
+import sqlite3
+import time
+
+from sqlalchemy import event
+
+from config import (ENTITES_TAILLE_MAX, ENTITES_TTL, ENTITES_SIGNAL, ENTITES_SIGNAL_INTERVALLE,
+                    ENTITES_SIGNAL_RETENTION)
+from models import db
+from models.projection import query_columns
+from models.replica import primaire
+
+# Cache des patients et des médecins lus par id (et de la liste complète des
+# médecins), propre au worker. Les lignes sont gardées en tuples compacts
+# (dates et datetimes en entiers) et redevenues dicts à chaque lecture ; la
+# clé est (table, id), ou (table, None) pour la liste. Pendant qu'une lecture
+# en base d'une clé est en cours, la clé a un numéro de version qui avance à
+# chaque écriture validée : une lecture commencée avant l'écriture n'est pas
+# rangée. Les versions ne sont gardées que le temps de ces lectures. Les écritures des autres workers de la machine
+# arrivent par un fichier SQLite (ENTITES_SIGNAL), vérifié au plus toutes les
+# ENTITES_SIGNAL_INTERVALLE secondes ; celles faites hors de l'application ne
+# sont vues qu'après ENTITES_TTL. Le même signal prévient les autres caches
+# du worker (index des disponibilités, fragments, recherche, statistiques)
+# abonnés par abonner() : une clé (nom, id) appelle leur fonction avec l'id,
+# une invalidation complète (import en masse) avec None.
+
+TOUS = None  # invalide tout le cache (import en masse)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECONDE = timedelta(microseconds=1)
+_ABSENT = object()
+
+
+def _datetime_compact(valeur):
+    return None if valeur is None else (valeur - _EPOCH) // _MICROSECONDE
+
+
+def _datetime_developpe(valeur):
+    return None if valeur is None else _EPOCH + timedelta(microseconds=valeur)
+
+
+def _date_compacte(valeur):
+    return None if valeur is None else valeur.toordinal()
+
+
+def _date_developpee(valeur):
+    return None if valeur is None else date.fromordinal(valeur)
+
+
+# Type Python de la colonne -> (compacter, développer)
+CODECS = {
+    datetime: (_datetime_compact, _datetime_developpe),
+    date: (_date_compacte, _date_developpee),
+}
+
+
+class CacheEntites:
+    """LRU of compact records keyed by (table, id), bounded by their number of rows."""
+
+    def __init__(self, taille_max=ENTITES_TAILLE_MAX, ttl=ENTITES_TTL):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self.lock = RLock()
+        self.entrees = OrderedDict()  # (table, id) -> (valeur, taille, expire_le)
+        self.versions = {}  # clé -> (lectures en cours, version), seulement pendant ces lectures
+        self.generation = 0  # avance quand tout le cache est invalidé
+        self.taille = 0
+        self.succes = self.echecs = self.evictions = self.invalidations = 0
+
+    def debut_lecture(self, cle):
+        """Start a database read of a key; returns the version to pass to ecrire().
+
+        Every call must be followed by fin_lecture(cle), stored or not.
+        """
+        with self.lock:
+            lectures, version = self.versions.get(cle, (0, 0))
+            self.versions[cle] = (lectures + 1, version)
+            return self.generation, version
+
+    def fin_lecture(self, cle):
+        with self.lock:
+            lectures, version = self.versions.get(cle, (1, 0))
+            if lectures > 1:
+                self.versions[cle] = (lectures - 1, version)
+            else:
+                self.versions.pop(cle, None)
+
+    def _version(self, cle):
+        return self.generation, self.versions.get(cle, (0, 0))[1]
+
+    def lire(self, cle):
+        with self.lock:
+            entree = self.entrees.get(cle)
+            if entree is not None and entree[2] > time.monotonic():
+                self.entrees.move_to_end(cle)
+                self.succes += 1
+                return entree[0]
+            if entree is not None:
+                self._retirer(cle)
+            self.echecs += 1
+            return _ABSENT
+
+    def ecrire(self, cle, version, valeur, taille=1):
+        """Store a record (or a tuple of `taille` records) read at `version`."""
+        if taille > self.taille_max:
+            return
+        with self.lock:
+            if version != self._version(cle):
+                return  # invalidé pendant la lecture
+            if cle in self.entrees:
+                self._retirer(cle)
+            self.entrees[cle] = (valeur, taille, time.monotonic() + self.ttl)
+            self.taille += taille
+            while self.taille > self.taille_max:
+                self._retirer(next(iter(self.entrees)))
+                self.evictions += 1
+
+    def _retirer(self, cle):
+        _, taille, _ = self.entrees.pop(cle)
+        self.taille -= taille
+
+    def invalider(self, cles=TOUS):
+        with self.lock:
+            self.invalidations += 1
+            if cles is TOUS or TOUS in cles:
+                self.generation += 1
+                self.entrees.clear()
+                self.taille = 0
+                return
+            for cle in cles:
+                if cle in self.versions:  # lecture en cours : son résultat est périmé
+                    lectures, version = self.versions[cle]
+                    self.versions[cle] = (lectures, version + 1)
+                if cle in self.entrees:
+                    self._retirer(cle)
+
+    def metriques(self):
+        with self.lock:
+            lectures = self.succes + self.echecs
+            return {
+                'entrees': len(self.entrees),
+                'lignes': self.taille,
+                'succes': self.succes,
+                'echecs': self.echecs,
+                'taux_succes': self.succes / lectures if lectures else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class SignalInvalidations:
+    """Invalidated keys shared by the workers of a node through a SQLite file.
+
+    Each worker appends the keys its commits invalidate and reads those of
+    the other workers. `PRAGMA data_version` tells, without reading the
+    table, whether another connection wrote since the last check.
+    """
+
+    def __init__(self, chemin=ENTITES_SIGNAL, intervalle=ENTITES_SIGNAL_INTERVALLE,
+                 retention=ENTITES_SIGNAL_RETENTION):
+        self.chemin = chemin
+        self.intervalle = intervalle
+        self.retention = retention
+        self.lock = Lock()
+        self.connexion = None
+        self.pid = None
+        self.curseur = 0
+        self.data_version = None
+        self.verifie_le = time.monotonic()
+        self.cree_le = time.time()
+        self.purge_le = 0
+        self.recues = self.erreurs = 0
+
+    def _connexion(self):
+        """Connection of this process (the lock is held), created after a fork too."""
+        if self.connexion is None or self.pid != os.getpid():
+            connexion = sqlite3.connect(self.chemin, timeout=1, isolation_level=None, check_same_thread=False)
+            connexion.execute('PRAGMA journal_mode=WAL')
+            connexion.execute('PRAGMA synchronous=NORMAL')
+            connexion.execute(
+                'CREATE TABLE IF NOT EXISTS invalidations ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL, '
+                '"table" TEXT, entite_id INTEGER, cree_le REAL NOT NULL)'
+            )
+            self.connexion, self.pid = connexion, os.getpid()
+            # Caches vides au démarrage : seules comptent les invalidations signalées depuis
+            self.curseur = connexion.execute('SELECT COALESCE(MAX(id), 0) FROM invalidations WHERE cree_le < ?',
+                                             (self.cree_le,)).fetchone()[0]
+            self.data_version = None  # lignes suivantes à lire à la première vérification
+        return self.connexion
+
+    def publier(self, cles):
+        """Record keys invalidated by a commit of this worker; TOUS for the whole cache."""
+        maintenant = time.time()
+        lignes = [(os.getpid(), None, None, maintenant)] if cles is TOUS or TOUS in cles else [
+            (os.getpid(), table, entite_id, maintenant) for table, entite_id in cles
+        ]
+        with self.lock:
+            try:
+                connexion = self._connexion()
+                connexion.executemany(
+                    'INSERT INTO invalidations (pid, "table", entite_id, cree_le) VALUES (?, ?, ?, ?)', lignes
+                )
+                if maintenant - self.purge_le > self.retention / 10:
+                    self.purge_le = maintenant
+                    connexion.execute('DELETE FROM invalidations WHERE cree_le < ?', (maintenant - self.retention,))
+            except sqlite3.Error:
+                self.erreurs += 1  # les autres workers ne verront l'écriture qu'après ENTITES_TTL
+
+    def recevoir(self):
+        """Keys invalidated by the other workers since the last call; [] between two checks.
+
+        At most one check every `intervalle` seconds, by the first request
+        thread that gets there; TOUS when this worker has been idle longer
+        than the retention of the signals (some may have been purged).
+        """
+        maintenant = time.monotonic()
+        if maintenant - self.verifie_le < self.intervalle or not self.lock.acquire(blocking=False):
+            return []
+        try:
+            inactif = maintenant - self.verifie_le > self.retention
+            self.verifie_le = maintenant
+            connexion = self._connexion()
+            data_version = connexion.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self.data_version and not inactif:
+                return []
+            self.data_version = data_version
+            lignes = connexion.execute(
+                'SELECT id, pid, "table", entite_id FROM invalidations WHERE id > ? ORDER BY id', (self.curseur,)
+            ).fetchall()
+            if lignes:
+                self.curseur = lignes[-1][0]
+            cles = {(table, entite_id) for _, pid, table, entite_id in lignes if pid != self.pid}
+            self.recues += len(cles)
+            if inactif or any(table is None for table, _ in cles):
+                return TOUS
+            return cles
+        except sqlite3.Error:
+            self.erreurs += 1  # base occupée : nouvel essai à la prochaine échéance
+            return []
+        finally:
+            self.lock.release()
+
+    def metriques(self):
+        return {'recues': self.recues, 'erreurs': self.erreurs}
+
+
+cache = CacheEntites()
+signal = SignalInvalidations()
+
+# Tables suivies : nom -> Entite
+ENTITES = {}
+# Autres caches prévenus par le signal : nom -> fonction(id), id None pour tout
+ABONNES = {}
+
+
+def abonner(nom, invalider_cache):
+    """Have invalider_cache(id) called for the (nom, id) keys signalled, invalider_cache(None) for everything."""
+    ABONNES[nom] = invalider_cache
+
+
+def _appliquer(cles):
+    if cles is TOUS or TOUS in cles:
+        cache.invalider(TOUS)
+        for invalider_cache in ABONNES.values():
+            invalider_cache(None)
+        return
+    entites = {cle for cle in cles if cle[0] in ENTITES}
+    if entites:
+        cache.invalider(entites)
+    for nom, cle_id in cles:
+        if nom in ABONNES:
+            ABONNES[nom](cle_id)
+
+
+def synchroniser():
+    """Apply the keys signalled by the other workers (before_request, and before each cache read)."""
+    cles = signal.recevoir()
+    if cles is TOUS or cles:
+        _appliquer(cles)
+
+
+def signaler(cles):
+    """Tell the other workers of the node to drop (nom, id) keys; TOUS for every cache."""
+    signal.publier(cles)
+
+
+def _cache_utilisable(session):
+    # Écritures de la transaction pas encore validées : la base fait foi
+    return not (session.info.get('entites') or session.new or session.dirty or session.deleted)
+
+
+class Entite:
+    """Read-through cached projection of a table, from its {key: column} mapping (with an 'id' key)."""
+
+    def __init__(self, colonnes):
+        self.colonnes = colonnes
+        self.cles = tuple(colonnes)
+        self.table = colonnes['id'].class_.__tablename__
+        codecs = [CODECS.get(colonne.type.python_type, (None, None)) for colonne in colonnes.values()]
+        self.compacteurs = [compacter for compacter, _ in codecs]
+        self.developpeurs = [developper for _, developper in codecs]
+        self.projections = {}
+        ENTITES[self.table] = self
+
+    def _compacter(self, row):
+        return tuple(valeur if compacter is None else compacter(valeur)
+                     for compacter, valeur in zip(self.compacteurs, row))
+
+    def _projection(self, fields):
+        """(key, index, decoder) of the selected keys, in mapping order; unknown keys are ignored."""
+        fields = tuple(fields) if fields is not None else None
+        projection = self.projections.get(fields)
+        if projection is None:
+            choisis = set(self.cles if fields is None else fields)
+            projection = tuple((cle, i, self.developpeurs[i]) for i, cle in enumerate(self.cles) if cle in choisis)
+            if len(self.projections) < 64:  # `fields` vient de la requête : nombre de formes borné
+                self.projections[fields] = projection
+        return projection
+
+    def _developper(self, record, projection):
+        return {cle: record[i] if developper is None else developper(record[i])
+                for cle, i, developper in projection}
+
+    def _lire(self, cle, charger):
+        """Cached value of a key, or charger() read on the primary and stored."""
+        session = db.session
+        if not _cache_utilisable(session):
+            return charger()
+        synchroniser()
+        valeur = cache.lire(cle)
+        if valeur is not _ABSENT:
+            return valeur
+        version = cache.debut_lecture(cle)
+        try:
+            # Rempli depuis le primaire : une copie en retard du réplica resterait ENTITES_TTL
+            with primaire(session):
+                valeur = charger()
+            if valeur is not None:
+                cache.ecrire(cle, version, valeur, len(valeur) if cle[1] is None else 1)
+        finally:
+            cache.fin_lecture(cle)
+        return valeur
+
+    def par_id(self, entite_id, fields=None):
+        """Row as a dict of the selected keys, or None."""
+        def charger():
+            row = query_columns(self.colonnes).filter(self.colonnes['id'] == entite_id).first()
+            return self._compacter(row) if row is not None else None
+        # Clé du cache : l'id tel que les écritures l'invalident
+        record = self._lire((self.table, entite_id), charger) if type(entite_id) is int else charger()
+        return self._developper(record, self._projection(fields)) if record is not None else None
+
+    def toutes(self, fields=None):
+        """Every row ordered by id, as dicts of the selected keys."""
+        def charger():
+            return tuple(self._compacter(row)
+                         for row in query_columns(self.colonnes).order_by(self.colonnes['id']))
+        projection = self._projection(fields)
+        return [self._developper(record, projection) for record in self._lire((self.table, None), charger)]
+
+
+def invalider(cles=TOUS):
+    """Drop keys from the caches of this worker and signal them to the other workers."""
+    _appliquer(cles)
+    signal.publier(cles)
+
+
+# Lignes touchées : relevées après chaque flush, invalidées une fois la
+# transaction validée (une insertion ne change que la liste)
+@event.listens_for(db.session, 'after_flush')
+def _relever_entites(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table not in ENTITES:
+            continue
+        cles = session.info.setdefault('entites', set())
+        cles.add((table, None))
+        if obj not in session.new:
+            cles.add((table, obj.id))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalider_entites(session):
+    cles = session.info.pop('entites', None)
+    if cles:
+        invalider(cles)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _oublier_entites(session):
+    session.info.pop('entites', None)
@@ -0,0 +1,175 @@
+from queue import Queue, Empty, Full
+from threading import Lock, Thread, local
+import json
+import os
+import sqlite3
+import time
+
+from sqlalchemy import event, inspect
+
+from config import FLUX_JOURNAL, FLUX_INTERVALLE, FLUX_RETENTION, FLUX_MAX_ABONNES
+from models import db, statistiques_model
+from models.medecin_model import Medecin
+from models.rdv_model import RendezVous, StatutRdv
+
+# Journal des changements partagé par tous les workers d'une machine (SQLite) :
+# chaque worker y écrit ses événements et un thread par worker le relit pour
+# les diffuser à ses propres abonnés.
+
+
+# Une connexion par thread (et par processus, après un fork), schéma créé à son ouverture
+_local = local()
+
+
+def _connexion():
+    connexion = getattr(_local, 'connexion', None)
+    if connexion is None or getattr(_local, 'cle', None) != (os.getpid(), FLUX_JOURNAL):
+        connexion = sqlite3.connect(FLUX_JOURNAL, timeout=5, isolation_level=None)
+        connexion.execute('PRAGMA journal_mode=WAL')
+        connexion.execute('PRAGMA synchronous=NORMAL')
+        connexion.execute(
+            'CREATE TABLE IF NOT EXISTS evenements ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, '
+            'donnees TEXT NOT NULL, cree_le REAL NOT NULL)'
+        )
+        _local.connexion, _local.cle = connexion, (os.getpid(), FLUX_JOURNAL)
+    return connexion
+
+
+def _json_defaut(valeur):
+    return valeur.isoformat() if hasattr(valeur, 'isoformat') else str(valeur)
+
+
+def publier(evenements):
+    """Append (type, donnees) events to the shared change log."""
+    if not evenements:
+        return
+    maintenant = time.time()
+    _connexion().executemany(
+        'INSERT INTO evenements (type, donnees, cree_le) VALUES (?, ?, ?)',
+        [(type_, json.dumps(donnees, default=_json_defaut), maintenant) for type_, donnees in evenements]
+    )
+
+
+def lire_depuis(dernier_id, limite=500):
+    """Read the events logged after dernier_id, as (id, type, donnees) tuples."""
+    rows = _connexion().execute(
+        'SELECT id, type, donnees FROM evenements WHERE id > ? ORDER BY id LIMIT ?',
+        (dernier_id, limite)
+    ).fetchall()
+    return [(id_, type_, json.loads(donnees)) for id_, type_, donnees in rows]
+
+
+def dernier_id():
+    return _connexion().execute('SELECT COALESCE(MAX(id), 0) FROM evenements').fetchone()[0]
+
+
+class Broker:
+    """Fan-out of the change log to the SSE subscribers of this worker."""
+
+    def __init__(self):
+        self.abonnes = set()
+        self.lock = Lock()
+        self.thread = None
+        self.curseur = 0
+
+    def abonner(self):
+        """Register a subscriber; returns its queue, or None when the worker is full."""
+        with self.lock:
+            if len(self.abonnes) >= FLUX_MAX_ABONNES:
+                return None
+            file = Queue(maxsize=100)
+            self.abonnes.add(file)
+            if self.thread is None or not self.thread.is_alive():
+                self.curseur = dernier_id()
+                self.thread = Thread(target=self._boucle, name='flux-medecins', daemon=True)
+                self.thread.start()
+            return file
+
+    def desabonner(self, file):
+        with self.lock:
+            self.abonnes.discard(file)
+
+    def diffuser(self, evenement):
+        with self.lock:
+            abonnes = list(self.abonnes)
+        for file in abonnes:
+            try:
+                file.put_nowait(evenement)
+            except Full:
+                # Abonné trop lent : il sera déconnecté et se resynchronisera
+                self.desabonner(file)
+
+    def _boucle(self):
+        derniere_purge = 0
+        while True:
+            with self.lock:
+                if not self.abonnes:
+                    self.thread = None
+                    return
+            try:
+                for evenement in lire_depuis(self.curseur):
+                    self.curseur = evenement[0]
+                    self.diffuser(evenement)
+                if time.time() - derniere_purge > FLUX_RETENTION:
+                    _connexion().execute('DELETE FROM evenements WHERE cree_le < ?', (time.time() - FLUX_RETENTION,))
+                    derniere_purge = time.time()
+            except sqlite3.Error:
+                pass
+            time.sleep(FLUX_INTERVALLE)
+
+
+broker = Broker()
+
+
+def ecouter(file, timeout):
+    """Wait for the next event of a subscriber; None on timeout."""
+    try:
+        return file.get(timeout=timeout)
+    except Empty:
+        return None
+
+
+# Relevé des changements : après chaque flush, puis publication au commit
+@event.listens_for(db.session, 'after_flush')
+def _relever_evenements(session, flush_context):
+    evenements = session.info.setdefault('flux', [])
+    for obj in session.new:
+        if isinstance(obj, Medecin):
+            evenements.append(('medecin_ajoute', {'id': obj.id}))
+        elif isinstance(obj, RendezVous):
+            evenements.append(('rdv_reserve', {'id': obj.id, 'medecin_id': obj.medecin_id, 'date_heure': obj.date_heure}))
+    for obj in session.dirty:
+        if isinstance(obj, Medecin) and session.is_modified(obj):
+            evenements.append(('medecin_modifie', {'id': obj.id}))
+        elif isinstance(obj, RendezVous) and StatutRdv.ANNULE in inspect(obj).attrs.statut.history.added:
+            evenements.append(('rdv_annule', {'id': obj.id, 'medecin_id': obj.medecin_id, 'date_heure': obj.date_heure}))
+    for obj in session.deleted:
+        if isinstance(obj, Medecin):
+            evenements.append(('medecin_supprime', {'id': obj.id}))
+
+
+def relever_rdv_inseres(session, rdvs):
+    """Record rendez-vous inserted without a flush (bulk INSERT): (id, date_heure, medecin_id, statut)."""
+    session.info.setdefault('flux', []).extend(
+        ('rdv_reserve', {'id': rdv_id, 'medecin_id': medecin_id, 'date_heure': date_heure})
+        for rdv_id, date_heure, medecin_id, _ in rdvs)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publier_evenements(session):
+    evenements = session.info.pop('flux', None)
+    if not evenements:
+        return
+    statistiques = statistiques_model.get_statistiques_en_memoire()
+    if statistiques is not None:
+        evenements.append(('statistiques', statistiques))
+    try:
+        publier(evenements)
+    except sqlite3.Error:
+        pass
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _oublier_evenements(session):
+    session.info.pop('flux', None)
@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import chain
+from threading import RLock
+
+from sqlalchemy import event, inspect
+
+from config import FRAGMENTS_TAILLE_MAX, FRAGMENTS_TTL
+from models import db, entites
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.rdv_model import RendezVous
+
+# Cache des fragments rendus par médecin (page de détail), propre au worker.
+# La clé est (medecin_id, version) : la version avance à chaque changement
+# validé de la ligne du médecin ou de l'un de ses rendez-vous, si bien qu'un
+# rendu commencé avant le changement est rangé sous une clé déjà périmée.
+# Les écritures des autres workers ne sont vues qu'après FRAGMENTS_TTL.
+
+TOUS = None  # invalide tous les médecins (nom d'un patient modifié, import en masse)
+
+
+class CacheFragments:
+    """LRU of rendered fragments, bounded by their total size in bytes."""
+
+    def __init__(self, taille_max=FRAGMENTS_TAILLE_MAX, ttl=FRAGMENTS_TTL):
+        self.taille_max = taille_max
+        self.ttl = timedelta(seconds=ttl)
+        self.lock = RLock()
+        self.entrees = OrderedDict()  # (medecin_id, version) -> (valeur, taille, expire_le)
+        self.versions = {}
+        self.generation = 0  # avance quand tout le cache est invalidé
+        self.taille = 0
+        self.succes = self.echecs = self.evictions = self.invalidations = 0
+
+    def version(self, medecin_id):
+        """Current version of a medecin; read it before querying the data to render."""
+        with self.lock:
+            return self.generation, self.versions.get(medecin_id, 0)
+
+    def lire(self, medecin_id, version):
+        cle = (medecin_id, version)
+        with self.lock:
+            entree = self.entrees.get(cle)
+            if entree is not None and entree[2] > datetime.now():
+                self.entrees.move_to_end(cle)
+                self.succes += 1
+                return entree[0]
+            if entree is not None:
+                self._retirer(cle)
+            self.echecs += 1
+            return None
+
+    def ecrire(self, medecin_id, version, valeur, taille, expire_le=None):
+        """Store a fragment rendered from data read at `version`, until expire_le at the latest."""
+        limite = datetime.now() + self.ttl
+        expire_le = min(expire_le, limite) if expire_le else limite
+        if taille > self.taille_max:
+            return
+        cle = (medecin_id, version)
+        with self.lock:
+            if version != self.version(medecin_id):
+                return  # invalidé pendant le rendu
+            if cle in self.entrees:
+                self._retirer(cle)
+            self.entrees[cle] = (valeur, taille, expire_le)
+            self.taille += taille
+            while self.taille > self.taille_max:
+                self._retirer(next(iter(self.entrees)))
+                self.evictions += 1
+
+    def _retirer(self, cle):
+        _, taille, _ = self.entrees.pop(cle)
+        self.taille -= taille
+
+    def invalider(self, medecin_ids=TOUS):
+        with self.lock:
+            self.invalidations += 1
+            if medecin_ids is TOUS:
+                self.generation += 1
+                self.versions.clear()
+                self.entrees.clear()
+                self.taille = 0
+                return
+            for medecin_id in medecin_ids:
+                version = self.version(medecin_id)
+                self.versions[medecin_id] = version[1] + 1
+                cle = (medecin_id, version)
+                if cle in self.entrees:
+                    self._retirer(cle)
+
+    def metriques(self):
+        with self.lock:
+            return {
+                'entrees': len(self.entrees),
+                'octets': self.taille,
+                'succes': self.succes,
+                'echecs': self.echecs,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+cache = CacheFragments()
+# Import en masse (autre processus) : tout est à rendre à nouveau
+entites.abonner('fragments', lambda medecin_id: cache.invalider(TOUS if medecin_id is None else [medecin_id]))
+
+
+def relever_rdv_inseres(session, rdvs):
+    """Record rendez-vous inserted without a flush (bulk INSERT): (id, date_heure, medecin_id, statut)."""
+    session.info.setdefault('fragments', set()).update(medecin_id for _, _, medecin_id, _ in rdvs)
+
+
+# Médecins touchés : relevés après chaque flush, invalidés une fois la
+# transaction validée
+@event.listens_for(db.session, 'after_flush')
+def _relever_medecins(session, flush_context):
+    medecins = session.info.setdefault('fragments', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Medecin):
+            medecins.add(obj.id)
+        elif isinstance(obj, RendezVous):
+            medecins.add(obj.medecin_id)
+            medecins.update(inspect(obj).attrs.medecin_id.history.deleted)  # rendez-vous déplacé
+        elif isinstance(obj, Patient) and obj not in session.new:
+            etat = inspect(obj)
+            if etat.deleted or etat.attrs.nom.history.deleted or etat.attrs.prenom.history.deleted:
+                medecins.add(TOUS)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalider_medecins(session):
+    medecins = session.info.pop('fragments', None)
+    if not medecins:
+        return
+    cache.invalider(TOUS if TOUS in medecins else medecins)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _oublier_medecins(session):
+    session.info.pop('fragments', None)
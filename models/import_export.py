@@ -0,0 +1,244 @@
+import csv
+import json
+import os
+from datetime import date, datetime
+
+from sqlalchemy import exc, select
+
+from config import IMPORT_TAILLE_LOT, EXPORT_TAILLE_LOT
+from models import db
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.rdv_model import RendezVous, StatutRdv
+
+# Tables importables / exportables, avec leurs colonnes obligatoires
+TABLES = {
+    'patients': (Patient.__table__, ('nom', 'prenom', 'email', 'mot_de_passe', 'date_naissance')),
+    'medecins': (Medecin.__table__, ('nom', 'prenom', 'email', 'mot_de_passe', 'specialite')),
+    'rendez_vous': (RendezVous.__table__, ('patient_id', 'medecin_id', 'date_heure')),
+}
+
+# Préfixes des hashs produits par werkzeug.security
+PREFIXES_HASH = ('pbkdf2:', 'scrypt:')
+
+
+class RapportImport:
+    """Counters and per-row errors of an import."""
+
+    def __init__(self, chemin_erreurs=None):
+        self.importees = 0
+        self.erreurs = 0
+        self.derniere_ligne = 0
+        self._fichier = None
+        self._writer = None
+        if chemin_erreurs:
+            nouveau = not os.path.exists(chemin_erreurs)
+            self._fichier = open(chemin_erreurs, 'a', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._fichier)
+            if nouveau:
+                self._writer.writerow(['ligne', 'erreur'])
+
+    def erreur(self, ligne, message):
+        self.erreurs += 1
+        if self._writer:
+            self._writer.writerow([ligne, message])
+
+    def fermer(self):
+        if self._fichier:
+            self._fichier.close()
+
+
+def detecter_format(chemin, format_=None):
+    if format_:
+        return format_
+    return 'ndjson' if chemin.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def lire_lignes(chemin, format_, rapport=None, reprise=0):
+    """Yield (numero de ligne, dict) from a CSV or NDJSON file, one row at a time.
+
+    Lines up to `reprise` are skipped. An NDJSON line that is not a JSON
+    object is reported to `rapport` and yielded as (numero, None).
+    """
+    with open(chemin, newline='', encoding='utf-8') as fichier:
+        if format_ == 'ndjson':
+            for numero, ligne in enumerate(fichier, start=1):
+                if numero <= reprise or not ligne.strip():
+                    continue
+                try:
+                    brute = json.loads(ligne)
+                except json.JSONDecodeError as e:
+                    brute, erreur = None, f'JSON invalide : {e}'
+                else:
+                    erreur = None if isinstance(brute, dict) else f'objet JSON attendu : {type(brute).__name__}'
+                if erreur:
+                    if rapport:
+                        rapport.erreur(numero, erreur)
+                    brute = None
+                yield numero, brute
+        else:
+            for numero, ligne in enumerate(csv.DictReader(fichier), start=2):
+                if numero > reprise:
+                    yield numero, ligne
+
+
+def _convertir(colonne, valeur):
+    if valeur is None or valeur == '':
+        return None
+    type_python = colonne.type.python_type
+    if isinstance(valeur, type_python):
+        return valeur
+    if type_python is datetime:
+        return datetime.fromisoformat(valeur)
+    if type_python is date:
+        return date.fromisoformat(valeur)
+    return type_python(valeur)
+
+
+def preparer_ligne(table, obligatoires, brute, hacher=None):
+    """Convert a raw row into insert values for every column of the table.
+
+    Raises ValueError with a readable message when the row is invalid.
+    """
+    valeurs = {}
+    for colonne in table.columns:
+        if colonne.name == 'id' and not brute.get('id'):
+            continue
+        try:
+            valeurs[colonne.name] = _convertir(colonne, brute.get(colonne.name))
+        except (TypeError, ValueError):
+            raise ValueError(f'{colonne.name} invalide : {brute.get(colonne.name)!r}')
+    manquantes = [nom for nom in obligatoires if valeurs.get(nom) is None]
+    if manquantes:
+        raise ValueError('colonnes manquantes : ' + ', '.join(manquantes))
+    if 'statut' in valeurs and valeurs['statut'] is not None and valeurs['statut'] not in StatutRdv.TOUS:
+        raise ValueError(f"statut inconnu : {valeurs['statut']!r}")
+    if 'mot_de_passe' in valeurs and not valeurs['mot_de_passe'].startswith(PREFIXES_HASH):
+        if hacher is None:
+            raise ValueError('mot_de_passe doit être un hash werkzeug (ou utiliser --hacher-mots-de-passe)')
+        valeurs['mot_de_passe'] = hacher(valeurs['mot_de_passe'])
+    # Les colonnes absentes reçoivent leur valeur par défaut : toutes les
+    # lignes d'un lot doivent avoir les mêmes clés pour l'INSERT multiple
+    maintenant = datetime.utcnow()
+    for colonne in table.columns:
+        if valeurs.get(colonne.name) is None and colonne.default is not None:
+            valeurs[colonne.name] = colonne.default.arg if colonne.default.is_scalar else maintenant
+    return valeurs
+
+
+def _inserer_lot(table, lot, rapport):
+    """Insert one batch with executemany; on failure, find the bad rows one by one."""
+    try:
+        with db.engine.begin() as connexion:
+            connexion.execute(table.insert(), [valeurs for _, valeurs in lot])
+        rapport.importees += len(lot)
+        return
+    except exc.DBAPIError:
+        pass
+    for numero, valeurs in lot:
+        try:
+            with db.engine.begin() as connexion:
+                connexion.execute(table.insert(), [valeurs])
+            rapport.importees += 1
+        except exc.DBAPIError as e:
+            rapport.erreur(numero, str(e.orig).splitlines()[0])
+
+
+def _lire_checkpoint(chemin):
+    if chemin and os.path.exists(chemin):
+        with open(chemin, encoding='utf-8') as fichier:
+            return json.load(fichier)
+    return None
+
+
+def _ecrire_checkpoint(chemin, donnees):
+    if not chemin:
+        return
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump(donnees, fichier)
+    os.replace(temporaire, chemin)
+
+
+def importer(nom_table, chemin, format_=None, taille_lot=IMPORT_TAILLE_LOT, chemin_erreurs=None,
+             chemin_checkpoint=None, hacher=None, progression=None):
+    """Bulk-load a CSV/NDJSON file into a table with batched Core inserts.
+
+    Each batch is committed on its own; after each batch the last committed
+    line is written to the checkpoint file, so a new run with the same
+    checkpoint resumes after it. Invalid rows go to the error report and do
+    not stop the import. Returns the RapportImport.
+    """
+    table, obligatoires = TABLES[nom_table]
+    format_ = detecter_format(chemin, format_)
+    checkpoint = _lire_checkpoint(chemin_checkpoint)
+    reprise = 0
+    rapport = RapportImport(chemin_erreurs)
+    if checkpoint and checkpoint.get('fichier') == os.path.abspath(chemin) and checkpoint.get('table') == nom_table:
+        reprise = checkpoint['ligne']
+        rapport.importees = checkpoint['importees']
+        rapport.erreurs = checkpoint['erreurs']
+
+    def valider(dernier_numero):
+        rapport.derniere_ligne = dernier_numero
+        _ecrire_checkpoint(chemin_checkpoint, {
+            'fichier': os.path.abspath(chemin), 'table': nom_table, 'ligne': dernier_numero,
+            'importees': rapport.importees, 'erreurs': rapport.erreurs
+        })
+        if progression:
+            progression(rapport)
+
+    try:
+        lot = []
+        numero = reprise
+        for numero, brute in lire_lignes(chemin, format_, rapport, reprise):
+            if brute is None:
+                continue  # déjà dans le rapport d'erreurs
+            try:
+                lot.append((numero, preparer_ligne(table, obligatoires, brute, hacher)))
+            except ValueError as e:
+                rapport.erreur(numero, str(e))
+            if len(lot) >= taille_lot:
+                _inserer_lot(table, lot, rapport)
+                lot = []
+                valider(numero)
+        if lot:
+            _inserer_lot(table, lot, rapport)
+        valider(numero)
+    finally:
+        rapport.fermer()
+    _invalider_caches()
+    return rapport
+
+
+def _invalider_caches():
+    """Core inserts bypass the ORM events: drop every cache, here and in the web workers of the node."""
+    from models import entites
+    entites.invalider()
+
+
+def exporter(nom_table, sortie, format_='csv', taille_lot=EXPORT_TAILLE_LOT, avec_mots_de_passe=False):
+    """Stream a whole table to a CSV/NDJSON file object from a server-side cursor.
+
+    Returns the number of exported rows.
+    """
+    table, _ = TABLES[nom_table]
+    colonnes = [c for c in table.columns if avec_mots_de_passe or c.name != 'mot_de_passe']
+    noms = [c.name for c in colonnes]
+    writer = None
+    if format_ == 'csv':
+        writer = csv.writer(sortie)
+        writer.writerow(noms)
+    total = 0
+    with db.engine.connect() as connexion:
+        resultat = connexion.execution_options(stream_results=True, yield_per=taille_lot)\
+            .execute(select(*colonnes).order_by(table.c.id))
+        for lot in resultat.partitions():
+            for row in lot:
+                valeurs = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in row]
+                if writer:
+                    writer.writerow(valeurs)
+                else:
+                    sortie.write(json.dumps(dict(zip(noms, valeurs)), ensure_ascii=False) + '\n')
+            total += len(lot)
+    return total
@@ -1,4 +1,5 @@
 from models import db
+from models.entites import Entite
 from datetime import datetime
 
 class Medecin(db.Model):
@@ -18,9 +19,30 @@ class Medecin(db.Model):
     # Relations
     rendez_vous = db.relationship('RendezVous', backref='medecin', lazy=True)
     
+    # Version de la table (MAX(updated_at)) pour les réponses conditionnelles
+    __table_args__ = (
+        db.Index('ix_medecins_updated_at', 'updated_at'),
+    )
+
     def __repr__(self):
         return f'<Medecin Dr. {self.prenom} {self.nom}>'
 
+# Colonnes exposées par les helpers (jamais le mot de passe)
+MEDECIN_COLUMNS = {
+    'id': Medecin.id,
+    'nom': Medecin.nom,
+    'prenom': Medecin.prenom,
+    'email': Medecin.email,
+    'specialite': Medecin.specialite,
+    'telephone': Medecin.telephone,
+    'adresse': Medecin.adresse,
+    'created_at': Medecin.created_at,
+    'updated_at': Medecin.updated_at
+}
+
+# Lectures par id et liste servies par le cache des entités du worker (models/entites.py)
+MEDECINS = Entite(MEDECIN_COLUMNS)
+
 # Helper functions for medecin operations
 def create_medecin(nom, prenom, email, mot_de_passe, specialite, telephone=None, adresse=None):
     """Create a new medecin."""
@@ -41,37 +63,10 @@ def create_medecin(nom, prenom, email, mot_de_passe, specialite, telephone=None,
         db.session.rollback()
         return None
 
-def get_medecin_by_id(medecin_id):
-    """Get a medecin by ID."""
-    medecin = Medecin.query.get(medecin_id)
-    if medecin:
-        return {
-            'id': medecin.id,
-            'nom': medecin.nom,
-            'prenom': medecin.prenom,
-            'email': medecin.email,
-            'specialite': medecin.specialite,
-            'telephone': medecin.telephone,
-            'adresse': medecin.adresse,
-            'created_at': medecin.created_at,
-            'updated_at': medecin.updated_at
-        }
-    return None
+def get_medecin_by_id(medecin_id, fields=None):
+    """Get a medecin by ID (cached per worker, invalidated on commit)."""
+    return MEDECINS.par_id(medecin_id, fields)
 
-def get_medecins():
-    """Get all medecins."""
-    medecins = Medecin.query.all()
-    return [
-        {
-            'id': m.id,
-            'nom': m.nom,
-            'prenom': m.prenom,
-            'email': m.email,
-            'specialite': m.specialite,
-            'telephone': m.telephone,
-            'adresse': m.adresse,
-            'created_at': m.created_at,
-            'updated_at': m.updated_at
-        }
-        for m in medecins
-    ]
+def get_medecins(fields=None):
+    """Get all medecins, ordered by id (cached per worker, invalidated on commit)."""
+    return MEDECINS.toutes(fields)
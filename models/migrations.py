@@ -0,0 +1,226 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from models import db
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.rdv_model import RendezVous, StatutRdv
+from models.reservation_model import VerrouAgenda, CleIdempotence
+from models.rapports_model import RollupJournalier, EtatRollup
+from models.archive_model import RendezVousArchive
+from models.taches import Tache, StatutTache
+from models.version_model import VersionTable, TABLES_VERSIONNEES, table_version_query
+
+# Migrations versionnées : (version, description, fonction(connexion)).
+# Chaque fonction doit pouvoir être rejouée sans erreur sur une base où le
+# changement existe déjà (create_all récent, application interrompue...).
+
+
+def _creer_index(connexion, index):
+    """Create an index if missing; online (no table lock) on MariaDB/MySQL."""
+    existants = {i['name'] for i in inspect(connexion).get_indexes(index.table.name)}
+    if index.name in existants:
+        return
+    ddl = str(CreateIndex(index).compile(dialect=connexion.dialect))
+    if connexion.dialect.name in ('mysql', 'mariadb'):
+        ddl += ' ALGORITHM=INPLACE LOCK=NONE'
+    connexion.execute(text(ddl))
+
+
+def _creer_declencheur(connexion, nom, ddl):
+    """Create a trigger if missing (MariaDB/MySQL: no CREATE TRIGGER IF NOT EXISTS on every version)."""
+    if connexion.dialect.name in ('mysql', 'mariadb'):
+        existe = text('SELECT 1 FROM information_schema.TRIGGERS '
+                      'WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = :nom')
+    else:
+        existe = text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :nom")
+    if connexion.execute(existe, {'nom': nom}).first() is None:
+        connexion.execute(text(f'CREATE TRIGGER {nom} {ddl}'))
+
+
+def _index_de(model, *noms):
+    return [i for i in model.__table__.indexes if i.name in noms]
+
+
+def _m001_schema_initial(connexion):
+    db.metadata.create_all(connexion, tables=[Patient.__table__, Medecin.__table__, RendezVous.__table__])
+
+
+def _m002_index_rendez_vous(connexion):
+    for index in _index_de(RendezVous, 'ix_rdv_medecin_date', 'ix_rdv_patient_date', 'ix_rdv_patient_statut',
+                           'ix_rdv_statut_date', 'ix_rdv_date_heure'):
+        _creer_index(connexion, index)
+
+
+def _m003_index_updated_at(connexion):
+    for model in (Medecin, Patient, RendezVous):
+        for index in model.__table__.indexes:
+            if index.name.endswith('_updated_at'):
+                _creer_index(connexion, index)
+
+
+def _m004_reservations(connexion):
+    db.metadata.create_all(connexion, tables=[VerrouAgenda.__table__, CleIdempotence.__table__])
+
+
+def _m005_rollup_journalier(connexion):
+    db.metadata.create_all(connexion, tables=[RollupJournalier.__table__, EtatRollup.__table__])
+
+
+def _m006_archive_rendez_vous(connexion):
+    db.metadata.create_all(connexion, tables=[RendezVousArchive.__table__])
+
+
+def _m007_taches(connexion):
+    db.metadata.create_all(connexion, tables=[Tache.__table__])
+
+
+def _m008_versions_tables(connexion):
+    # Un compteur de suppressions par table remplace COUNT(id) dans get_table_version
+    db.metadata.create_all(connexion, tables=[VersionTable.__table__])
+    # MariaDB/MySQL exigent FROM DUAL pour un SELECT sans table avec WHERE ; SQLite ne connaît pas DUAL
+    dual = ' FROM DUAL' if connexion.dialect.name in ('mysql', 'mariadb') else ''
+    for table in TABLES_VERSIONNEES:
+        connexion.execute(text(
+            f'INSERT INTO versions_tables (nom, suppressions) SELECT :nom, 0{dual} '
+            'WHERE NOT EXISTS (SELECT 1 FROM versions_tables WHERE nom = :nom)'
+        ), {'nom': table})
+        _creer_declencheur(connexion, f'tr_{table}_suppressions', f'AFTER DELETE ON {table} FOR EACH ROW '
+                           f"BEGIN UPDATE versions_tables SET suppressions = suppressions + 1 WHERE nom = '{table}'; END")
+
+
+def _m009_compteurs_ecritures(connexion):
+    # Insertions et mises à jour comptées aussi : MAX(id) et MAX(updated_at)
+    # (à la seconde près sur MariaDB) ne voient ni deux mises à jour dans la
+    # même seconde ni un import d'ids anciens avec des updated_at anciens
+    colonnes = {c['name'] for c in inspect(connexion).get_columns('versions_tables')}
+    if 'modifications' not in colonnes:
+        connexion.execute(text('ALTER TABLE versions_tables ADD COLUMN modifications BIGINT NOT NULL DEFAULT 0'))
+    for table in TABLES_VERSIONNEES:
+        for evenement, suffixe in (('INSERT', 'insertions'), ('UPDATE', 'modifications')):
+            _creer_declencheur(connexion, f'tr_{table}_{suffixe}', f'AFTER {evenement} ON {table} FOR EACH ROW '
+                               f"BEGIN UPDATE versions_tables SET modifications = modifications + 1 WHERE nom = '{table}'; END")
+
+
+MIGRATIONS = [
+    (1, 'Schéma initial (patients, medecins, rendez_vous)', _m001_schema_initial),
+    (2, 'Index composites des chemins fréquents de rendez_vous', _m002_index_rendez_vous),
+    (3, 'Index updated_at pour les versions de tables', _m003_index_updated_at),
+    (4, 'Verrous d\'agenda et clés d\'idempotence des réservations', _m004_reservations),
+    (5, 'Agrégats journaliers des rendez-vous (rapports d\'occupation)', _m005_rollup_journalier),
+    (6, 'Archive des rendez-vous terminés ou annulés', _m006_archive_rendez_vous),
+    (7, 'File des tâches de fond', _m007_taches),
+    (8, 'Compteurs de suppressions pour les versions de tables', _m008_versions_tables),
+    (9, 'Compteurs d\'insertions et de mises à jour pour les versions de tables', _m009_compteurs_ecritures),
+]
+
+
+def _table_versions(connexion):
+    connexion.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, applique_le DATETIME NOT NULL)'
+    ))
+
+
+def current_version(connexion=None):
+    """Return the highest applied migration version (0 for an empty database)."""
+    if connexion is None:
+        with db.engine.begin() as connexion:
+            return current_version(connexion)
+    _table_versions(connexion)
+    return connexion.execute(text('SELECT COALESCE(MAX(version), 0) FROM schema_version')).scalar()
+
+
+def upgrade(cible=None, log=print):
+    """Apply the pending migrations in order, each in its own transaction.
+
+    Returns the list of applied versions.
+    """
+    appliquees = []
+    for version, description, fonction in MIGRATIONS:
+        if cible is not None and version > cible:
+            break
+        with db.engine.begin() as connexion:
+            if version <= current_version(connexion):
+                continue
+            log(f'Migration {version:03d} : {description}')
+            fonction(connexion)
+            connexion.execute(
+                text('INSERT INTO schema_version (version, description, applique_le) VALUES (:v, :d, :t)'),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        appliquees.append(version)
+    return appliquees
+
+
+# Requêtes des chemins critiques, vérifiées par check_query_plans()
+def hot_queries():
+    maintenant = datetime(2030, 1, 1)
+    return {
+        'disponibilites médecin': db.session.query(RendezVous.id, RendezVous.date_heure, RendezVous.duree)
+            .filter(RendezVous.medecin_id == 1, RendezVous.statut != StatutRdv.ANNULE)
+            .order_by(RendezVous.date_heure),
+        'rdv d\'un patient': db.session.query(RendezVous.id, Medecin.nom)
+            .join(Medecin, RendezVous.medecin_id == Medecin.id)
+            .filter(RendezVous.patient_id == 1).order_by(RendezVous.date_heure),
+        'prochains rdv d\'un patient': db.session.query(RendezVous.id)
+            .filter(RendezVous.patient_id == 1, RendezVous.date_heure >= maintenant,
+                    RendezVous.statut.in_(StatutRdv.A_VENIR))
+            .order_by(RendezVous.date_heure).limit(3),
+        'derniers rdv d\'un patient': db.session.query(RendezVous.id)
+            .filter(RendezVous.patient_id == 1).order_by(RendezVous.date_heure.desc()).limit(5),
+        'rdv par statut d\'un patient': db.session.query(RendezVous.statut, db.func.count(RendezVous.id))
+            .filter(RendezVous.patient_id == 1).group_by(RendezVous.statut),
+        'rdv à venir (statistiques)': db.session.query(RendezVous.id, RendezVous.medecin_id)
+            .filter(RendezVous.date_heure >= maintenant, RendezVous.statut != StatutRdv.ANNULE),
+        'prochains rdv d\'un médecin': db.session.query(RendezVous.id, Patient.nom)
+            .join(Patient, RendezVous.patient_id == Patient.id)
+            .filter(RendezVous.medecin_id == 1, RendezVous.date_heure >= maintenant)
+            .order_by(RendezVous.date_heure),
+        '/api/rdv?statut=': db.session.query(RendezVous.id)
+            .filter(RendezVous.statut == StatutRdv.PLANIFIE).order_by(RendezVous.date_heure, RendezVous.id).limit(100),
+        'rdv à archiver': db.session.query(RendezVous.id)
+            .filter(RendezVous.statut.in_((StatutRdv.TERMINE, StatutRdv.ANNULE)), RendezVous.date_heure < maintenant)
+            .limit(500),
+        'rdv archivés d\'un patient': db.session.query(RendezVousArchive.id, Medecin.nom)
+            .join(Medecin, RendezVousArchive.medecin_id == Medecin.id)
+            .filter(RendezVousArchive.patient_id == 1).order_by(RendezVousArchive.date_heure),
+        'tâches échues': db.session.query(Tache.id, Tache.executer_apres)
+            .filter(Tache.statut == StatutTache.EN_ATTENTE, Tache.executer_apres <= maintenant)
+            .order_by(Tache.executer_apres).limit(500),
+        'nouvelles tâches': db.session.query(Tache.id, Tache.executer_apres)
+            .filter(Tache.id > 1, Tache.statut == StatutTache.EN_ATTENTE).order_by(Tache.id).limit(500),
+        'tâches terminées à purger': db.session.query(Tache.id)
+            .filter(Tache.statut == StatutTache.TERMINEE, Tache.termine_le < maintenant).limit(500),
+        'version rendez_vous': db.session.query(db.func.max(RendezVous.updated_at)),
+        'version medecins': db.session.query(db.func.max(Medecin.updated_at)),
+        'get_table_version(rendez_vous)': table_version_query(RendezVous),
+        'get_table_version(medecins)': table_version_query(Medecin),
+        'get_table_version(patients)': table_version_query(Patient),
+    }
+
+
+# "SCAN <table>" dans EXPLAIN QUERY PLAN est un parcours complet, de la table
+# ou d'un index entier ("SCAN rendez_vous USING INDEX ..."), contrairement à
+# "SEARCH ... USING INDEX (col=?)" ; "SCAN CONSTANT ROW" (SELECT sans FROM) ne lit rien
+_PARCOURS_COMPLET = re.compile(r'^SCAN (TABLE )?(?!CONSTANT ROW)\w+')
+
+
+def check_query_plans():
+    """Run EXPLAIN QUERY PLAN (SQLite) on the hot queries.
+
+    Returns {nom: [lignes du plan]} for the queries that fall back to a
+    full table scan; an empty dict means every hot query uses an index.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('La vérification des plans utilise EXPLAIN QUERY PLAN de SQLite')
+    regressions = {}
+    for nom, query in hot_queries().items():
+        sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        if any(_PARCOURS_COMPLET.match(ligne) for ligne in plan):
+            regressions[nom] = plan
+    return regressions
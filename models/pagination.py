@@ -0,0 +1,70 @@
+import base64
+import json
+from datetime import date, datetime
+
+from models import db
+
+
+def encode_cursor(valeurs):
+    """Encode the key values of the last row into an opaque cursor."""
+    brut = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in valeurs])
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, cles):
+    """Decode a cursor back into key values; raises ValueError if it is invalid."""
+    try:
+        brut = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valeurs = json.loads(brut)
+    except Exception:
+        raise ValueError('Curseur invalide')
+    if not isinstance(valeurs, list) or len(valeurs) != len(cles):
+        raise ValueError('Curseur invalide')
+    resultat = []
+    for col, valeur in zip(cles.values(), valeurs):
+        # Curseur forgé : une valeur d'un autre type donnerait une 500 plus loin
+        try:
+            if col.type.python_type is datetime:
+                valeur = datetime.fromisoformat(valeur)
+            elif not isinstance(valeur, (str, int, float)):
+                raise TypeError(type(valeur).__name__)
+        except (TypeError, ValueError):
+            raise ValueError('Curseur invalide')
+        resultat.append(valeur)
+    return resultat
+
+
+def keyset_filter(cles, valeurs):
+    """Build `(k1, k2, ...) > (v1, v2, ...)` expanded as OR/AND so indexes apply."""
+    colonnes_cle = list(cles.values())
+    conditions = []
+    for i, (col, valeur) in enumerate(zip(colonnes_cle, valeurs)):
+        egalites = [colonnes_cle[j] == valeurs[j] for j in range(i)]
+        conditions.append(db.and_(*egalites, col > valeur))
+    return db.or_(*conditions)
+
+
+def paginate(query, cles, after=None, limit=100):
+    """Return one page of a projected query ordered by its key columns.
+
+    `cles` maps the selected labels to their columns, e.g.
+    {'date_heure': RendezVous.date_heure, 'id': RendezVous.id}; together they
+    must be unique (end with the primary key).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if after:
+        query = query.filter(keyset_filter(cles, decode_cursor(after, cles)))
+    rows = query.order_by(*cles.values()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        dernier = rows[-1]._mapping
+        next_cursor = encode_cursor([dernier[cle] for cle in cles])
+    return rows, next_cursor
+
+
+def stream(query, cles, chunk_size=500):
+    """Yield the rows of a query from a server-side cursor, chunk_size at a time."""
+    query = query.order_by(*cles.values()).execution_options(stream_results=True, yield_per=chunk_size)
+    for row in query:
+        yield row
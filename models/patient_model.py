@@ -1,4 +1,6 @@
 from models import db
+from models.projection import query_columns, fetch_one
+from models.entites import Entite
 from datetime import datetime
 
 class Patient(db.Model):
@@ -17,43 +19,44 @@ class Patient(db.Model):
     # Relations
     rendez_vous = db.relationship('RendezVous', backref='patient', lazy=True)
     
+    # Version de la table (MAX(updated_at)) pour les réponses conditionnelles
+    __table_args__ = (
+        db.Index('ix_patients_updated_at', 'updated_at'),
+    )
+
     def __repr__(self):
         return f'<Patient {self.prenom} {self.nom}>'
 
+# Colonnes exposées par les helpers (jamais le mot de passe)
+PATIENT_COLUMNS = {
+    'id': Patient.id,
+    'nom': Patient.nom,
+    'prenom': Patient.prenom,
+    'email': Patient.email,
+    'date_naissance': Patient.date_naissance,
+    'telephone': Patient.telephone,
+    'created_at': Patient.created_at,
+    'updated_at': Patient.updated_at
+}
+
+# Connexion : seules colonnes lues pour vérifier le mot de passe
+PATIENT_AUTH_COLUMNS = {
+    'id': Patient.id,
+    'mot_de_passe': Patient.mot_de_passe
+}
+
+# Lectures par id servies par le cache des entités du worker (models/entites.py)
+PATIENTS = Entite(PATIENT_COLUMNS)
+
 # Helper functions for patient operations
-def get_patient_by_email(email):
-    """Get a patient by email address."""
-    patient = Patient.query.filter_by(email=email).first()
-    if patient:
-        return {
-            'id': patient.id,
-            'nom': patient.nom,
-            'prenom': patient.prenom,
-            'email': patient.email,
-            'mot_de_passe': patient.mot_de_passe,
-            'date_naissance': patient.date_naissance,
-            'telephone': patient.telephone,
-            'created_at': patient.created_at,
-            'updated_at': patient.updated_at
-        }
-    return None
+def get_patient_by_email(email, fields=None):
+    """Get a patient by email address (id and password hash by default, for the login)."""
+    colonnes = {**PATIENT_AUTH_COLUMNS, **PATIENT_COLUMNS} if fields else PATIENT_AUTH_COLUMNS
+    return fetch_one(query_columns(colonnes, fields).filter(Patient.email == email))
 
-def get_patient_by_id(patient_id):
-    """Get a patient by ID."""
-    patient = Patient.query.get(patient_id)
-    if patient:
-        return {
-            'id': patient.id,
-            'nom': patient.nom,
-            'prenom': patient.prenom,
-            'email': patient.email,
-            'mot_de_passe': patient.mot_de_passe,
-            'date_naissance': patient.date_naissance,
-            'telephone': patient.telephone,
-            'created_at': patient.created_at,
-            'updated_at': patient.updated_at
-        }
-    return None
+def get_patient_by_id(patient_id, fields=None):
+    """Get a patient by ID (cached per worker, invalidated on commit)."""
+    return PATIENTS.par_id(patient_id, fields)
 
 def create_patient(nom, prenom, email, mot_de_passe, date_naissance, telephone=None):
     """Create a new patient."""
@@ -73,6 +76,19 @@ def create_patient(nom, prenom, email, mot_de_passe, date_naissance, telephone=N
         db.session.rollback()
         return None
 
+def update_password(patient_id, mot_de_passe):
+    """Replace a patient's password hash."""
+    try:
+        patient = Patient.query.get(patient_id)
+        if patient:
+            patient.mot_de_passe = mot_de_passe
+            db.session.commit()
+            return True
+        return False
+    except Exception as e:
+        db.session.rollback()
+        return False
+
 def update_patient(patient_id, nom, prenom, email, date_naissance, telephone=None):
     """Update an existing patient's information."""
     try:
@@ -0,0 +1,53 @@
+from models import db
+
+# Helpers for column-projected queries: each helper selects only the columns
+# it serializes (as labelled columns) and builds dicts straight from the rows,
+# without loading ORM entities.
+
+
+def parse_fields(valeur):
+    """Parse a `fields=a,b,c` query parameter; None (all columns) when absent or empty."""
+    if not valeur:
+        return None
+    fields = tuple(cle.strip() for cle in valeur.split(',') if cle.strip())
+    return fields or None
+
+
+def select_columns(colonnes, fields=None):
+    """Return labelled columns from a {key: column} mapping.
+
+    When `fields` is given, only those keys are selected; unknown keys are
+    ignored. The mapping order is kept.
+    """
+    if fields is not None:
+        fields = set(fields)
+        colonnes = {cle: col for cle, col in colonnes.items() if cle in fields}
+    return [col.label(cle) for cle, col in colonnes.items()]
+
+
+def query_columns(colonnes, fields=None):
+    """Start a session query over the projected columns."""
+    return db.session.query(*select_columns(colonnes, fields))
+
+
+def as_dicts(rows):
+    """Build one dict per row from the row tuples, the labels being read once."""
+    rows = iter(rows)
+    premiere = next(rows, None)
+    if premiere is None:
+        return []
+    cles = premiere._fields
+    resultat = [dict(zip(cles, premiere))]
+    resultat.extend(dict(zip(cles, row)) for row in rows)
+    return resultat
+
+
+def fetch_all(query):
+    """Run a projected query and return one dict per row."""
+    return as_dicts(query)
+
+
+def fetch_one(query):
+    """Run a projected query and return the first row as a dict, or None."""
+    row = query.first()
+    return dict(zip(row._fields, row)) if row is not None else None
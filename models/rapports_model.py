@@ -0,0 +1,264 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import case, delete, insert, select, type_coerce, union_all
+
+from config import HEURE_OUVERTURE, HEURE_FERMETURE, JOURS_OUVRES, RAPPORTS_MARGE, RAPPORTS_JOURS_INCREMENTAL
+from models import db
+from models.medecin_model import Medecin
+from models.rdv_model import RendezVous, StatutRdv
+from models.archive_model import RendezVousArchive
+
+# Rapports d'occupation calculés sur des agrégats journaliers : une ligne par
+# médecin, jour et heure de début, avec les nombres de rendez-vous par statut
+# et les minutes réservées (hors annulations). Les agrégats sont tenus à jour
+# par `flask --app app rapports-actualiser`, qui ne recalcule que les
+# (médecin, jour) des rendez-vous modifiés depuis son dernier passage
+# (updated_at) ; --complet reconstruit tout (après une correction manuelle en
+# base, par exemple). Les rapports sont calculés avec NumPy sur ces lignes.
+
+
+class RollupJournalier(db.Model):
+    __tablename__ = 'rdv_daily_rollup'
+
+    jour = db.Column(db.Date, primary_key=True)
+    medecin_id = db.Column(db.Integer, primary_key=True)
+    heure = db.Column(db.SmallInteger, primary_key=True)  # heure de début des rendez-vous
+    planifies = db.Column(db.Integer, nullable=False, default=0)
+    confirmes = db.Column(db.Integer, nullable=False, default=0)
+    annules = db.Column(db.Integer, nullable=False, default=0)
+    termines = db.Column(db.Integer, nullable=False, default=0)
+    minutes = db.Column(db.Integer, nullable=False, default=0)  # durées cumulées, hors annulations
+
+    __table_args__ = (
+        db.Index('ix_rdv_daily_rollup_medecin_jour', 'medecin_id', 'jour'),
+    )
+
+
+class EtatRollup(db.Model):
+    __tablename__ = 'rdv_daily_rollup_etat'
+
+    id = db.Column(db.Integer, primary_key=True)  # une seule ligne (id = 1)
+    traite_jusqu_au = db.Column(db.DateTime, nullable=True)  # plus grand updated_at déjà agrégé
+    recalculs = db.Column(db.Integer, nullable=False, default=0)
+    modifie_le = db.Column(db.DateTime, nullable=True)  # dernier changement des agrégats
+
+
+RAPPORTS = ('heatmap', 'annulations', 'non_honores', 'percentiles')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _agregats(filtre=lambda model: []):
+    """Columns of the rollup, computed from rendez_vous and its archive (GROUP BY medecin, jour, heure).
+
+    `filtre(model)` returns the conditions applied to each of the two tables.
+    """
+    source = union_all(*[
+        select(model.medecin_id, model.date_heure, model.duree, model.statut).where(*filtre(model))
+        for model in (RendezVous, RendezVousArchive)
+    ]).subquery()
+    jour = db.func.date(source.c.date_heure, type_=db.Date)
+    heure = db.extract('hour', source.c.date_heure)
+
+    def compte(statut):
+        return db.func.sum(case((source.c.statut == statut, 1), else_=0))
+
+    minutes = db.func.sum(case((source.c.statut == StatutRdv.ANNULE, 0), else_=db.func.coalesce(source.c.duree, 30)))
+    colonnes = [jour, source.c.medecin_id, heure, compte(StatutRdv.PLANIFIE), compte(StatutRdv.CONFIRME),
+                compte(StatutRdv.ANNULE), compte(StatutRdv.TERMINE), minutes]
+    return select(*colonnes).group_by(jour, source.c.medecin_id, heure)
+
+
+def _inserer_agregats(requete):
+    cibles = ['jour', 'medecin_id', 'heure', 'planifies', 'confirmes', 'annules', 'termines', 'minutes']
+    return db.session.execute(insert(RollupJournalier).from_select(cibles, requete)).rowcount
+
+
+def _etat():
+    etat = db.session.get(EtatRollup, 1, with_for_update=True)
+    if etat is None:
+        etat = EtatRollup(id=1, recalculs=0)
+        db.session.add(etat)
+    return etat
+
+
+def actualiser(complet=False, log=print):
+    """Bring the rollups up to date; returns the number of (medecin, jour) recomputed (None: full rebuild).
+
+    Rendez-vous are never moved to another day nor deleted by the
+    application (archived ones stay in the aggregates), so the days to
+    recompute are found from updated_at alone.
+    """
+    etat = _etat()
+    maximum = db.session.query(db.func.max(RendezVous.updated_at)).scalar()
+    if not complet and etat.traite_jusqu_au is not None:
+        if maximum is None or maximum <= etat.traite_jusqu_au:
+            db.session.commit()
+            return 0
+        # Relit une marge avant le dernier updated_at traité : des transactions
+        # encore ouvertes au passage précédent ont pu valider des lignes plus anciennes
+        depuis = etat.traite_jusqu_au - timedelta(seconds=RAPPORTS_MARGE)
+        jour = db.func.date(RendezVous.date_heure, type_=db.Date)
+        modifies = db.session.query(jour, RendezVous.medecin_id).filter(RendezVous.updated_at > depuis)\
+            .group_by(jour, RendezVous.medecin_id).all()
+        par_jour = {}
+        for jour_modifie, medecin_id in modifies:
+            par_jour.setdefault(jour_modifie, set()).add(medecin_id)
+        if len(par_jour) <= RAPPORTS_JOURS_INCREMENTAL:
+            for jour_modifie, medecins in sorted(par_jour.items()):
+                debut = datetime.combine(jour_modifie, datetime.min.time())
+                db.session.execute(delete(RollupJournalier).where(
+                    RollupJournalier.jour == jour_modifie, RollupJournalier.medecin_id.in_(medecins)))
+                _inserer_agregats(_agregats(lambda model: [
+                    model.date_heure >= debut, model.date_heure < debut + timedelta(days=1),
+                    model.medecin_id.in_(medecins)]))
+            etat.traite_jusqu_au = maximum
+            etat.recalculs += 1
+            etat.modifie_le = datetime.utcnow()
+            db.session.commit()
+            log(f'{len(modifies)} (médecin, jour) recalculé(s) sur {len(par_jour)} jour(s)')
+            return len(modifies)
+        log(f'{len(par_jour)} jours modifiés (> {RAPPORTS_JOURS_INCREMENTAL}) : reconstruction complète')
+
+    db.session.execute(delete(RollupJournalier))
+    lignes = _inserer_agregats(_agregats())
+    etat.traite_jusqu_au = maximum
+    etat.recalculs += 1
+    etat.modifie_le = datetime.utcnow()
+    db.session.commit()
+    log(f'Agrégats reconstruits : {lignes} ligne(s)')
+    return None
+
+
+def get_version():
+    """(recalculs, modifie_le) of the rollups, for conditional responses."""
+    etat = db.session.get(EtatRollup, 1)
+    return (etat.recalculs, etat.modifie_le) if etat else (0, None)
+
+
+def _charger(debut, fin, medecin_id=None, specialite=None):
+    """Rollup rows of [debut, fin] as NumPy columns."""
+    colonnes = [type_coerce(RollupJournalier.jour, db.String), RollupJournalier.medecin_id, RollupJournalier.heure,
+                RollupJournalier.planifies, RollupJournalier.confirmes, RollupJournalier.annules,
+                RollupJournalier.termines, RollupJournalier.minutes]
+    requete = select(*colonnes).where(RollupJournalier.jour >= debut, RollupJournalier.jour <= fin)
+    if medecin_id is not None:
+        requete = requete.where(RollupJournalier.medecin_id == medecin_id)
+    if specialite is not None:
+        requete = requete.where(RollupJournalier.medecin_id.in_(
+            select(Medecin.id).where(Medecin.specialite == specialite)))
+    # Tuples bruts du curseur : pas de Row SQLAlchemy par ligne
+    lignes = db.session.connection().execute(requete).cursor.fetchall()
+    if not lignes:
+        return None
+    jours, medecins, heures, *compteurs = zip(*lignes)
+    return {
+        # chaînes 'AAAA-MM-JJ' (SQLite) ou dates (MariaDB), converties d'un bloc
+        'jour': np.array(jours, dtype='datetime64[D]'),
+        'medecin_id': np.array(medecins, dtype=np.int64),
+        'heure': np.array(heures, dtype=np.int64),
+        **{cle: np.array(valeurs, dtype=np.int64) for cle, valeurs in
+           zip(('planifies', 'confirmes', 'annules', 'termines', 'minutes'), compteurs)},
+    }
+
+
+def _groupes(medecin_ids, par):
+    """Group index of each row, and the group labels (medecin id or specialite)."""
+    if par == 'medecin':
+        libelles, indices = np.unique(medecin_ids, return_inverse=True)
+        return indices, libelles
+    specialites = dict(db.session.query(Medecin.id, Medecin.specialite).all())
+    presents = np.unique(medecin_ids)
+    libelles = sorted({specialites.get(medecin, '') for medecin in presents.tolist()})
+    position = {specialite: i for i, specialite in enumerate(libelles)}
+    code = np.zeros(int(presents[-1]) + 1, dtype=np.int64)
+    code[presents] = [position[specialites.get(medecin, '')] for medecin in presents.tolist()]
+    return code[medecin_ids], np.array(libelles)
+
+
+def _taux(numerateur, denominateur):
+    taux = np.divide(numerateur, denominateur, out=np.zeros(len(numerateur)), where=denominateur > 0)
+    return np.round(taux, 4)
+
+
+def _heatmap(d, debut, fin):
+    """Booked minutes and occupancy rate per weekday (0 = lundi) and hour of day."""
+    jour_semaine = (d['jour'].astype(np.int64) + 3) % 7  # 1970-01-01 était un jeudi
+    minutes = np.zeros((7, 24), dtype=np.int64)
+    np.add.at(minutes, (jour_semaine, d['heure']), d['minutes'])
+    # Capacité : 60 minutes par heure d'ouverture et par médecin présent dans le rapport
+    jours = np.arange(np.datetime64(debut), np.datetime64(fin) + 1)
+    nb_jours = np.bincount((jours.astype(np.int64) + 3) % 7, minlength=7)
+    ouvert = np.zeros((7, 24), dtype=bool)
+    ouvert[np.ix_(list(JOURS_OUVRES), range(HEURE_OUVERTURE, HEURE_FERMETURE))] = True
+    capacite = np.where(ouvert, 60 * nb_jours[:, None] * len(np.unique(d['medecin_id'])), 0)
+    return {
+        'minutes': minutes,
+        'taux_occupation': _taux(minutes.ravel(), capacite.ravel()).reshape(7, 24),
+    }
+
+
+def _annulations(d, groupes, nb_groupes):
+    total = d['planifies'] + d['confirmes'] + d['annules'] + d['termines']
+    totaux = np.bincount(groupes, weights=total, minlength=nb_groupes).astype(np.int64)
+    annules = np.bincount(groupes, weights=d['annules'], minlength=nb_groupes).astype(np.int64)
+    return {'total': totaux, 'annules': annules, 'taux': _taux(annules, totaux)}
+
+
+def _non_honores(d, groupes, nb_groupes, aujourd_hui):
+    """Past appointments never marked terminé nor annulé, per month and group."""
+    passe = d['jour'] < np.datetime64(aujourd_hui)
+    mois, indices = np.unique(d['jour'][passe].astype('datetime64[M]'), return_inverse=True)
+    cellule = indices * nb_groupes + groupes[passe]
+    taille = len(mois) * nb_groupes
+    non_honores = np.bincount(cellule, weights=(d['planifies'] + d['confirmes'])[passe], minlength=taille)
+    honores = np.bincount(cellule, weights=d['termines'][passe], minlength=taille)
+    attendus = non_honores + honores
+    return {
+        'mois': mois.astype(str).tolist(),
+        'non_honores': non_honores.astype(np.int64).reshape(-1, nb_groupes),
+        'taux': _taux(non_honores, attendus).reshape(-1, nb_groupes),
+    }
+
+
+def _percentiles(d, groupes, nb_groupes):
+    """Percentiles of the booked minutes per medecin and working day, overall and per group."""
+    # Minutes par (médecin, jour) : clé unique puis somme
+    cles, indices = np.unique(d['jour'].astype(np.int64) * (int(d['medecin_id'].max()) + 1) + d['medecin_id'],
+                              return_inverse=True)
+    par_jour = np.bincount(indices, weights=d['minutes'])
+    groupe_jour = np.zeros(len(cles), dtype=np.int64)
+    groupe_jour[indices] = groupes
+    # Rang le plus proche par groupe, sur les valeurs triées par (groupe, minutes)
+    ordre = np.lexsort((par_jour, groupe_jour))
+    valeurs, groupe_trie = par_jour[ordre], groupe_jour[ordre]
+    debuts = np.searchsorted(groupe_trie, np.arange(nb_groupes), side='left')
+    effectifs = np.searchsorted(groupe_trie, np.arange(nb_groupes), side='right') - debuts
+    q = np.array(PERCENTILES) / 100
+    rangs = debuts[:, None] + np.floor(q[None, :] * np.maximum(effectifs - 1, 0)[:, None]).astype(np.int64)
+    par_groupe = np.where(effectifs[:, None] > 0, valeurs[np.minimum(rangs, len(valeurs) - 1)], 0)
+    return {
+        'percentiles': list(PERCENTILES),
+        'ensemble': np.percentile(par_jour, PERCENTILES, method='lower'),
+        'par_groupe': par_groupe,
+        'jours': effectifs,
+    }
+
+
+def generer_rapports(debut, fin, par='specialite', rapports=RAPPORTS, medecin_id=None, specialite=None):
+    """Compute the requested reports over the rollups of [debut, fin] (dates, inclusive)."""
+    d = _charger(debut, fin, medecin_id, specialite)
+    resultat = {'periode': {'debut': debut, 'fin': fin}, 'par': par, 'groupes': []}
+    if d is None:
+        return resultat
+    groupes, libelles = _groupes(d['medecin_id'], par)
+    resultat['groupes'] = libelles.tolist()
+    if 'heatmap' in rapports:
+        resultat['heatmap'] = _heatmap(d, debut, fin)
+    if 'annulations' in rapports:
+        resultat['annulations'] = _annulations(d, groupes, len(libelles))
+    if 'non_honores' in rapports:
+        resultat['non_honores'] = _non_honores(d, groupes, len(libelles), date.today())
+    if 'percentiles' in rapports:
+        resultat['percentiles'] = _percentiles(d, groupes, len(libelles))
+    return resultat
@@ -1,6 +1,20 @@
 from models import db
+from models.medecin_model import Medecin
+from models.patient_model import Patient
+from models.projection import query_columns, fetch_all, fetch_one, as_dicts
+from sqlalchemy import select, union_all
 from datetime import datetime
 
+class StatutRdv:
+    """Canonical values of RendezVous.statut, shared by models and controllers."""
+    PLANIFIE = 'planifie'
+    CONFIRME = 'confirme'
+    ANNULE = 'annule'
+    TERMINE = 'termine'
+
+    TOUS = (PLANIFIE, CONFIRME, ANNULE, TERMINE)
+    A_VENIR = (PLANIFIE, CONFIRME)  # comptés comme "programmés"
+
 class RendezVous(db.Model):
     __tablename__ = 'rendez_vous'
     
@@ -10,87 +24,205 @@ class RendezVous(db.Model):
     date_heure = db.Column(db.DateTime, nullable=False)
     duree = db.Column(db.Integer, default=30)  # durée en minutes
     motif = db.Column(db.String(500), nullable=True)
-    statut = db.Column(db.String(20), default='planifie')  # planifie, confirme, annule, termine
+    statut = db.Column(db.String(20), default=StatutRdv.PLANIFIE)  # voir StatutRdv
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Index des chemins d'accès fréquents (appliqués sur une base existante
+    # par les migrations, voir models/migrations.py)
+    __table_args__ = (
+        db.Index('ix_rdv_medecin_date', 'medecin_id', 'date_heure'),
+        db.Index('ix_rdv_patient_date', 'patient_id', 'date_heure'),
+        db.Index('ix_rdv_patient_statut', 'patient_id', 'statut'),
+        db.Index('ix_rdv_statut_date', 'statut', 'date_heure'),
+        db.Index('ix_rdv_date_heure', 'date_heure'),
+        db.Index('ix_rdv_updated_at', 'updated_at'),
+    )
+
     def __repr__(self):
         return f'<RendezVous {self.date_heure} - Patient {self.patient_id} - Dr {self.medecin_id}>'
 
+# Colonnes exposées par les helpers
+RDV_COLUMNS = {
+    'id': RendezVous.id,
+    'patient_id': RendezVous.patient_id,
+    'medecin_id': RendezVous.medecin_id,
+    'date_heure': RendezVous.date_heure,
+    'duree': RendezVous.duree,
+    'motif': RendezVous.motif,
+    'statut': RendezVous.statut,
+    'notes': RendezVous.notes,
+    'created_at': RendezVous.created_at,
+    'updated_at': RendezVous.updated_at
+}
+
+RDV_MEDECIN_COLUMNS = {
+    'medecin_nom': Medecin.nom,
+    'medecin_prenom': Medecin.prenom,
+    'specialite': Medecin.specialite
+}
+
+RDV_DETAILS_COLUMNS = {
+    **RDV_COLUMNS,
+    **RDV_MEDECIN_COLUMNS,
+    'medecin_email': Medecin.email,
+    'medecin_telephone': Medecin.telephone,
+    'patient_nom': Patient.nom,
+    'patient_prenom': Patient.prenom,
+    'patient_email': Patient.email,
+    'patient_telephone': Patient.telephone
+}
+
+# Liste d'un patient : 'date_creation' est le nom attendu par les templates
+RDV_PATIENT_COLUMNS = {
+    **{cle: col for cle, col in RDV_COLUMNS.items() if cle != 'created_at'},
+    **RDV_MEDECIN_COLUMNS,
+    'date_creation': RendezVous.created_at
+}
+
 # Helper functions for rendez-vous operations
-def get_rdv_by_patient_id(patient_id):
-    """Get all rendez-vous for a specific patient with medecin details."""
-    from models.medecin_model import Medecin
-    
-    rendez_vous = RendezVous.query.filter_by(patient_id=patient_id).all()
-    result = []
-    
-    for rdv in rendez_vous:
-        medecin = Medecin.query.get(rdv.medecin_id)
-        if medecin:
-            result.append({
-                'id': rdv.id,
-                'patient_id': rdv.patient_id,
-                'medecin_id': rdv.medecin_id,
-                'medecin_nom': medecin.nom,
-                'medecin_prenom': medecin.prenom,
-                'specialite': medecin.specialite,
-                'date_heure': rdv.date_heure,
-                'duree': rdv.duree,
-                'motif': rdv.motif,
-                'statut': rdv.statut,
-                'notes': rdv.notes,
-                'date_creation': rdv.created_at,
-                'updated_at': rdv.updated_at
-            })
-    
-    return result
+def _rdv_patient_archives(patient_id, fields):
+    """Same projection as the patient list, over rendez_vous_archive."""
+    from models.archive_model import RendezVousArchive, colonnes_archive
 
-def create_rdv(date_heure, motif, patient_id, medecin_id, duree=30):
-    """Create a new rendez-vous."""
-    try:
-        new_rdv = RendezVous(
-            date_heure=date_heure,
-            motif=motif,
-            patient_id=patient_id,
-            medecin_id=medecin_id,
-            duree=duree
-        )
-        db.session.add(new_rdv)
-        db.session.commit()
-        return new_rdv.id
-    except Exception as e:
-        db.session.rollback()
-        return None
-
-def get_rdv_by_id(rdv_id):
-    """Get a rendez-vous by ID."""
-    rdv = RendezVous.query.get(rdv_id)
-    if rdv:
-        return {
-            'id': rdv.id,
-            'patient_id': rdv.patient_id,
-            'medecin_id': rdv.medecin_id,
-            'date_heure': rdv.date_heure,
-            'duree': rdv.duree,
-            'motif': rdv.motif,
-            'statut': rdv.statut,
-            'notes': rdv.notes,
-            'created_at': rdv.created_at,
-            'updated_at': rdv.updated_at
-        }
-    return None
+    return query_columns(colonnes_archive(RDV_PATIENT_COLUMNS), fields)\
+        .select_from(RendezVousArchive)\
+        .join(Medecin, RendezVousArchive.medecin_id == Medecin.id)\
+        .filter(RendezVousArchive.patient_id == patient_id)
+
+def get_rdv_by_patient_id(patient_id, fields=None, archives=False):
+    """Get all rendez-vous for a specific patient with medecin details, in one joined query.
+
+    With archives=True, the archived rendez-vous are included (UNION ALL).
+    """
+    from models.archive_model import union_archives, avec_ordre, sans_ordre
+
+    if archives:
+        selection = avec_ordre(fields, 'date_heure')
+        active = query_columns(RDV_PATIENT_COLUMNS, selection)\
+            .select_from(RendezVous)\
+            .join(Medecin, RendezVous.medecin_id == Medecin.id)\
+            .filter(RendezVous.patient_id == patient_id)
+        rows = union_archives(active, _rdv_patient_archives(patient_id, selection), 'date_heure')
+        return sans_ordre(as_dicts(rows), fields, 'date_heure')
+    query = query_columns(RDV_PATIENT_COLUMNS, fields)\
+        .select_from(RendezVous)\
+        .join(Medecin, RendezVous.medecin_id == Medecin.id)\
+        .filter(RendezVous.patient_id == patient_id)\
+        .order_by(RendezVous.date_heure)
+    return fetch_all(query)
+
+def count_rdv_by_statut(patient_id):
+    """Count a patient's rendez-vous per statut, archived ones included, with one GROUP BY query."""
+    from models.archive_model import RendezVousArchive
+
+    statuts = union_all(
+        select(RendezVous.statut).where(RendezVous.patient_id == patient_id),
+        select(RendezVousArchive.statut).where(RendezVousArchive.patient_id == patient_id)
+    ).subquery()
+    rows = db.session.execute(
+        select(statuts.c.statut, db.func.count()).group_by(statuts.c.statut)
+    ).all()
+    return {statut: total for statut, total in rows}
+
+def get_dashboard_statistics(patient_id):
+    """Dashboard counters of a patient, from count_rdv_by_statut."""
+    par_statut = count_rdv_by_statut(patient_id)
+    return {
+        'total_rdv': sum(par_statut.values()),
+        'rdv_programmes': sum(par_statut.get(statut, 0) for statut in StatutRdv.A_VENIR),
+        'rdv_termines': par_statut.get(StatutRdv.TERMINE, 0),
+        'rdv_annules': par_statut.get(StatutRdv.ANNULE, 0)
+    }
+
+def get_upcoming_rdv(patient_id, limit=3, fields=None):
+    """Get a patient's next scheduled rendez-vous (ORDER BY date_heure LIMIT n)."""
+    query = query_columns(RDV_PATIENT_COLUMNS, fields)\
+        .select_from(RendezVous)\
+        .join(Medecin, RendezVous.medecin_id == Medecin.id)\
+        .filter(RendezVous.patient_id == patient_id,
+                RendezVous.date_heure >= datetime.now(),
+                RendezVous.statut.in_(StatutRdv.A_VENIR))\
+        .order_by(RendezVous.date_heure)\
+        .limit(limit)
+    return fetch_all(query)
+
+def get_recent_rdv(patient_id, limit=5, fields=None, archives=False):
+    """Get a patient's latest rendez-vous, most recent first (ORDER BY date_heure DESC LIMIT n).
+
+    With archives=True, the archive is read only when rendez_vous holds fewer
+    than `limit` rendez-vous of the patient.
+    """
+    from models.archive_model import union_archives, avec_ordre, sans_ordre
+
+    query = query_columns(RDV_PATIENT_COLUMNS, fields)\
+        .select_from(RendezVous)\
+        .join(Medecin, RendezVous.medecin_id == Medecin.id)\
+        .filter(RendezVous.patient_id == patient_id)\
+        .order_by(RendezVous.date_heure.desc())\
+        .limit(limit)
+    rdvs = fetch_all(query)
+    if not archives or len(rdvs) >= limit:
+        return rdvs
+    selection = avec_ordre(fields, 'date_heure')
+    active = query_columns(RDV_PATIENT_COLUMNS, selection)\
+        .select_from(RendezVous)\
+        .join(Medecin, RendezVous.medecin_id == Medecin.id)\
+        .filter(RendezVous.patient_id == patient_id)
+    rows = union_archives(active, _rdv_patient_archives(patient_id, selection), 'date_heure',
+                          decroissant=True, limite=limit)
+    return sans_ordre(as_dicts(rows), fields, 'date_heure')
+
+def create_rdv(date_heure, motif, patient_id, medecin_id, duree=30, idempotency_key=None):
+    """Create a new rendez-vous, unless it overlaps another booking of the medecin.
+
+    Returns the id of the rendez-vous (the original one when idempotency_key
+    was already used), or None on conflict or persistent contention; other
+    errors are raised.
+    """
+    from models import reservation_model
+
+    resultat, rdv_id = reservation_model.reserver(patient_id, medecin_id, date_heure, motif, duree,
+                                                  idempotency_key)
+    return rdv_id
+
+def get_rdv_by_id(rdv_id, fields=None):
+    """Get a rendez-vous by ID, with medecin and patient details."""
+    query = query_columns(RDV_DETAILS_COLUMNS, fields)\
+        .select_from(RendezVous)\
+        .outerjoin(Medecin, RendezVous.medecin_id == Medecin.id)\
+        .outerjoin(Patient, RendezVous.patient_id == Patient.id)\
+        .filter(RendezVous.id == rdv_id)
+    rdv = fetch_one(query)
+    if rdv is None:
+        # Rendez-vous archivé (même id) : lecture par clé primaire de l'archive
+        from models.archive_model import RendezVousArchive, colonnes_archive
+        query = query_columns(colonnes_archive(RDV_DETAILS_COLUMNS), fields)\
+            .select_from(RendezVousArchive)\
+            .outerjoin(Medecin, RendezVousArchive.medecin_id == Medecin.id)\
+            .outerjoin(Patient, RendezVousArchive.patient_id == Patient.id)\
+            .filter(RendezVousArchive.id == rdv_id)
+        rdv = fetch_one(query)
+    return rdv
 
 def cancel_rdv(rdv_id):
-    """Cancel a rendez-vous."""
-    try:
-        rdv = RendezVous.query.get(rdv_id)
-        if rdv:
-            rdv.statut = 'annule'
-            db.session.commit()
-            return True
+    """Cancel a rendez-vous and release its slot.
+
+    Returns False when there is no such rendez-vous (or it is archived);
+    database errors are raised after a rollback.
+    """
+    from models import disponibilite_model
+
+    rdv = db.session.get(RendezVous, rdv_id)
+    if rdv is None:
         return False
-    except Exception as e:
+    try:
+        rdv.statut = StatutRdv.ANNULE
+        db.session.commit()
+    except Exception:
         db.session.rollback()
-        return False
+        raise
+    disponibilite_model.remove_rdv_from_index(rdv.id, rdv.medecin_id, rdv.date_heure)
+    disponibilite_model.signaler(rdv.medecin_id)
+    return True
@@ -0,0 +1,204 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from threading import RLock
+import re
+import time
+import unicodedata
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from config import RECHERCHE_TTL
+from models import db, entites
+from models.medecin_model import Medecin, get_medecins, get_medecin_by_id
+
+# Poids de chaque champ dans le score
+POIDS_CHAMPS = {'nom': 3, 'prenom': 3, 'specialite': 2, 'adresse': 1}
+# Poids du type de correspondance
+POIDS_EXACT, POIDS_PREFIXE, POIDS_TYPO = 3, 2, 1
+# Longueur minimale d'un mot pour tolérer une faute de frappe
+LONGUEUR_MIN_TYPO = 4
+# Nombre maximal de mots du vocabulaire étendus par un préfixe
+MAX_EXPANSION_PREFIXE = 50
+
+_MOT = re.compile(r'[a-z0-9]+')
+
+
+def normaliser(texte):
+    """Lowercase, strip accents and split a text into words."""
+    if not texte:
+        return []
+    texte = unicodedata.normalize('NFKD', texte)
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return _MOT.findall(texte.lower())
+
+
+def _suppressions(mot):
+    """The word itself plus every variant with one character removed."""
+    return {mot} | {mot[:i] + mot[i + 1:] for i in range(len(mot))}
+
+
+class SearchIndex:
+    """Inverted index over the medecins, with prefix and one-typo lookup."""
+
+    def __init__(self):
+        self.documents = {}  # id -> dict du médecin
+        self.postings = defaultdict(dict)  # mot -> {id: poids du champ}
+        self.vocabulaire = []  # mots triés, pour les préfixes
+        self.variantes = defaultdict(set)  # suppression -> mots
+        self.facettes = Counter()  # spécialité -> nombre de médecins
+        self.cles_tri = {}  # id -> clé de tri à score égal
+        self.construit_le = time.monotonic()
+
+    def ajouter(self, medecin):
+        self.retirer(medecin['id'])
+        self.documents[medecin['id']] = medecin
+        self.cles_tri[medecin['id']] = (normaliser(medecin['nom']), normaliser(medecin['prenom']), medecin['id'])
+        self.facettes[medecin['specialite']] += 1
+        for champ, poids in POIDS_CHAMPS.items():
+            for mot in normaliser(medecin.get(champ)):
+                if mot not in self.postings:
+                    self.vocabulaire.insert(bisect_left(self.vocabulaire, mot), mot)
+                    if len(mot) >= LONGUEUR_MIN_TYPO:
+                        for variante in _suppressions(mot):
+                            self.variantes[variante].add(mot)
+                docs = self.postings[mot]
+                docs[medecin['id']] = max(docs.get(medecin['id'], 0), poids)
+
+    def retirer(self, medecin_id):
+        medecin = self.documents.pop(medecin_id, None)
+        if medecin is None:
+            return
+        del self.cles_tri[medecin_id]
+        self.facettes[medecin['specialite']] -= 1
+        if self.facettes[medecin['specialite']] <= 0:
+            del self.facettes[medecin['specialite']]
+        for champ in POIDS_CHAMPS:
+            for mot in normaliser(medecin.get(champ)):
+                docs = self.postings.get(mot)
+                if docs is None:
+                    continue
+                docs.pop(medecin_id, None)
+                if not docs:
+                    del self.postings[mot]
+                    del self.vocabulaire[bisect_left(self.vocabulaire, mot)]
+                    if len(mot) >= LONGUEUR_MIN_TYPO:
+                        for variante in _suppressions(mot):
+                            self.variantes[variante].discard(mot)
+                            if not self.variantes[variante]:
+                                del self.variantes[variante]
+
+    def _correspondances(self, terme):
+        """Return {mot du vocabulaire: poids de correspondance} for one query word."""
+        trouves = {}
+        i = bisect_left(self.vocabulaire, terme)
+        for mot in self.vocabulaire[i:i + MAX_EXPANSION_PREFIXE]:
+            if not mot.startswith(terme):
+                break
+            trouves[mot] = POIDS_EXACT if mot == terme else POIDS_PREFIXE
+        if len(terme) >= LONGUEUR_MIN_TYPO:
+            for variante in _suppressions(terme):
+                for mot in self.variantes.get(variante, ()):
+                    trouves.setdefault(mot, POIDS_TYPO)
+        return trouves
+
+    def rechercher(self, texte):
+        """Return {id: score} of the medecins matching every word of texte."""
+        termes = normaliser(texte)
+        if not termes:
+            return {medecin_id: 0 for medecin_id in self.documents}
+        scores = None
+        for terme in termes:
+            scores_terme = {}
+            for mot, poids_match in self._correspondances(terme).items():
+                for medecin_id, poids_champ in self.postings[mot].items():
+                    score = poids_match * poids_champ
+                    if score > scores_terme.get(medecin_id, 0):
+                        scores_terme[medecin_id] = score
+            if scores is None:
+                scores = scores_terme
+            else:
+                scores = {m: s + scores_terme[m] for m, s in scores.items() if m in scores_terme}
+            if not scores:
+                break
+        return scores
+
+
+_index = None
+_a_rafraichir = set()
+_lock = RLock()
+
+
+def _get_index():
+    """Build the index lazily, then apply pending changes."""
+    global _index
+    if _index is None or time.monotonic() - _index.construit_le > RECHERCHE_TTL:
+        index = SearchIndex()
+        for medecin in get_medecins():
+            index.ajouter(medecin)
+        _index = index
+        _a_rafraichir.clear()
+    while _a_rafraichir:
+        medecin_id = _a_rafraichir.pop()
+        medecin = get_medecin_by_id(medecin_id)
+        if medecin:
+            _index.ajouter(medecin)
+        else:
+            _index.retirer(medecin_id)
+    return _index
+
+
+def invalidate_index():
+    """Force a full rebuild on the next search."""
+    global _index
+    with _lock:
+        _index = None
+
+
+entites.abonner('recherche', lambda medecin_id: invalidate_index())
+
+
+def search_medecins(texte='', specialite=None, page=1, par_page=20):
+    """Ranked, paginated search over the medecins.
+
+    Returns (resultats, total, facettes); facettes counts the matches per
+    specialite, before the specialite filter is applied.
+    """
+    with _lock:
+        index = _get_index()
+        if normaliser(texte):
+            scores = index.rechercher(texte)
+            facettes = Counter(index.documents[m]['specialite'] for m in scores)
+        else:
+            scores = index.rechercher('')
+            facettes = Counter(index.facettes)
+        if specialite:
+            scores = {m: s for m, s in scores.items() if index.documents[m]['specialite'] == specialite}
+        classement = sorted(scores, key=lambda m: (-scores[m], index.cles_tri[m]))
+        debut = (page - 1) * par_page
+        resultats = [dict(index.documents[m], score=scores[m]) for m in classement[debut:debut + par_page]]
+    return resultats, len(classement), dict(facettes)
+
+
+# Mise à jour incrémentale : les médecins modifiés sont rafraîchis à la
+# prochaine recherche, une fois la transaction validée.
+@event.listens_for(Medecin, 'after_insert')
+@event.listens_for(Medecin, 'after_update')
+@event.listens_for(Medecin, 'after_delete')
+def _medecin_modifie(mapper, connection, medecin):
+    session = object_session(medecin)
+    if session is not None:
+        session.info.setdefault('medecins_modifies', set()).add(medecin.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apres_commit(session):
+    modifies = session.info.pop('medecins_modifies', None)
+    if modifies:
+        with _lock:
+            _a_rafraichir.update(modifies)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _apres_rollback(session):
+    session.info.pop('medecins_modifies', None)
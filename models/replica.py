@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+import time
+
+from flask import g, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Routage des lectures vers le réplica (bind 'replica' de SQLALCHEMY_BINDS).
+# Une requête GET sur une route de REPLICA_ROUTES lit sur le réplica, sauf :
+# - dès que la session SQLAlchemy a écrit (les lectures suivantes vont au primaire) ;
+# - pendant REPLICA_LAG_MAX secondes après une écriture du même utilisateur,
+#   pour qu'il relise ses propres changements malgré le retard du réplica.
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of read-only routes to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._lecture_sur_replica():
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _lecture_sur_replica(self):
+        if self._flushing or self.info.get('ecriture') or self.info.get('primaire'):
+            return False
+        return has_request_context() and g.get('lecture_replica', False)
+
+
+@contextmanager
+def primaire(session):
+    """Force the reads made inside the block to go to the primary."""
+    precedent = session.info.get('primaire', False)
+    session.info['primaire'] = True
+    try:
+        yield
+    finally:
+        session.info['primaire'] = precedent
+
+
+def _marquer_ecriture(session, flush_context=None):
+    session.info['ecriture'] = True
+
+
+def marquer_ecriture(session):
+    """Flag a write made without a flush (bulk INSERT), like after_flush does."""
+    _marquer_ecriture(session)
+
+
+def _memoriser_ecriture(session):
+    if session.info.get('ecriture') and has_request_context():
+        flask_session['derniere_ecriture'] = time.time()
+
+
+def init_replica(app, db):
+    """Register the routing hooks; no-op when no replica bind is configured."""
+    if 'replica' not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    routes = tuple(app.config['REPLICA_ROUTES'])
+    lag_max = app.config['REPLICA_LAG_MAX']
+
+    @app.before_request
+    def choisir_base():
+        g.lecture_replica = (
+            request.method in ('GET', 'HEAD')
+            and request.path.startswith(routes)
+            and time.time() - flask_session.get('derniere_ecriture', 0) > lag_max
+        )
+
+    event.listen(db.session, 'after_flush', _marquer_ecriture)
+    event.listen(db.session, 'after_commit', _memoriser_ecriture)
@@ -0,0 +1,316 @@
+from datetime import datetime, timedelta
+import random
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from config import RESERVATION_TENTATIVES, RESERVATION_ATTENTE, IDEMPOTENCE_RETENTION
+from config import HEURE_OUVERTURE, HEURE_FERMETURE, JOURS_OUVRES
+from models import db, disponibilite_model, flux_model, fragments, statistiques_model, taches
+from models.rdv_model import RendezVous, StatutRdv
+from models.replica import marquer_ecriture, primaire
+
+# Écriture des réservations : les réservations d'un même médecin pour un même
+# jour sont sérialisées par une ligne de verrou (medecin_id, jour). La ligne
+# est verrouillée par un UPDATE en début de transaction : verrou de ligne
+# exclusif sur InnoDB (comme SELECT ... FOR UPDATE), verrou d'écriture sur
+# SQLite. Les autres médecins et les autres jours ne sont pas bloqués.
+
+
+class VerrouAgenda(db.Model):
+    __tablename__ = 'verrous_agenda'
+
+    medecin_id = db.Column(db.Integer, db.ForeignKey('medecins.id'), primary_key=True)
+    jour = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # réservations validées ce jour-là
+
+
+class CleIdempotence(db.Model):
+    __tablename__ = 'cles_idempotence'
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), primary_key=True)
+    cle = db.Column(db.String(64), primary_key=True)
+    rdv_id = db.Column(db.Integer, db.ForeignKey('rendez_vous.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_cles_idempotence_created_at', 'created_at'),
+    )
+
+
+class ResultatReservation:
+    """Outcomes of reserver()."""
+    CREE = 'cree'
+    REJOUE = 'rejoue'  # même Idempotency-Key : le rendez-vous d'origine est renvoyé
+    CONFLIT = 'conflit'
+    SATURE = 'sature'  # contention persistante après RESERVATION_TENTATIVES essais
+    HORS_HORAIRES = 'hors_horaires'
+    PASSE = 'passe'
+    # Refus propres aux occurrences d'une série (reserver_serie)
+    DOUBLON = 'doublon'  # chevauche une autre occurrence de la même série
+    NON_RESERVE = 'non_reserve'  # série refusée en bloc (tout_ou_rien) à cause d'une autre occurrence
+
+
+# Erreurs de contention, réessayées : ligne de verrou ou clé d'idempotence
+# insérée au même moment par une transaction concurrente, verrou SQLite
+# occupé, deadlock / délai de verrou InnoDB. Les autres violations de
+# contrainte (clé étrangère, NOT NULL) ne se résolvent pas en réessayant.
+_ERREURS_VERROU_MYSQL = (1205, 1213)
+_CLE_DUPLIQUEE_MYSQL = 1062
+_INSERTIONS_CONCURRENTES = tuple(f'INSERT INTO {model.__tablename__}' for model in (VerrouAgenda, CleIdempotence))
+
+
+def _contention(erreur):
+    code = erreur.orig.args[0] if erreur.orig is not None and erreur.orig.args else None
+    if isinstance(erreur, IntegrityError):
+        doublon = code == _CLE_DUPLIQUEE_MYSQL or 'UNIQUE constraint failed' in str(erreur.orig)
+        return doublon and (erreur.statement or '').lstrip().startswith(_INSERTIONS_CONCURRENTES)
+    return code in _ERREURS_VERROU_MYSQL or 'locked' in str(erreur.orig)
+
+
+def _rdv_existant(patient_id, cle):
+    if not cle:
+        return None
+    return db.session.query(CleIdempotence.rdv_id)\
+        .filter(CleIdempotence.patient_id == patient_id, CleIdempotence.cle == cle).scalar()
+
+
+def _jours(date_heure, duree):
+    """Days covered by a booking (two when it ends after midnight)."""
+    return date_heure.date(), (disponibilite_model._fin_rdv(date_heure, duree) - timedelta(microseconds=1)).date()
+
+
+def _verrouiller(medecin_id, *jours):
+    """Take the (medecin, jour) lock rows for the rest of the transaction, in date order."""
+    jours = sorted(set(jours))
+    table = VerrouAgenda.__table__
+    resultat = db.session.execute(
+        table.update()
+        .where(table.c.medecin_id == medecin_id, table.c.jour.in_(jours))
+        .values(version=table.c.version + 1)
+    )
+    if resultat.rowcount < len(jours):
+        # Premières réservations de ces jours : deux insertions concurrentes
+        # se heurtent sur la clé primaire et l'une des deux est réessayée
+        existants = set(db.session.scalars(
+            db.select(table.c.jour).where(table.c.medecin_id == medecin_id, table.c.jour.in_(jours))))
+        db.session.execute(table.insert(), [{'medecin_id': medecin_id, 'jour': jour, 'version': 1}
+                                            for jour in jours if jour not in existants])
+
+
+def _chevauche(medecin_id, date_heure, duree):
+    """Authoritative overlap check, read inside the locked transaction."""
+    fin = disponibilite_model._fin_rdv(date_heure, duree)
+    rows = db.session.query(RendezVous.date_heure, RendezVous.duree)\
+        .filter(RendezVous.medecin_id == medecin_id, RendezVous.statut != StatutRdv.ANNULE,
+                RendezVous.date_heure < fin, RendezVous.date_heure >= date_heure - timedelta(days=1))
+    return any(disponibilite_model._fin_rdv(debut, d) > date_heure for debut, d in rows)
+
+
+def _tenter(patient_id, medecin_id, date_heure, motif, duree, cle):
+    _verrouiller(medecin_id, *_jours(date_heure, duree))
+    rdv_id = _rdv_existant(patient_id, cle)
+    if rdv_id is not None:
+        return ResultatReservation.REJOUE, rdv_id
+    if _chevauche(medecin_id, date_heure, duree):
+        return ResultatReservation.CONFLIT, None
+    rdv = RendezVous(date_heure=date_heure, motif=motif, patient_id=patient_id, medecin_id=medecin_id, duree=duree)
+    db.session.add(rdv)
+    db.session.flush()
+    if cle:
+        db.session.add(CleIdempotence(patient_id=patient_id, cle=cle, rdv_id=rdv.id))
+        db.session.flush()
+        taches.planifier_purge_cles(db.session)
+    return ResultatReservation.CREE, rdv.id
+
+
+def reserver(patient_id, medecin_id, date_heure, motif, duree=30, cle=None):
+    """Book a slot, serialized per medecin and day (both days if it ends after midnight).
+
+    Returns (resultat, rdv_id) where resultat is a ResultatReservation value;
+    past slots and slots outside opening hours are refused like in a series.
+    With the same `cle` (Idempotency-Key), a resubmission returns the
+    original rendez-vous instead of booking again.
+    """
+    medecin_id, patient_id = int(medecin_id), int(patient_id)
+    cle = cle[:64] if cle else None
+    with primaire(db.session):
+        # Chemins rapides sans verrou : soumission rejouée, créneau déjà pris.
+        # L'index du worker peut ignorer une annulation faite ailleurs : il ne
+        # suffit qu'à accepter, un conflit est confirmé en base
+        rdv_id = _rdv_existant(patient_id, cle)
+        if rdv_id is not None:
+            return ResultatReservation.REJOUE, rdv_id
+        # Mêmes horaires que pour les occurrences d'une série
+        refus = _refus_horaires(date_heure, duree, datetime.now())
+        if refus:
+            return refus, None
+        if disponibilite_model.has_conflict(medecin_id, date_heure, duree):
+            if _chevauche(medecin_id, date_heure, duree):
+                return ResultatReservation.CONFLIT, None
+            disponibilite_model.invalidate_index(medecin_id)  # index périmé : reconstruit à la prochaine lecture
+        # Termine la transaction de lecture : la transaction verrouillée part
+        # d'un instantané neuf (SQLite refuse d'élever un instantané périmé)
+        db.session.rollback()
+
+        for tentative in range(RESERVATION_TENTATIVES):
+            try:
+                resultat, rdv_id = _tenter(patient_id, medecin_id, date_heure, motif, duree, cle)
+                if resultat == ResultatReservation.CREE:
+                    db.session.commit()
+                else:
+                    db.session.rollback()  # refus : libère le verrou sans compter de réservation
+            except (IntegrityError, OperationalError) as e:
+                db.session.rollback()
+                if not _contention(e):
+                    raise
+                time.sleep(RESERVATION_ATTENTE * 2 ** tentative * random.random())
+                continue
+            except Exception:
+                db.session.rollback()
+                raise
+            if resultat == ResultatReservation.CREE:
+                disponibilite_model.add_rdv_to_index(rdv_id, medecin_id, date_heure, duree)
+                disponibilite_model.signaler(medecin_id)
+            return resultat, rdv_id
+    return ResultatReservation.SATURE, None
+
+
+FREQUENCES = ('quotidienne', 'hebdomadaire')
+
+
+def developper_recurrence(debut, frequence, nombre, intervalle=1):
+    """Expand a series from debut: every `intervalle` weeks, or every `intervalle` working days."""
+    if frequence == 'hebdomadaire':
+        return [debut + timedelta(weeks=intervalle * i) for i in range(nombre)]
+    if frequence != 'quotidienne':
+        raise ValueError(f'Fréquence inconnue : {frequence} (attendu : {", ".join(FREQUENCES)})')
+    dates, jour, ouvres = [], debut, 0
+    while len(dates) < nombre:
+        if jour.weekday() in JOURS_OUVRES:
+            if ouvres % intervalle == 0:
+                dates.append(jour)
+            ouvres += 1
+        jour += timedelta(days=1)
+    return dates
+
+
+def _refus_horaires(date_heure, duree, maintenant):
+    if date_heure < maintenant:
+        return ResultatReservation.PASSE
+    fin = disponibilite_model._fin_rdv(date_heure, duree)
+    if (date_heure.weekday() not in JOURS_OUVRES or date_heure.hour < HEURE_OUVERTURE
+            or fin > date_heure.replace(hour=HEURE_FERMETURE, minute=0) or fin.date() != date_heure.date()):
+        return ResultatReservation.HORS_HORAIRES
+    return None
+
+
+def _occupes(medecin_id, dates, duree):
+    """Busy intervals near the requested dates, read with a single query."""
+    fenetres = [db.and_(RendezVous.date_heure >= debut - timedelta(days=1),
+                        RendezVous.date_heure < disponibilite_model._fin_rdv(debut, duree)) for debut in dates]
+    index = disponibilite_model.IntervalIndex()
+    rows = db.session.query(RendezVous.id, RendezVous.date_heure, RendezVous.duree)\
+        .filter(RendezVous.medecin_id == medecin_id, RendezVous.statut != StatutRdv.ANNULE, db.or_(*fenetres))
+    for rdv_id, debut, d in rows:
+        index.ajouter(rdv_id, debut, disponibilite_model._fin_rdv(debut, d))
+    return index
+
+
+def _tenter_serie(patient_id, medecin_id, dates, motif, duree, tout_ou_rien):
+    _verrouiller(medecin_id, *(jour for date_heure in dates for jour in _jours(date_heure, duree)))
+    occupes = _occupes(medecin_id, dates, duree)
+    acceptes = disponibilite_model.IntervalIndex()  # occurrences déjà retenues de la série
+    resultats = {}
+    for date_heure in dates:
+        fin = disponibilite_model._fin_rdv(date_heure, duree)
+        if occupes.chevauchements(date_heure, fin):
+            resultats[date_heure] = ResultatReservation.CONFLIT
+        elif acceptes.chevauchements(date_heure, fin):
+            resultats[date_heure] = ResultatReservation.DOUBLON
+        else:
+            acceptes.ajouter(None, date_heure, fin)
+    if (tout_ou_rien and resultats) or len(resultats) == len(dates):
+        return resultats, {}
+    valeurs = [{'date_heure': date_heure, 'motif': motif, 'patient_id': patient_id, 'medecin_id': medecin_id,
+                'duree': duree, 'statut': StatutRdv.PLANIFIE}
+               for date_heure in dates if date_heure not in resultats]
+    # Un seul INSERT pour toute la série ; les dates acceptées ne se
+    # chevauchent pas, elles identifient donc les lignes renvoyées
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        lignes = db.session.execute(insert(RendezVous).returning(RendezVous.id, RendezVous.date_heure), valeurs)
+    else:
+        db.session.execute(insert(RendezVous), valeurs)
+        lignes = db.session.query(RendezVous.id, RendezVous.date_heure)\
+            .filter(RendezVous.medecin_id == medecin_id, RendezVous.statut != StatutRdv.ANNULE,
+                    RendezVous.date_heure.in_([v['date_heure'] for v in valeurs]))
+    crees = {date_heure: rdv_id for rdv_id, date_heure in lignes}
+    # Sans flush, les écouteurs after_flush ne voient pas ces lignes
+    inseres = [(rdv_id, date_heure, medecin_id, StatutRdv.PLANIFIE) for date_heure, rdv_id in crees.items()]
+    statistiques_model.relever_rdv_inseres(db.session, inseres)
+    flux_model.relever_rdv_inseres(db.session, inseres)
+    fragments.relever_rdv_inseres(db.session, inseres)
+    taches.relever_rdv_inseres(db.session, inseres)
+    marquer_ecriture(db.session)
+    return resultats, crees
+
+
+def reserver_serie(patient_id, medecin_id, dates, motif, duree=30, tout_ou_rien=False):
+    """Book several occurrences at once in a single locked transaction.
+
+    Returns one (date_heure, resultat, rdv_id) per requested date, in the
+    given order; the resultat of every date is SATURE under persistent
+    contention. With tout_ou_rien, nothing is booked unless every
+    occurrence can be.
+    """
+    medecin_id, patient_id = int(medecin_id), int(patient_id)
+    maintenant = datetime.now()
+    refus = {d: r for d in dates for r in (_refus_horaires(d, duree, maintenant),) if r}
+    candidates = sorted(set(dates) - set(refus))
+    crees = {}
+    if candidates and not (tout_ou_rien and refus):
+        with primaire(db.session):
+            for tentative in range(RESERVATION_TENTATIVES):
+                try:
+                    resultats, crees = _tenter_serie(patient_id, medecin_id, candidates, motif, duree, tout_ou_rien)
+                    if crees:
+                        db.session.commit()
+                    else:
+                        db.session.rollback()
+                except (IntegrityError, OperationalError) as e:
+                    db.session.rollback()
+                    if not _contention(e):
+                        raise
+                    time.sleep(RESERVATION_ATTENTE * 2 ** tentative * random.random())
+                    continue
+                except Exception:
+                    db.session.rollback()
+                    raise
+                refus.update(resultats)
+                break
+            else:
+                return [(d, ResultatReservation.SATURE, None) for d in dates]
+        for date_heure, rdv_id in crees.items():
+            disponibilite_model.add_rdv_to_index(rdv_id, medecin_id, date_heure, duree)
+        if crees:
+            disponibilite_model.signaler(medecin_id)
+    rapport, vus = [], set()
+    for date_heure in dates:
+        if date_heure in vus:
+            rapport.append((date_heure, ResultatReservation.DOUBLON, None))
+        elif date_heure in crees:
+            rapport.append((date_heure, ResultatReservation.CREE, crees[date_heure]))
+        else:
+            rapport.append((date_heure, refus.get(date_heure, ResultatReservation.NON_RESERVE), None))
+        vus.add(date_heure)
+    return rapport
+
+
+def purger_cles(retention=IDEMPOTENCE_RETENTION):
+    """Delete the idempotency keys older than `retention` seconds; returns the count."""
+    limite = datetime.utcnow() - timedelta(seconds=retention)
+    supprimees = db.session.query(CleIdempotence).filter(CleIdempotence.created_at < limite)\
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return supprimees
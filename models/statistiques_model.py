@@ -0,0 +1,272 @@
+from collections import Counter
+from datetime import datetime
+from threading import Lock, RLock
+import heapq
+import time
+
+from sqlalchemy import event
+
+from config import STATISTIQUES_RECONCILIATION
+from models import db, entites
+from models.medecin_model import Medecin
+from models.rdv_model import RendezVous, StatutRdv
+from models.archive_model import RendezVousArchive
+from models.replica import primaire
+
+
+class StatisticsStore:
+    """In-process counters behind /medecins/api/statistiques.
+
+    Each worker applies its own commits and, through the entites signal,
+    those of the other workers of the node, so they all serve the same
+    figures within ENTITES_SIGNAL_INTERVALLE.
+
+    Upcoming appointments are kept in a min-heap on date_heure so that the
+    ones falling into the past are dropped as time goes by; cancelled or
+    moved appointments are removed lazily from the heap.
+    """
+
+    def __init__(self):
+        self.total_medecins = 0
+        self.total_rdv = 0
+        self.a_venir = {}  # rdv_id -> (date_heure, medecin_id)
+        self.tas = []  # (date_heure, rdv_id)
+        self.par_medecin = Counter()  # medecin_id -> RDV à venir
+        self.construit_le = time.monotonic()
+
+    def ajouter_a_venir(self, rdv_id, date_heure, medecin_id):
+        self.a_venir[rdv_id] = (date_heure, medecin_id)
+        heapq.heappush(self.tas, (date_heure, rdv_id))
+        self.par_medecin[medecin_id] += 1
+
+    def retirer_a_venir(self, rdv_id):
+        ancien = self.a_venir.pop(rdv_id, None)
+        if ancien is not None:
+            medecin_id = ancien[1]
+            self.par_medecin[medecin_id] -= 1
+            if self.par_medecin[medecin_id] <= 0:
+                del self.par_medecin[medecin_id]
+
+    def appliquer_rdv(self, rdv_id, date_heure, medecin_id, statut, maintenant):
+        """Bring one appointment's contribution up to date."""
+        self.retirer_a_venir(rdv_id)
+        if statut != StatutRdv.ANNULE and date_heure >= maintenant:
+            self.ajouter_a_venir(rdv_id, date_heure, medecin_id)
+
+    def basculer(self, maintenant):
+        """Drop the appointments that are now in the past."""
+        while self.tas and self.tas[0][0] < maintenant:
+            date_heure, rdv_id = heapq.heappop(self.tas)
+            actuel = self.a_venir.get(rdv_id)
+            if actuel is not None and actuel[0] == date_heure:
+                self.retirer_a_venir(rdv_id)
+
+    def appliquer(self, changements, maintenant):
+        """Apply (nature, valeur) changes recorded at commit or received from another worker."""
+        for nature, valeur in changements:
+            if nature == 'medecin':
+                self.total_medecins += valeur[0]  # (+1 ou -1, medecin_id)
+            elif nature == 'total_medecins':
+                self.total_medecins = valeur
+            elif nature == 'total_rdv':
+                self.total_rdv += valeur
+            elif nature == 'nouveau_rdv':
+                self.total_rdv += 1
+                self.appliquer_rdv(*valeur, maintenant)
+            elif nature == 'rdv':
+                self.appliquer_rdv(*valeur, maintenant)
+            elif nature == 'rdv_supprime':
+                self.total_rdv -= 1
+                self.retirer_a_venir(valeur)
+
+    def valeurs(self):
+        return {
+            'total_medecins': self.total_medecins,
+            'medecins_disponibles': len(self.par_medecin),
+            'total_rdv': self.total_rdv,
+            'rdv_programmes': len(self.a_venir)
+        }
+
+
+_store = None
+_lock = RLock()
+# Une réconciliation à la fois, requêtes faites hors de _lock ; les changements
+# validés pendant ce temps sont notés dans _journal et rejoués sur le nouveau
+# magasin (une écriture validée pendant la lecture peut y être comptée deux
+# fois, jusqu'à la réconciliation suivante)
+_reconciliation = Lock()
+_journal = None
+
+
+def _reconcilier():
+    """Rebuild the counters from the database."""
+    maintenant = datetime.now()
+    store = StatisticsStore()
+    store.total_medecins = db.session.query(db.func.count(Medecin.id)).scalar() or 0
+    # Les rendez-vous archivés restent comptés (le déplacement ne passe pas par les listeners)
+    store.total_rdv = (db.session.query(db.func.count(RendezVous.id)).scalar() or 0) \
+        + (db.session.query(db.func.count(RendezVousArchive.id)).scalar() or 0)
+    rows = db.session.query(RendezVous.id, RendezVous.date_heure, RendezVous.medecin_id)\
+        .filter(RendezVous.date_heure >= maintenant, RendezVous.statut != StatutRdv.ANNULE)
+    for rdv_id, date_heure, medecin_id in rows:
+        store.ajouter_a_venir(rdv_id, date_heure, medecin_id)
+    return store
+
+
+def _a_jour():
+    """Current values, or None when the counters must be rebuilt (_lock is held)."""
+    if _store is None or time.monotonic() - _store.construit_le > STATISTIQUES_RECONCILIATION:
+        return None
+    _store.basculer(datetime.now())
+    return _store.valeurs()
+
+
+def get_statistiques():
+    """Return the directory statistics, reconciling with the database every STATISTIQUES_RECONCILIATION seconds."""
+    global _store, _journal
+    with _lock:
+        valeurs = _a_jour()
+    if valeurs is not None:
+        return valeurs
+    if not _reconciliation.acquire(blocking=False):
+        # Réconciliation en cours dans un autre thread : valeurs précédentes, s'il y en a
+        valeurs = get_statistiques_en_memoire()
+        if valeurs is not None:
+            return valeurs
+        _reconciliation.acquire()
+    try:
+        with _lock:
+            valeurs = _a_jour()
+            if valeurs is not None:
+                return valeurs
+            journal = _journal = []
+        try:
+            store = _reconcilier()
+        except BaseException:
+            with _lock:
+                if _journal is journal:
+                    _journal = None
+            raise
+        with _lock:
+            maintenant = datetime.now()
+            store.appliquer(journal, maintenant)
+            if _journal is journal:  # sinon invalidé pendant la lecture : le résultat n'est pas gardé
+                _journal, _store = None, store
+            store.basculer(maintenant)
+            return store.valeurs()
+    finally:
+        _reconciliation.release()
+
+
+def get_statistiques_en_memoire():
+    """Return the current counters without touching the database, or None if not built yet."""
+    with _lock:
+        if _store is None:
+            return None
+        _store.basculer(datetime.now())
+        return _store.valeurs()
+
+
+def invalidate_statistiques():
+    """Force a reconciliation on the next read."""
+    global _store, _journal
+    with _lock:
+        _store = _journal = None
+
+
+def _appliquer(changements):
+    maintenant = datetime.now()
+    with _lock:
+        if _journal is not None:
+            _journal.extend(changements)
+        if _store is not None:
+            _store.appliquer(changements, maintenant)
+
+
+# Changements des autres workers, par le signal des entités : (nom, id) ->
+# nature. Seul l'id d'un rendez-vous voyage ; sa ligne est relue sur le primaire.
+SIGNAUX = {
+    'statistiques_medecins': 'medecins',
+    'statistiques_nouveau_rdv': 'nouveau_rdv',
+    'statistiques_rdv': 'rdv',
+    'statistiques_rdv_supprime': 'rdv_supprime',
+}
+
+
+def _relire(nature, entite_id):
+    """Change to apply for a signalled key, read on the primary; None if there is nothing to apply."""
+    if nature == 'rdv_supprime':
+        return 'rdv_supprime', entite_id
+    with primaire(db.session):
+        if nature == 'medecins':
+            return 'total_medecins', db.session.query(db.func.count(Medecin.id)).scalar() or 0
+        rdv = db.session.query(RendezVous.id, RendezVous.date_heure, RendezVous.medecin_id, RendezVous.statut)\
+            .filter(RendezVous.id == entite_id).first()
+    if rdv is not None:
+        return nature, tuple(rdv)
+    # Supprimé depuis : son propre signal suit, mais l'insertion reste à compter
+    return ('total_rdv', 1) if nature == 'nouveau_rdv' else None
+
+
+def recevoir(nature, entite_id):
+    """Apply a change signalled by another worker; entite_id None (bulk import) rebuilds everything."""
+    if entite_id is None:
+        invalidate_statistiques()
+        return
+    with _lock:
+        if _store is None and _journal is None:
+            return  # compteurs pas encore construits : la réconciliation lira la base
+    changement = _relire(nature, entite_id)
+    if changement is not None:
+        _appliquer([changement])
+
+
+for _nom, _nature in SIGNAUX.items():
+    entites.abonner(_nom, lambda entite_id, nature=_nature: recevoir(nature, entite_id))
+
+
+# Mise à jour incrémentale : les changements sont relevés après chaque flush,
+# appliqués une fois la transaction validée puis signalés aux autres workers.
+@event.listens_for(db.session, 'after_flush')
+def _relever_changements(session, flush_context):
+    changements = session.info.setdefault('statistiques', [])
+    for obj in session.new:
+        if isinstance(obj, Medecin):
+            changements.append(('medecin', (1, obj.id)))
+        elif isinstance(obj, RendezVous):
+            changements.append(('nouveau_rdv', (obj.id, obj.date_heure, obj.medecin_id, obj.statut)))
+    for obj in session.dirty:
+        if isinstance(obj, RendezVous) and session.is_modified(obj):
+            changements.append(('rdv', (obj.id, obj.date_heure, obj.medecin_id, obj.statut)))
+    for obj in session.deleted:
+        if isinstance(obj, Medecin):
+            changements.append(('medecin', (-1, obj.id)))
+        elif isinstance(obj, RendezVous):
+            changements.append(('rdv_supprime', obj.id))
+
+
+def relever_rdv_inseres(session, rdvs):
+    """Record rendez-vous inserted without a flush (bulk INSERT): (id, date_heure, medecin_id, statut)."""
+    session.info.setdefault('statistiques', []).extend(('nouveau_rdv', rdv) for rdv in rdvs)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _appliquer_changements(session):
+    changements = session.info.pop('statistiques', None)
+    if not changements:
+        return
+    _appliquer(changements)
+    entites.signaler({_cle_signal(nature, valeur) for nature, valeur in changements})
+
+
+def _cle_signal(nature, valeur):
+    if nature == 'medecin':
+        return 'statistiques_medecins', valeur[1]
+    if nature == 'rdv_supprime':
+        return 'statistiques_rdv_supprime', valeur
+    return f'statistiques_{nature}', valeur[0]
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _oublier_changements(session):
+    session.info.pop('statistiques', None)
@@ -0,0 +1,528 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from math import ceil, prod
+from threading import Event, Lock, Thread
+import json
+import os
+import random
+import socket
+import time
+import uuid
+
+from flask import current_app
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.exc import OperationalError
+
+from config import TACHES_WORKERS, TACHES_TENTATIVES, TACHES_ATTENTE, TACHES_INTERVALLE, TACHES_HORIZON
+from config import TACHES_BALAYAGE, TACHES_DELAI_VERROU, TACHES_RETENTION, TACHES_LOT
+from config import RAPPEL_AVANCE, RAPPEL_MINIMUM, RAPPORTS_DELAI, IDEMPOTENCE_RETENTION, IDEMPOTENCE_PURGE
+from models import db, rapports_model
+from models.pagination import keyset_filter
+from models.patient_model import Patient
+from models.rdv_model import RendezVous, StatutRdv
+from models.replica import marquer_ecriture
+
+# Tâches de fond : une ligne par tâche dans la table taches, insérée dans la
+# transaction qui la demande (une réservation et son rappel sont validés
+# ensemble). Chaque processus qui exécute des tâches (`flask --app app
+# taches-worker`, ou worker web avec TACHES_EXECUTEUR_WEB) garde les échéances de la prochaine heure
+# dans une roue temporelle hiérarchique : il ne lit que les nouvelles lignes
+# (id croissant) et celles qui entrent dans l'horizon, par des lectures
+# d'index, jamais toute la table. Une tâche est prise par un UPDATE
+# conditionnel, si bien que plusieurs processus peuvent tourner ensemble.
+# Les heures de cette table sont locales, comme rendez_vous.date_heure.
+
+
+class StatutTache:
+    EN_ATTENTE = 'en_attente'
+    EN_COURS = 'en_cours'
+    TERMINEE = 'terminee'
+    ECHEC = 'echec'  # TACHES_TENTATIVES essais épuisés
+
+    TOUS = (EN_ATTENTE, EN_COURS, TERMINEE, ECHEC)
+
+
+class Tache(db.Model):
+    __tablename__ = 'taches'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    type = db.Column(db.String(50), nullable=False)  # clé de TACHES
+    charge = db.Column(db.Text, nullable=False, default='{}')  # arguments JSON
+    cle = db.Column(db.String(120), nullable=True, unique=True)  # dédoublonnage : une seule tâche par clé
+    statut = db.Column(db.String(20), nullable=False, default=StatutTache.EN_ATTENTE)
+    executer_apres = db.Column(db.DateTime, nullable=False)
+    tentatives = db.Column(db.Integer, nullable=False, default=0)
+    jeton = db.Column(db.String(80), nullable=True)  # processus et prise en cours
+    verrouille_le = db.Column(db.DateTime, nullable=True)
+    termine_le = db.Column(db.DateTime, nullable=True)
+    derniere_erreur = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_taches_statut_echeance', 'statut', 'executer_apres'),
+        db.Index('ix_taches_statut_termine', 'statut', 'termine_le'),
+    )
+
+
+def _ligne(type_, charge, executer_apres, cle):
+    return {'type': type_, 'charge': json.dumps(charge, default=str), 'cle': cle,
+            'statut': StatutTache.EN_ATTENTE, 'executer_apres': executer_apres, 'tentatives': 0,
+            'created_at': datetime.now()}
+
+
+def _inserer(connexion, lignes):
+    """INSERT ignoring rows whose cle is already queued."""
+    requete = insert(Tache.__table__)\
+        .prefix_with('OR IGNORE', dialect='sqlite')\
+        .prefix_with('IGNORE', dialect='mysql')\
+        .prefix_with('IGNORE', dialect='mariadb')
+    connexion.execute(requete, lignes)
+
+
+def planifier(type_, charge=None, executer_apres=None, cle=None, session=None):
+    """Queue a task in the current transaction; it runs once the caller commits.
+
+    A single INSERT, whatever the queue depth. With `cle`, the task is not
+    queued again while a row with the same key exists.
+    """
+    if type_ not in TACHES:
+        raise ValueError(f'Type de tâche inconnu : {type_}')
+    session = session or db.session
+    marquer_ecriture(session)  # écriture : au primaire, jamais au réplica
+    _inserer(session.connection(), [_ligne(type_, charge or {}, executer_apres or datetime.now(), cle)])
+    session.info['taches'] = True
+
+
+# Relevé des rendez-vous créés ou déplacés : rappel et actualisation des
+# agrégats, insérés dans la même transaction
+def _rappel(rdv_id, date_heure, maintenant):
+    echeance = date_heure - timedelta(seconds=RAPPEL_AVANCE)
+    if date_heure - maintenant < timedelta(seconds=RAPPEL_MINIMUM):
+        return None
+    return _ligne('rappel_rdv', {'rdv_id': rdv_id, 'date_heure': date_heure.isoformat()},
+                  max(echeance, maintenant), f'rappel:{rdv_id}:{date_heure.isoformat()}')
+
+
+def _actualisation_rapports(maintenant):
+    # Une actualisation par tranche de RAPPORTS_DELAI secondes, à la fin de la tranche
+    tranche = ceil(maintenant.timestamp() / RAPPORTS_DELAI) * RAPPORTS_DELAI
+    return _ligne('rapports_actualiser', {}, datetime.fromtimestamp(tranche), f'rapports:{tranche}')
+
+
+def planifier_purge_cles(session):
+    """Queue the purge of an idempotency key stored in this transaction, once it has expired.
+
+    One task per IDEMPOTENCE_PURGE slice, whatever the number of keys.
+    """
+    tranche = ceil((time.time() + IDEMPOTENCE_RETENTION) / IDEMPOTENCE_PURGE) * IDEMPOTENCE_PURGE
+    marquer_ecriture(session)
+    _inserer(session.connection(), [_ligne('cles_idempotence_purger', {}, datetime.fromtimestamp(tranche),
+                                           f'cles_idempotence:{tranche}')])
+    session.info['taches'] = True
+
+
+def _enfiler_rdv(session, rdvs, rapports):
+    maintenant = datetime.now()
+    lignes = [ligne for rdv_id, date_heure in rdvs for ligne in (_rappel(rdv_id, date_heure, maintenant),) if ligne]
+    if rapports:
+        lignes.append(_actualisation_rapports(maintenant))
+    if lignes:
+        marquer_ecriture(session)
+        _inserer(session.connection(), lignes)
+        session.info['taches'] = True
+
+
+@event.listens_for(db.session, 'after_flush')
+def _relever_rdv(session, flush_context):
+    rdvs, rapports = [], False
+    for obj in session.new:
+        if isinstance(obj, RendezVous):
+            rapports = True
+            if obj.statut in StatutRdv.A_VENIR:
+                rdvs.append((obj.id, obj.date_heure))
+    for obj in session.dirty:
+        if isinstance(obj, RendezVous) and session.is_modified(obj):
+            rapports = True
+            attributs = inspect(obj).attrs
+            if obj.statut in StatutRdv.A_VENIR and attributs.date_heure.history.deleted:
+                rdvs.append((obj.id, obj.date_heure))  # déplacé : l'ancien rappel sera ignoré
+    if rdvs or rapports:
+        _enfiler_rdv(session, rdvs, rapports)
+
+
+def relever_rdv_inseres(session, rdvs):
+    """Record rendez-vous inserted without a flush (bulk INSERT): (id, date_heure, medecin_id, statut)."""
+    _enfiler_rdv(session, [(rdv_id, date_heure) for rdv_id, date_heure, _, statut in rdvs
+                           if statut in StatutRdv.A_VENIR], True)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _reveiller(session):
+    if session.info.pop('taches', None):
+        executeur.reveiller()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _oublier(session):
+    session.info.pop('taches', None)
+
+
+# Types de tâches : fonction(**charge), exécutée dans un contexte
+# d'application. Une tâche peut être exécutée deux fois (processus arrêté
+# pendant l'exécution) : elle doit le supporter.
+def envoyer_rappel(rdv_id, date_heure):
+    """Remind the patient of a rendez-vous, unless it was cancelled or moved since."""
+    rdv = db.session.query(RendezVous.date_heure, RendezVous.statut, Patient.email, Patient.prenom)\
+        .join(Patient, RendezVous.patient_id == Patient.id)\
+        .filter(RendezVous.id == rdv_id).first()
+    if rdv is None or rdv.statut not in StatutRdv.A_VENIR or rdv.date_heure.isoformat() != date_heure:
+        return
+    # Pas encore d'envoi d'e-mail ni de SMS dans l'application : le rappel est journalisé
+    current_app.logger.info('Rappel du rendez-vous %s (%s) à %s', rdv_id, rdv.date_heure, rdv.email)
+
+
+def actualiser_rapports():
+    rapports_model.actualiser(log=lambda message: None)
+
+
+def purger_cles_idempotence():
+    from models import reservation_model
+    reservation_model.purger_cles()
+
+
+TACHES = {
+    'rappel_rdv': envoyer_rappel,
+    'rapports_actualiser': actualiser_rapports,
+    'cles_idempotence_purger': purger_cles_idempotence,
+}
+
+
+def planifier_rappels(log=print):
+    """Queue the reminders of the upcoming rendez-vous that have none (imports, rendez-vous booked before).
+
+    Reads the upcoming rendez-vous through the (statut, date_heure) index,
+    TACHES_LOT at a time; returns how many rows were read.
+    """
+    maintenant = datetime.now()
+    cles = {'date_heure': RendezVous.date_heure, 'id': RendezVous.id}
+    curseur, lus = (maintenant + timedelta(seconds=RAPPEL_MINIMUM), 0), 0
+    while True:
+        rows = db.session.query(RendezVous.id, RendezVous.date_heure)\
+            .filter(RendezVous.statut.in_(StatutRdv.A_VENIR), keyset_filter(cles, curseur))\
+            .order_by(RendezVous.date_heure, RendezVous.id).limit(TACHES_LOT).all()
+        lignes = [ligne for rdv_id, date_heure in rows for ligne in (_rappel(rdv_id, date_heure, maintenant),) if ligne]
+        if lignes:
+            _inserer(db.session.connection(), lignes)
+        db.session.commit()
+        lus += len(rows)
+        if len(rows) < TACHES_LOT:
+            return lus
+        curseur = (rows[-1].date_heure, rows[-1].id)
+        log(f'  {lus} rendez-vous lus')
+
+
+def etat():
+    """Queue depth: {type: {statut: count}}, and the oldest due task still waiting."""
+    compteurs = {}
+    for type_, statut, nombre in db.session.query(Tache.type, Tache.statut, db.func.count(Tache.id))\
+            .group_by(Tache.type, Tache.statut):
+        compteurs.setdefault(type_, {})[statut] = nombre
+    plus_ancienne = db.session.query(db.func.min(Tache.executer_apres))\
+        .filter(Tache.statut == StatutTache.EN_ATTENTE, Tache.executer_apres <= datetime.now()).scalar()
+    db.session.commit()
+    return compteurs, plus_ancienne
+
+
+def relancer_echecs(type_=None):
+    """Put the failed tasks back in the queue; returns how many."""
+    requete = db.session.query(Tache).filter(Tache.statut == StatutTache.ECHEC)
+    if type_:
+        requete = requete.filter(Tache.type == type_)
+    relancees = requete.update({'statut': StatutTache.EN_ATTENTE, 'tentatives': 0, 'jeton': None,
+                                'executer_apres': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+    return relancees
+
+
+class RoueTemporelle:
+    """Hierarchical timing wheel: O(1) insertion, one slot visited per tick.
+
+    Level 0 has one slot per tick (`resolution` seconds), level 1 one slot
+    per turn of level 0, and so on; an entry moves down one level when the
+    wheel reaches its slot, and fires from level 0. With the default sizes,
+    entries up to one day ahead are accepted.
+    """
+
+    def __init__(self, maintenant, resolution=1, tailles=(60, 60, 24)):
+        self.resolution = resolution
+        self.tailles = tailles
+        self.portees = [prod(tailles[:niveau]) for niveau in range(len(tailles))]  # tics par case
+        self.niveaux = [[[] for _ in range(taille)] for taille in tailles]
+        self.tic = int(maintenant // resolution)
+        self.taille = 0
+
+    def horizon(self):
+        """Seconds ahead that the wheel can hold."""
+        return (self.portees[-1] * self.tailles[-1] - self.portees[-1]) * self.resolution
+
+    def ajouter(self, echeance, element):
+        """Schedule `element` at the timestamp `echeance`; False when it is beyond the horizon."""
+        tic = max(ceil(echeance / self.resolution), self.tic + 1)
+        for niveau, (portee, taille) in enumerate(zip(self.portees, self.tailles)):
+            if tic // portee - self.tic // portee < taille:
+                self.niveaux[niveau][(tic // portee) % taille].append((tic, element))
+                self.taille += 1
+                return True
+        return False
+
+    def avancer(self, maintenant):
+        """Move the wheel up to `maintenant`; returns the elements that are due."""
+        echus = []
+        cible = int(maintenant // self.resolution)
+        while self.tic < cible:
+            self.tic += 1
+            # Cases des niveaux supérieurs atteintes : redescendre leurs entrées
+            for niveau in range(len(self.tailles) - 1, 0, -1):
+                portee, taille = self.portees[niveau], self.tailles[niveau]
+                if self.tic % portee == 0:
+                    case_ = self.niveaux[niveau][(self.tic // portee) % taille]
+                    self.niveaux[niveau][(self.tic // portee) % taille] = []
+                    for tic, element in case_:
+                        self.taille -= 1
+                        if tic <= self.tic:
+                            echus.append(element)
+                        else:
+                            self.ajouter(tic * self.resolution, element)
+            case_ = self.niveaux[0][self.tic % self.tailles[0]]
+            self.niveaux[0][self.tic % self.tailles[0]] = []
+            self.taille -= len(case_)
+            echus.extend(element for _, element in case_)
+            if not self.taille:
+                self.tic = cible  # roue vide : inutile de parcourir les cases
+        return echus
+
+
+class Executeur:
+    """Runs the queued tasks of this process on a pool of TACHES_WORKERS threads."""
+
+    def __init__(self, workers=TACHES_WORKERS):
+        self.workers = workers
+        self.lock = Lock()
+        self.evenement = Event()
+        self.arret = Event()
+        self.thread = None
+        self.pool = None
+        self.app = None
+        self.pid = None
+        self.roue = None
+        self.programmees = set()  # ids présents dans la roue ou sur le point d'être lancés
+        self.echues = []
+        self.a_programmer = []  # réessais décidés par les threads du pool : (id, echeance)
+        self.executees = self.echecs = self.reessais = self.reprises = self.en_cours = 0
+
+    def demarrer(self, app):
+        """Start the scheduling thread of this process, if not running (called again after a fork)."""
+        with self.lock:
+            if self.actif():
+                return
+            self.app, self.pid = app, os.getpid()
+            self.arret.clear()
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='taches')
+            self.thread = Thread(target=self._boucle, name='taches', daemon=True)
+            self.thread.start()
+
+    def arreter(self):
+        """Stop scheduling and wait for the running tasks."""
+        self.arret.set()
+        self.evenement.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    def actif(self):
+        return self.thread is not None and self.thread.is_alive() and self.pid == os.getpid()
+
+    def reveiller(self):
+        """A task was committed by this process: read it without waiting for the next tick."""
+        if self.actif():
+            self.evenement.set()
+
+    def _boucle(self):
+        self.roue = RoueTemporelle(time.time(), TACHES_INTERVALLE)
+        self.programmees = set()
+        self.echues = []
+        self.horizon = min(TACHES_HORIZON, self.roue.horizon())
+        # Au démarrage, les tâches déjà en file sont lues par la fenêtre
+        # d'échéances (index statut, executer_apres), pas par id
+        with self.app.app_context():
+            self.vu = db.session.query(db.func.max(Tache.id)).scalar() or 0
+            db.session.commit()
+        self.fenetre = (datetime.min, 0)  # (executer_apres, id) de la dernière tâche mise dans la roue
+        self.dernier_balayage = 0
+        while not self.arret.is_set():
+            try:
+                with self.app.app_context():
+                    self._charger()
+                    echues, self.echues = self.echues, []
+                    self._lancer(echues + self.roue.avancer(time.time()))
+            except OperationalError:
+                pass  # base occupée : nouvel essai au tic suivant
+            except Exception:
+                self.app.logger.exception('Boucle des tâches')
+            self.evenement.wait(TACHES_INTERVALLE)
+            self.evenement.clear()
+
+    def _programmer(self, rows):
+        maintenant = time.time()
+        for id_, executer_apres in rows:
+            if id_ in self.programmees:
+                continue
+            echeance = executer_apres.timestamp()
+            if echeance <= maintenant:
+                self.echues.append(id_)  # lancée dans ce tour, sans attendre le tic
+                self.programmees.add(id_)
+            elif self.roue.ajouter(echeance, id_):
+                self.programmees.add(id_)
+
+    def _charger(self):
+        """Put into the wheel the new tasks and those entering the horizon (index reads only)."""
+        maintenant = datetime.now()
+        borne = maintenant + timedelta(seconds=self.horizon)
+        attente = Tache.statut == StatutTache.EN_ATTENTE
+        with self.lock:
+            reessais, self.a_programmer = self.a_programmer, []
+        self._programmer(reessais)
+        # Nouvelles lignes, quel que soit leur processus d'origine ; celles
+        # au-delà de la fenêtre y entreront à leur tour
+        while True:
+            rows = db.session.query(Tache.id, Tache.executer_apres).filter(Tache.id > self.vu, attente)\
+                .order_by(Tache.id).limit(TACHES_LOT).all()
+            if rows:
+                self.vu = rows[-1].id
+                self._programmer(row for row in rows if row.executer_apres < self.fenetre[0])
+            if len(rows) < TACHES_LOT:
+                break
+        # Échéances qui entrent dans l'horizon, dans l'ordre (executer_apres, id)
+        cles = {'executer_apres': Tache.executer_apres, 'id': Tache.id}
+        while True:
+            rows = db.session.query(Tache.id, Tache.executer_apres)\
+                .filter(attente, Tache.executer_apres < borne, keyset_filter(cles, self.fenetre))\
+                .order_by(Tache.executer_apres, Tache.id).limit(TACHES_LOT).all()
+            self._programmer(rows)
+            if len(rows) < TACHES_LOT:
+                self.fenetre = max(self.fenetre, (borne, 0))
+                break
+            self.fenetre = (rows[-1].executer_apres, rows[-1].id)
+        # Filet de sécurité : tâches échues manquées (réessai programmé par un
+        # autre processus, id validé après un id plus grand sur MariaDB),
+        # tâches de processus arrêtés, purge des tâches terminées
+        if time.time() - self.dernier_balayage >= TACHES_BALAYAGE:
+            self.dernier_balayage = time.time()
+            self._balayer(maintenant)
+        db.session.commit()
+
+    def _balayer(self, maintenant):
+        limite = maintenant - timedelta(seconds=TACHES_DELAI_VERROU)
+        reprises = db.session.query(Tache)\
+            .filter(Tache.statut == StatutTache.EN_COURS, Tache.verrouille_le < limite)\
+            .update({'statut': StatutTache.EN_ATTENTE, 'jeton': None, 'executer_apres': maintenant},
+                    synchronize_session=False)
+        self.reprises += reprises
+        rows = db.session.query(Tache.id, Tache.executer_apres)\
+            .filter(Tache.statut == StatutTache.EN_ATTENTE, Tache.executer_apres <= maintenant)\
+            .order_by(Tache.executer_apres).limit(TACHES_LOT).all()
+        self._programmer(rows)
+        anciennes = [row.id for row in db.session.query(Tache.id).filter(
+            Tache.statut == StatutTache.TERMINEE,
+            Tache.termine_le < maintenant - timedelta(seconds=TACHES_RETENTION)).limit(TACHES_LOT)]
+        if anciennes:
+            db.session.query(Tache).filter(Tache.id.in_(anciennes)).delete(synchronize_session=False)
+
+    def _lancer(self, ids):
+        """Take the due tasks (those not taken by another process meanwhile) and submit them to the pool."""
+        if not ids:
+            return
+        self.programmees.difference_update(ids)
+        with self.lock:
+            places = max(self.workers * 2 - self.en_cours, 0)
+        if len(ids) > places:
+            # Pool occupé : le surplus est reprogrammé au tic suivant
+            for id_ in ids[places:]:
+                self.roue.ajouter(time.time(), id_)
+            self.programmees.update(ids[places:])
+            ids = ids[:places]
+        if not ids:
+            return
+        maintenant = datetime.now()
+        jeton = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}'
+        db.session.query(Tache)\
+            .filter(Tache.id.in_(ids), Tache.statut == StatutTache.EN_ATTENTE, Tache.executer_apres <= maintenant)\
+            .update({'statut': StatutTache.EN_COURS, 'jeton': jeton, 'verrouille_le': maintenant,
+                     'tentatives': Tache.tentatives + 1}, synchronize_session=False)
+        prises = db.session.query(Tache.id, Tache.type, Tache.charge, Tache.tentatives)\
+            .filter(Tache.id.in_(ids), Tache.jeton == jeton).all()
+        db.session.commit()
+        for tache in prises:
+            with self.lock:
+                self.en_cours += 1
+            self.pool.submit(self._executer, tache, jeton)
+
+    def _executer(self, tache, jeton):
+        try:
+            with self.app.app_context():
+                erreur = None
+                try:
+                    TACHES[tache.type](**json.loads(tache.charge))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    erreur = e
+                self._terminer(tache, jeton, erreur)
+        except Exception:
+            self.app.logger.exception('Tâche %s', tache.id)
+        finally:
+            with self.lock:
+                self.en_cours -= 1
+
+    def _terminer(self, tache, jeton, erreur):
+        maintenant = datetime.now()
+        valeurs = {'jeton': None}
+        if erreur is None:
+            valeurs.update(statut=StatutTache.TERMINEE, termine_le=maintenant, derniere_erreur=None)
+        elif tache.tentatives >= TACHES_TENTATIVES:
+            valeurs.update(statut=StatutTache.ECHEC, termine_le=maintenant, derniere_erreur=repr(erreur)[:500])
+            self.app.logger.error('Tâche %s (%s) en échec après %s essais : %r', tache.id, tache.type,
+                                  tache.tentatives, erreur)
+        else:
+            # Attente doublée à chaque essai, avec gigue pour étaler les reprises
+            attente = TACHES_ATTENTE * 2 ** (tache.tentatives - 1) * (0.5 + random.random())
+            valeurs.update(statut=StatutTache.EN_ATTENTE, executer_apres=maintenant + timedelta(seconds=attente),
+                           derniere_erreur=repr(erreur)[:500])
+        # Seulement si la tâche est toujours à nous (pas reprise entre-temps)
+        mises_a_jour = db.session.query(Tache).filter(Tache.id == tache.id, Tache.jeton == jeton)\
+            .update(valeurs, synchronize_session=False)
+        db.session.commit()
+        with self.lock:
+            if erreur is None:
+                self.executees += 1
+            elif valeurs['statut'] == StatutTache.ECHEC:
+                self.echecs += 1
+            else:
+                self.reessais += 1
+                if mises_a_jour:
+                    self.a_programmer.append((tache.id, valeurs['executer_apres']))
+
+    def metriques(self):
+        with self.lock:
+            return {
+                'en_cours': self.en_cours,
+                'programmees': len(self.programmees),
+                'executees': self.executees,
+                'echecs': self.echecs,
+                'reessais': self.reessais,
+                'reprises': self.reprises,
+            }
+
+
+executeur = Executeur()
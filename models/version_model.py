@@ -0,0 +1,43 @@
+from models import db
+
+
+class VersionTable(db.Model):
+    """Writes per table, counted by triggers (deletions: migration 8, inserts and updates: 9)."""
+    __tablename__ = 'versions_tables'
+
+    nom = db.Column(db.String(64), primary_key=True)
+    suppressions = db.Column(db.Integer, nullable=False, default=0)
+    modifications = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+
+# Tables servies avec des réponses conditionnelles : leurs écritures sont comptées
+TABLES_VERSIONNEES = ('medecins', 'patients', 'rendez_vous')
+
+
+def _compteur(model, colonne):
+    return db.select(colonne).where(VersionTable.nom == model.__tablename__).scalar_subquery()
+
+
+def table_version_query(model):
+    """Query selecting (deletions, inserts + updates, MAX(updated_at)) of a table.
+
+    The counters come from one row of versions_tables and MAX(updated_at)
+    from the end of an index, without reading the rows of the table.
+    """
+    return db.session.query(
+        _compteur(model, VersionTable.suppressions),
+        _compteur(model, VersionTable.modifications),
+        db.select(db.func.max(model.updated_at)).scalar_subquery(),
+    )
+
+
+def get_table_version(model):
+    """Return ((deletions, inserts + updates), MAX(updated_at)) of a table, in one query.
+
+    Every write bumps a counter kept by the triggers, so the pair changes
+    even when MAX(id) and MAX(updated_at) do not (two updates in the same
+    second, rows imported with explicit ids and old timestamps).
+    MAX(updated_at) only feeds Last-Modified.
+    """
+    suppressions, modifications, derniere_modif = table_version_query(model).one()
+    return (suppressions, modifications), derniere_modif
@@ -0,0 +1,17 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Focus automatique sur le champ email
+    document.getElementById('email').focus();
+
+    // Animation de validation visuelle
+    const inputs = document.querySelectorAll('.form-control');
+    inputs.forEach(input => {
+        input.addEventListener('focus', function() {
+            this.style.transform = 'scale(1.02)';
+            this.style.transition = 'transform 0.2s ease';
+        });
+
+        input.addEventListener('blur', function() {
+            this.style.transform = 'scale(1)';
+        });
+    });
+});
@@ -0,0 +1,23 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Animation des cartes statistiques
+    const statCards = document.querySelectorAll('.stat-card');
+    statCards.forEach((card, index) => {
+        setTimeout(() => {
+            card.style.transform = 'translateY(-10px)';
+            card.style.boxShadow = '0 15px 30px rgba(0, 0, 0, 0.1)';
+            setTimeout(() => {
+                card.style.transform = 'translateY(0)';
+                card.style.boxShadow = '0 4px 15px rgba(0, 0, 0, 0.1)';
+            }, 300);
+        }, index * 150);
+    });
+
+    // Animation des éléments de rendez-vous
+    const appointmentItems = document.querySelectorAll('.appointment-item');
+    appointmentItems.forEach((item, index) => {
+        setTimeout(() => {
+            item.style.opacity = '1';
+            item.style.transform = 'translateY(0)';
+        }, index * 100);
+    });
+});
@@ -0,0 +1,22 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Validation en temps réel du mot de passe
+    const passwordInput = document.getElementById('mot_de_passe');
+    passwordInput.addEventListener('input', function() {
+        if (this.value.length < 6) {
+            this.style.borderColor = 'var(--danger-color)';
+        } else {
+            this.style.borderColor = 'var(--success-color)';
+        }
+    });
+
+    // Validation de l'email
+    const emailInput = document.getElementById('email');
+    emailInput.addEventListener('blur', function() {
+        const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+        if (!emailRegex.test(this.value)) {
+            this.style.borderColor = 'var(--danger-color)';
+        } else {
+            this.style.borderColor = 'var(--success-color)';
+        }
+    });
+});
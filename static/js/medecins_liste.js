@@ -0,0 +1,331 @@
+// Configuration
+const config = {
+    refreshInterval: {
+        stats: 30000, // 30 secondes
+        medecins: 10000 // 10 secondes
+    },
+    parPage: 50
+};
+
+// Éléments DOM
+const elements = {
+    loading: document.getElementById('loading'),
+    medecinsGrid: document.getElementById('liste-medecins'),
+    errorMessage: document.getElementById('error-message'),
+    emptyState: document.getElementById('empty-state'),
+    searchInput: document.getElementById('search-input'),
+    specialiteFilter: document.getElementById('specialite-filter'),
+    disponibiliteFilter: document.getElementById('disponibilite-filter'),
+    retryBtn: document.getElementById('retry-btn'),
+    searchBtn: document.getElementById('search-btn'),
+    pagination: document.getElementById('pagination'),
+    compteur: document.getElementById('medecins-compteur'),
+    loadMoreBtn: document.getElementById('load-more-btn')
+};
+
+// Pages de la recherche en cours déjà affichées
+const liste = {
+    page: 0,
+    total: 0
+};
+
+// Fonction pour afficher l'état de chargement
+function showLoading() {
+    elements.loading.style.display = 'flex';
+    elements.medecinsGrid.style.display = 'none';
+    elements.errorMessage.style.display = 'none';
+    elements.emptyState.style.display = 'none';
+    elements.pagination.style.display = 'none';
+}
+
+// Fonction pour afficher l'erreur
+function showError(message = 'Erreur lors du chargement des médecins.') {
+    elements.loading.style.display = 'none';
+    elements.medecinsGrid.style.display = 'none';
+    elements.errorMessage.style.display = 'flex';
+    elements.emptyState.style.display = 'none';
+    elements.pagination.style.display = 'none';
+    elements.errorMessage.querySelector('p').textContent = message;
+}
+
+// Fonction pour afficher l'état vide
+function showEmptyState() {
+    elements.loading.style.display = 'none';
+    elements.medecinsGrid.style.display = 'none';
+    elements.errorMessage.style.display = 'none';
+    elements.emptyState.style.display = 'flex';
+    elements.pagination.style.display = 'none';
+}
+
+// Fonction pour afficher les médecins
+function showMedecins() {
+    elements.loading.style.display = 'none';
+    elements.medecinsGrid.style.display = 'grid';
+    elements.errorMessage.style.display = 'none';
+    elements.emptyState.style.display = 'none';
+}
+
+// Fonction pour charger les statistiques
+async function loadStatistics() {
+    try {
+        const response = await fetch('/medecins/api/statistiques');
+        if (!response.ok) throw new Error('Erreur réseau');
+
+        const data = await response.json();
+        if (data.success) {
+            renderStatistics(data.statistiques);
+        } else {
+            throw new Error(data.error || 'Erreur inconnue');
+        }
+    } catch (error) {
+        console.error('Erreur lors du chargement des statistiques:', error);
+    }
+}
+
+// Fonction pour lire une page de la recherche côté serveur
+async function fetchPage(page) {
+    const params = new URLSearchParams({
+        q: elements.searchInput.value.trim(),
+        specialite: elements.specialiteFilter.value,
+        page: page,
+        par_page: config.parPage
+    });
+
+    const response = await fetch(`/medecins/api/recherche?${params}`, { cache: 'no-store' });
+    if (!response.ok) throw new Error('Erreur réseau');
+
+    const data = await response.json();
+    if (!data.success) throw new Error(data.error || 'Erreur inconnue');
+    return data;
+}
+
+// Fonction pour charger la première page (nouvelle recherche)
+async function loadMedecins() {
+    showLoading();
+    try {
+        const data = await fetchPage(1);
+        liste.page = 1;
+        renderMedecins(data.medecins, data.total);
+        updateSpecialiteFilter(data.facettes.specialite);
+    } catch (error) {
+        showError(error.message);
+    }
+}
+
+// Fonction pour ajouter la page suivante à la liste
+async function loadMore() {
+    elements.loadMoreBtn.disabled = true;
+    try {
+        const data = await fetchPage(liste.page + 1);
+        liste.page += 1;
+        data.medecins.forEach(medecin => elements.medecinsGrid.appendChild(createMedecinCard(medecin)));
+        updatePagination(data.total);
+    } catch (error) {
+        showError(error.message);
+    } finally {
+        elements.loadMoreBtn.disabled = false;
+    }
+}
+
+// Fonction pour recharger les pages déjà affichées (flux temps réel, polling)
+async function refreshMedecins() {
+    if (liste.page === 0) {
+        loadMedecins();
+        return;
+    }
+    try {
+        let medecins = [];
+        let data = null;
+        for (let page = 1; page <= liste.page; page++) {
+            data = await fetchPage(page);
+            medecins = medecins.concat(data.medecins);
+        }
+        renderMedecins(medecins, data.total);
+        updateSpecialiteFilter(data.facettes.specialite);
+    } catch (error) {
+        showError(error.message);
+    }
+}
+
+// Icônes des coordonnées (SVG fixes, sans données)
+const icones = {
+    email: `<svg viewBox="0 0 24 24">
+                <path d="M4 4h16c1.1 0 2 .9 2 2v12c0 1.1-.9 2-2 2H4c-1.1 0-2-.9-2-2V6c0-1.1.9-2 2-2z"></path>
+                <polyline points="22,6 12,13 2,6"></polyline>
+            </svg>`,
+    telephone: `<svg viewBox="0 0 24 24">
+                <path d="M22 16.92v3a2 2 0 0 1-2.18 2 19.79 19.79 0 0 1-8.63-3.07 19.5 19.5 0 0 1-6-6 19.79 19.79 0 0 1-3.07-8.67A2 2 0 0 1 4.11 2h3a2 2 0 0 1 2 1.72 12.84 12.84 0 0 0 .7 2.81 2 2 0 0 1-.45 2.11L8.09 9.91a16 16 0 0 0 6 6l1.27-1.27a2 2 0 0 1 2.11-.45 12.84 12.84 0 0 0 2.81.7A2 2 0 0 1 22 16.92z"></path>
+            </svg>`,
+    adresse: `<svg viewBox="0 0 24 24">
+                <path d="M21 10c0 7-9 13-9 13s-9-6-9-13a9 9 0 0 1 18 0z"></path>
+                <circle cx="12" cy="10" r="3"></circle>
+            </svg>`
+};
+
+// Fonction pour créer un élément ; le texte passe par textContent (jamais interprété comme du HTML)
+function createElement(tag, className, text) {
+    const element = document.createElement(tag);
+    if (className) element.className = className;
+    if (text !== undefined) element.textContent = text;
+    return element;
+}
+
+// Fonction pour créer la carte d'un médecin
+function createMedecinCard(medecin) {
+    const card = createElement('div', 'medecin-card');
+    card.appendChild(createElement('div', 'medecin-avatar', `${medecin.prenom.charAt(0)}${medecin.nom.charAt(0)}`));
+
+    const info = createElement('div', 'medecin-info');
+    info.appendChild(createElement('h3', null, `Dr. ${medecin.prenom} ${medecin.nom}`));
+    info.appendChild(createElement('p', 'specialite', medecin.specialite));
+
+    const details = createElement('div', 'medecin-details');
+    [
+        ['email', medecin.email],
+        ['telephone', medecin.telephone || 'Non renseigné'],
+        ['adresse', medecin.adresse || 'Non renseignée']
+    ].forEach(([icone, texte]) => {
+        const item = createElement('div', 'detail-item');
+        item.innerHTML = icones[icone];
+        item.appendChild(createElement('span', null, texte));
+        details.appendChild(item);
+    });
+    info.appendChild(details);
+
+    const id = encodeURIComponent(medecin.id);
+    const actions = createElement('div', 'medecin-actions');
+    const profil = createElement('a', 'btn-details', 'Voir profil');
+    profil.href = `/medecins/${id}`;
+    const rdv = createElement('a', 'btn-rdv', 'Prendre RDV');
+    rdv.href = `/rdv/nouveau?medecin=${id}`;
+    actions.append(profil, rdv);
+    info.appendChild(actions);
+
+    card.appendChild(info);
+    return card;
+}
+
+// Fonction pour afficher les médecins
+function renderMedecins(medecins, total) {
+    elements.medecinsGrid.replaceChildren(...medecins.map(createMedecinCard));
+
+    if (medecins.length === 0) {
+        showEmptyState();
+        return;
+    }
+    showMedecins();
+    updatePagination(total);
+}
+
+// Fonction pour afficher le compteur et le bouton "Afficher plus"
+function updatePagination(total) {
+    liste.total = total;
+    const affiches = elements.medecinsGrid.children.length;
+    elements.compteur.textContent = `${affiches} médecin${affiches > 1 ? 's' : ''} affiché${affiches > 1 ? 's' : ''} sur ${total}`;
+    elements.loadMoreBtn.style.display = affiches < total ? 'inline-block' : 'none';
+    elements.pagination.style.display = 'flex';
+}
+
+// Fonction pour mettre à jour le filtre des spécialités (facettes de l'index)
+function updateSpecialiteFilter(facettes) {
+    const specialites = Object.keys(facettes).sort();
+    const filter = elements.specialiteFilter;
+
+    // Sauvegarder la valeur sélectionnée
+    const selectedValue = filter.value;
+
+    // Garder seulement la première option (Toutes spécialités)
+    filter.innerHTML = '<option value="">Toutes spécialités</option>';
+
+    // Ajouter les nouvelles options
+    specialites.forEach(specialite => {
+        const option = document.createElement('option');
+        option.value = specialite;
+        option.textContent = `${specialite} (${facettes[specialite]})`;
+        filter.appendChild(option);
+    });
+
+    // Restaurer la sélection
+    if (selectedValue) {
+        if (!specialites.includes(selectedValue)) {
+            const option = document.createElement('option');
+            option.value = selectedValue;
+            option.textContent = `${selectedValue} (0)`;
+            filter.appendChild(option);
+        }
+        filter.value = selectedValue;
+    }
+}
+
+// Fonction pour filtrer les médecins
+function filterMedecins() {
+    loadMedecins();
+}
+
+// Écouteurs d'événements
+elements.retryBtn.addEventListener('click', loadMedecins);
+elements.loadMoreBtn.addEventListener('click', loadMore);
+elements.searchBtn.addEventListener('click', filterMedecins);
+let searchTimer = null;
+elements.searchInput.addEventListener('keyup', (e) => {
+    clearTimeout(searchTimer);
+    if (e.key === 'Enter') {
+        filterMedecins();
+    } else {
+        searchTimer = setTimeout(filterMedecins, 250);
+    }
+});
+elements.specialiteFilter.addEventListener('change', filterMedecins);
+elements.disponibiliteFilter.addEventListener('change', filterMedecins);
+
+// Rafraîchissement périodique, utilisé seulement si le flux temps réel est indisponible
+let pollingTimers = null;
+function startPolling() {
+    if (pollingTimers) return;
+    pollingTimers = [
+        setInterval(loadStatistics, config.refreshInterval.stats),
+        setInterval(refreshMedecins, config.refreshInterval.medecins)
+    ];
+}
+
+function stopPolling() {
+    if (!pollingTimers) return;
+    pollingTimers.forEach(clearInterval);
+    pollingTimers = null;
+}
+
+// Mettre à jour les statistiques affichées
+function renderStatistics(statistiques) {
+    document.getElementById('total-medecins').textContent = statistiques.total_medecins;
+    document.getElementById('medecins-disponibles').textContent = statistiques.medecins_disponibles;
+    document.getElementById('total-rdv').textContent = statistiques.total_rdv;
+    document.getElementById('rdv-programmes').textContent = statistiques.rdv_programmes;
+}
+
+// Flux temps réel (Server-Sent Events)
+function startStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const source = new EventSource('/medecins/api/flux');
+    source.addEventListener('open', stopPolling);
+    source.addEventListener('statistiques', (e) => renderStatistics(JSON.parse(e.data)));
+    ['medecin_ajoute', 'medecin_modifie', 'medecin_supprime'].forEach(type => {
+        source.addEventListener(type, refreshMedecins);
+    });
+    source.addEventListener('error', () => {
+        // Le navigateur se reconnecte seul ; s'il abandonne, on repasse en polling
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
+        }
+    });
+}
+
+// Charger les données au démarrage
+document.addEventListener('DOMContentLoaded', function() {
+    loadStatistics();
+    loadMedecins();
+    startStream();
+});
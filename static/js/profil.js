@@ -0,0 +1,32 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Validation en temps réel
+    const inputs = document.querySelectorAll('.form-control');
+    inputs.forEach(input => {
+        input.addEventListener('input', function() {
+            if (this.value.trim() === '') {
+                this.style.borderColor = 'var(--danger-color)';
+            } else {
+                this.style.borderColor = 'var(--success-color)';
+            }
+        });
+    });
+
+    // Validation de l'email
+    const emailInput = document.getElementById('email');
+    emailInput.addEventListener('blur', function() {
+        const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+        if (!emailRegex.test(this.value)) {
+            this.style.borderColor = 'var(--danger-color)';
+        } else {
+            this.style.borderColor = 'var(--success-color)';
+        }
+    });
+
+    // Animation de confirmation lors de la soumission
+    const form = document.querySelector('form');
+    form.addEventListener('submit', function(e) {
+        const submitBtn = this.querySelector('button[type="submit"]');
+        submitBtn.innerHTML = 'Mise à jour...';
+        submitBtn.disabled = true;
+    });
+});
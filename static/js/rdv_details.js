@@ -0,0 +1,26 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Animation d'apparition
+    const cards = document.querySelectorAll('.card');
+    cards.forEach((card, index) => {
+        setTimeout(() => {
+            card.style.opacity = '0';
+            card.style.transform = 'translateY(20px)';
+            card.style.transition = 'opacity 0.5s ease, transform 0.5s ease';
+
+            setTimeout(() => {
+                card.style.opacity = '1';
+                card.style.transform = 'translateY(0)';
+            }, 50);
+        }, index * 100);
+    });
+
+    // Confirmation d'annulation
+    const cancelForm = document.querySelector('form[action*="annuler"]');
+    if (cancelForm) {
+        cancelForm.addEventListener('submit', function(e) {
+            const submitBtn = this.querySelector('button[type="submit"]');
+            submitBtn.innerHTML = 'Annulation...';
+            submitBtn.disabled = true;
+        });
+    });
+});
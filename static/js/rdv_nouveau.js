@@ -0,0 +1,113 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Définir la date minimum à aujourd'hui
+    const dateInput = document.getElementById('date_heure');
+    const now = new Date();
+    now.setMinutes(now.getMinutes() - now.getTimezoneOffset());
+    dateInput.min = now.toISOString().slice(0, 16);
+
+    // Validation de la date
+    dateInput.addEventListener('change', function() {
+        const selectedDate = new Date(this.value);
+        const currentDate = new Date();
+
+        if (selectedDate < currentDate) {
+            alert('Veuillez sélectionner une date et heure futures.');
+            this.value = '';
+            return;
+        }
+
+        // Vérifier les heures d'ouverture (8h-18h, lundi-vendredi)
+        const dayOfWeek = selectedDate.getDay();
+        const hour = selectedDate.getHours();
+
+        if (dayOfWeek === 0 || dayOfWeek === 6) {
+            alert('Les consultations ne sont disponibles que du lundi au vendredi.');
+            this.value = '';
+            return;
+        }
+
+        if (hour < 8 || hour >= 18) {
+            alert('Les consultations sont disponibles de 8h à 18h.');
+            this.value = '';
+            return;
+        }
+    });
+
+    // Afficher les créneaux libres du médecin sélectionné
+    const medecinSelect = document.getElementById('medecin_id');
+    const creneauxContainer = document.getElementById('creneaux-container');
+    const creneauxLibres = document.getElementById('creneaux-libres');
+
+    async function loadCreneaux() {
+        creneauxLibres.innerHTML = '';
+        if (!medecinSelect.value) {
+            creneauxContainer.style.display = 'none';
+            return;
+        }
+        try {
+            const response = await fetch(`/medecins/${medecinSelect.value}/disponibilites`);
+            if (!response.ok) throw new Error('Erreur réseau');
+            const data = await response.json();
+            data.creneaux.slice(0, 24).forEach(creneau => {
+                const btn = document.createElement('button');
+                btn.type = 'button';
+                btn.className = 'btn btn-secondary';
+                btn.textContent = new Date(creneau.debut).toLocaleString('fr-FR', {
+                    weekday: 'short', day: 'numeric', month: 'short', hour: '2-digit', minute: '2-digit'
+                });
+                btn.addEventListener('click', () => {
+                    dateInput.value = creneau.debut.slice(0, 16);
+                    dateInput.dispatchEvent(new Event('change'));
+                });
+                creneauxLibres.appendChild(btn);
+            });
+            if (!data.creneaux.length) {
+                creneauxLibres.textContent = 'Aucun créneau libre dans les 7 prochains jours.';
+            }
+            creneauxContainer.style.display = 'block';
+        } catch (error) {
+            creneauxContainer.style.display = 'none';
+        }
+    }
+
+    const medecinParam = new URLSearchParams(window.location.search).get('medecin');
+    if (medecinParam) medecinSelect.value = medecinParam;
+    medecinSelect.addEventListener('change', loadCreneaux);
+    loadCreneaux();
+
+    // Sélection automatique du médecin si clic sur une carte médecin
+    const medecinCards = document.querySelectorAll('[data-medecin-id]');
+    medecinCards.forEach(card => {
+        card.addEventListener('click', function() {
+            const medecinId = this.dataset.medecinId;
+            medecinSelect.value = medecinId;
+            loadCreneaux();
+
+            // Scroll vers le formulaire
+            document.querySelector('form').scrollIntoView({
+                behavior: 'smooth',
+                block: 'start'
+            });
+        });
+    });
+
+    // Animation de validation du formulaire
+    const form = document.querySelector('form');
+    form.addEventListener('submit', function(e) {
+        const submitBtn = this.querySelector('button[type="submit"]');
+        submitBtn.innerHTML = 'Prise de rendez-vous...';
+        submitBtn.disabled = true;
+    });
+
+    // Validation en temps réel
+    const requiredInputs = document.querySelectorAll('[required]');
+    requiredInputs.forEach(input => {
+        input.addEventListener('change', function() {
+            if (this.value) {
+                this.style.borderColor = 'var(--success-color)';
+            } else {
+                this.style.borderColor = 'var(--danger-color)';
+            }
+        });
+    });
+});
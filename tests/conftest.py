@@ -0,0 +1,44 @@
+import pytest
+
+from app import create_app
+from benchmarks.donnees import MOT_DE_PASSE, generer
+from models import db, migrations
+
+# Base SQLite neuve par session de tests, migrée puis remplie par le
+# générateur des benchmarks (petits volumes).
+MEDECINS, PATIENTS, RDV = 5, 40, 400
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    base = tmp_path_factory.mktemp('base') / 'test.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{base}',
+        'SQLALCHEMY_BINDS': {},
+        'SESSIONS_STOCKAGE': 'memoire',
+        'TACHES_EXECUTEUR_WEB': False,
+    })
+    with app.app_context():
+        migrations.upgrade(log=lambda message: None)
+        generer(MEDECINS, PATIENTS, RDV, graine=7, log=lambda message: None)
+    return app
+
+
+@pytest.fixture
+def contexte(app):
+    with app.app_context():
+        yield app
+        db.session.rollback()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def client_connecte(client):
+    reponse = client.post('/patient/connexion', data={'email': 'patient1@bench.local', 'mot_de_passe': MOT_DE_PASSE})
+    assert reponse.status_code == 302
+    return client
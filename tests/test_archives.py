@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from benchmarks.donnees import generer
+from models import db, migrations
+from models.archive_model import RendezVousArchive, archiver
+from models.rdv_model import RendezVous, StatutRdv
+from models.reservation_model import CleIdempotence
+
+
+def _cles_etrangeres(connexion_dbapi, _):
+    connexion_dbapi.execute('PRAGMA foreign_keys=ON')
+
+
+def test_archive_rdv_avec_cle_idempotence(tmp_path):
+    # Base jetable avec les clés étrangères vérifiées, comme InnoDB
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "archives.db"}',
+        'SQLALCHEMY_BINDS': {},
+        'SESSIONS_STOCKAGE': 'memoire',
+        'TACHES_EXECUTEUR_WEB': False,
+    })
+    with app.app_context():
+        event.listen(db.engine, 'connect', _cles_etrangeres)
+        migrations.upgrade(log=lambda message: None)
+        generer(2, 3, 0, log=lambda message: None)
+        ancien = datetime.now() - timedelta(days=400)
+        rdv = RendezVous(date_heure=ancien, motif='test', patient_id=1, medecin_id=1, statut=StatutRdv.TERMINE)
+        db.session.add(rdv)
+        db.session.flush()
+        db.session.add(CleIdempotence(patient_id=1, cle='formulaire', rdv_id=rdv.id, created_at=ancien))
+        # L'archiveur laisse toujours la ligne d'id maximal en place
+        db.session.add(RendezVous(date_heure=datetime.now() + timedelta(days=1), motif='test', patient_id=2, medecin_id=1))
+        db.session.commit()
+        rdv_id = rdv.id
+
+        assert archiver(horizon=365, pause=0, log=lambda message: None) == 1
+        assert db.session.get(RendezVous, rdv_id) is None
+        assert db.session.get(RendezVousArchive, rdv_id) is not None
+        assert db.session.query(CleIdempotence).count() == 0
@@ -0,0 +1,79 @@
+from datetime import datetime
+import sqlite3
+import time
+
+from models import disponibilite_model, entites
+from models.rdv_model import cancel_rdv
+from models.reservation_model import ResultatReservation, reserver
+from tests.test_reservations import _creneau
+
+
+def test_signal_autre_processus_vide_les_caches(contexte, tmp_path, monkeypatch):
+    signal = entites.SignalInvalidations(chemin=str(tmp_path / 'signal.sqlite3'), intervalle=0)
+    monkeypatch.setattr(entites, 'signal', signal)
+    assert entites.synchroniser() is None  # crée la table, rien à appliquer
+    disponibilite_model.get_index(1)
+    disponibilite_model.get_index(2)
+
+    # Invalidation d'un seul médecin par un autre worker (pid différent)
+    with sqlite3.connect(signal.chemin) as connexion:
+        connexion.execute('INSERT INTO invalidations (pid, "table", entite_id, cree_le) VALUES (?, ?, ?, ?)',
+                          (0, 'disponibilites', 1, time.time()))
+    entites.synchroniser()
+    assert 1 not in disponibilite_model._index and 2 in disponibilite_model._index
+
+    # Import en masse dans un autre processus : tout est vidé
+    with sqlite3.connect(signal.chemin) as connexion:
+        connexion.execute('INSERT INTO invalidations (pid, "table", entite_id, cree_le) VALUES (?, NULL, NULL, ?)',
+                          (0, time.time()))
+    entites.synchroniser()
+    assert not disponibilite_model._index
+
+
+def test_index_construit_pendant_un_changement_non_garde(contexte, monkeypatch):
+    disponibilite_model.invalidate_index()
+    construire = disponibilite_model._construire_index
+
+    def construire_pendant_une_reservation(medecin_id):
+        index = construire(medecin_id)
+        disponibilite_model.add_rdv_to_index(-1, medecin_id, datetime(2031, 1, 6, 9), 30)
+        return index
+
+    monkeypatch.setattr(disponibilite_model, '_construire_index', construire_pendant_une_reservation)
+    assert disponibilite_model.get_index(3) is not None
+    assert 3 not in disponibilite_model._index
+    monkeypatch.setattr(disponibilite_model, '_construire_index', construire)
+    assert disponibilite_model.get_index(3) is disponibilite_model._index[3]
+
+
+def test_reservation_signalee_aux_autres_workers(contexte, tmp_path, monkeypatch):
+    signal = entites.SignalInvalidations(chemin=str(tmp_path / 'signal.sqlite3'), intervalle=0)
+    monkeypatch.setattr(entites, 'signal', signal)
+    resultat, rdv_id = reserver(5, 4, _creneau(350, 8), 'test')
+    assert resultat == ResultatReservation.CREE
+    assert cancel_rdv(rdv_id)
+    with sqlite3.connect(signal.chemin) as connexion:
+        lignes = connexion.execute('SELECT "table", entite_id FROM invalidations ORDER BY id').fetchall()
+    assert lignes == [('statistiques_nouveau_rdv', rdv_id), ('disponibilites', 4),
+                      ('statistiques_rdv', rdv_id), ('disponibilites', 4)]
+
+
+def test_versions_des_entites_bornees_aux_lectures_en_cours():
+    cache = entites.CacheEntites(taille_max=100)
+    for i in range(1000):
+        cache.invalider({('patients', i)})
+    assert cache.versions == {}
+
+    cle = ('patients', 1)
+    version = cache.debut_lecture(cle)
+    cache.invalider({cle})  # écriture concurrente : la valeur lue est périmée
+    cache.ecrire(cle, version, 'ancienne')
+    cache.fin_lecture(cle)
+    assert cache.lire(cle) is entites._ABSENT
+    assert cache.versions == {}
+
+    version = cache.debut_lecture(cle)
+    cache.ecrire(cle, version, 'nouvelle')
+    cache.fin_lecture(cle)
+    assert cache.lire(cle) == 'nouvelle'
+    assert cache.versions == {}
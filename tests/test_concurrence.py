@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from benchmarks.concurrence import verifier
+from models import db
+from models.rdv_model import RendezVous, StatutRdv
+from models.reservation_model import ResultatReservation, VerrouAgenda, reserver
+from tests.test_reservations import _creneau
+
+THREADS = 16
+
+
+def _en_meme_temps(app, taches):
+    """Run each callable on its own thread and app context (own connection), started together."""
+    depart = Barrier(len(taches))
+
+    def lancer(tache):
+        with app.app_context():
+            depart.wait()
+            return tache()
+
+    with ThreadPoolExecutor(len(taches)) as pool:
+        return list(pool.map(lancer, taches))
+
+
+def test_meme_creneau_une_seule_reservation(app):
+    medecin_id, creneau = 3, _creneau(336, 10)
+    resultats = _en_meme_temps(app, [lambda p=p: reserver(p, medecin_id, creneau, 'test')
+                                     for p in range(1, THREADS + 1)])
+
+    assert [r for r, _ in resultats].count(ResultatReservation.CREE) == 1
+    assert {r for r, _ in resultats} == {ResultatReservation.CREE, ResultatReservation.CONFLIT}
+    with app.app_context():
+        actifs = db.session.query(RendezVous.id).filter(
+            RendezVous.medecin_id == medecin_id, RendezVous.date_heure == creneau,
+            RendezVous.statut != StatutRdv.ANNULE).all()
+        verrou = db.session.get(VerrouAgenda, (medecin_id, creneau.date()))
+    assert len(actifs) == 1
+    # Les réservations du jour passent toutes par la ligne de verrou du médecin
+    assert verrou is not None and verrou.version == 1
+
+
+def test_double_soumission_meme_cle(app):
+    creneau = _creneau(343, 10)
+    resultats = _en_meme_temps(app, [lambda: reserver(5, 3, creneau, 'test', cle='double-clic')] * THREADS)
+
+    assert [r for r, _ in resultats].count(ResultatReservation.CREE) == 1
+    assert len({rdv_id for _, rdv_id in resultats}) == 1
+
+
+def test_banc_de_concurrence(app):
+    # 400 réservations par scénario sur 16 threads : aucun chevauchement, aucune
+    # réservation abandonnée, et un débit plancher (SQLite sérialise toutes les
+    # écritures : bien plus sur MariaDB)
+    assert verifier(app, workers=16, reservations=400, debit_min=20, log=lambda message: None) == []
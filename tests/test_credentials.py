@@ -0,0 +1,12 @@
+from models import credentials
+
+
+def test_compte_inconnu_hache_quand_meme(client):
+    avant = credentials.metriques()['traites']
+    reponse = client.post('/patient/connexion', data={'email': 'inconnu@bench.local', 'mot_de_passe': 'x'})
+    assert reponse.status_code == 200
+    assert 'Email ou mot de passe incorrect.' in reponse.get_data(as_text=True)
+    # Même travail que pour un compte existant : un hachage, au même coût
+    assert credentials.metriques()['traites'] == avant + 1
+    assert not credentials.doit_rehacher(credentials._hash_factice)
+    assert credentials.verifier(None, 'x') == (False, None)
@@ -0,0 +1,45 @@
+from queue import Queue
+import threading
+
+from models import flux_model
+
+
+def test_connexion_par_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(flux_model, 'FLUX_JOURNAL', str(tmp_path / 'flux.sqlite3'))
+    connexion = flux_model._connexion()
+    flux_model.publier([('medecin_ajoute', {'id': 1})])
+    flux_model.publier([('medecin_ajoute', {'id': 2})])
+    assert flux_model._connexion() is connexion
+
+    autre = []
+    thread = threading.Thread(target=lambda: autre.append(flux_model._connexion()))
+    thread.start()
+    thread.join()
+    assert autre[0] is not connexion
+    assert [donnees['id'] for _, _, donnees in flux_model.lire_depuis(0)] == [1, 2]
+
+
+def test_reprise_sans_doublons(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(flux_model, 'FLUX_JOURNAL', str(tmp_path / 'flux.sqlite3'))
+    flux_model.publier([('medecin_ajoute', {'id': i}) for i in range(1, 6)])
+    evenements = flux_model.lire_depuis(0)
+
+    # Le broker a déjà diffusé les événements 3 à 5 quand la relecture du journal commence
+    file = Queue()
+    for evenement in evenements[2:]:
+        file.put(evenement)
+    nouveau = (evenements[-1][0] + 1, 'medecin_ajoute', {'id': 6})
+    file.put(nouveau)
+    monkeypatch.setattr(flux_model.broker, 'abonner', lambda: file)
+    monkeypatch.setattr(flux_model.broker, 'desabonner', lambda file: None)
+
+    reponse = client.get('/medecins/api/flux', headers={'Last-Event-ID': str(evenements[0][0])}, buffered=False)
+    ids = []
+    for morceau in reponse.response:
+        morceau = morceau.decode() if isinstance(morceau, bytes) else morceau
+        if morceau.startswith('id: '):
+            ids.append(int(morceau.split('\n', 1)[0][4:]))
+        if len(ids) == 5:
+            break
+    reponse.close()
+    assert ids == [evenement[0] for evenement in evenements[1:]] + [nouveau[0]]
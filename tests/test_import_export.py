@@ -0,0 +1,41 @@
+import csv
+import json
+
+from models import import_export
+from models.patient_model import Patient, get_patient_by_email
+
+
+def _ligne_patient(n):
+    return json.dumps({'nom': 'Import', 'prenom': f'P{n}', 'email': f'import{n}@test.local',
+                       'mot_de_passe': 'pbkdf2:sha256:1$sel$hash', 'date_naissance': '1980-01-01'})
+
+
+def test_import_ndjson_lignes_invalides(contexte, tmp_path):
+    source = tmp_path / 'patients.ndjson'
+    source.write_text('\n'.join([
+        _ligne_patient(1),
+        '{"nom": "tronqué"',
+        '[1, 2]',
+        _ligne_patient(2),
+        'null',
+        _ligne_patient(3),
+        '"texte"',
+    ]) + '\n', encoding='utf-8')
+    erreurs = tmp_path / 'erreurs.csv'
+    checkpoint = tmp_path / 'reprise.json'
+
+    rapport = import_export.importer('patients', str(source), taille_lot=2, chemin_erreurs=str(erreurs),
+                                     chemin_checkpoint=str(checkpoint))
+
+    assert (rapport.importees, rapport.erreurs) == (3, 4)
+    with open(erreurs, encoding='utf-8') as fichier:
+        lignes = list(csv.reader(fichier))
+    assert [int(ligne[0]) for ligne in lignes[1:]] == [2, 3, 5, 7]
+    assert json.loads(checkpoint.read_text())['ligne'] == 7
+    assert all(get_patient_by_email(f'import{n}@test.local') for n in (1, 2, 3))
+
+    # Relancée avec la même reprise : rien n'est relu ni compté deux fois
+    rapport = import_export.importer('patients', str(source), chemin_erreurs=str(erreurs),
+                                     chemin_checkpoint=str(checkpoint))
+    assert (rapport.importees, rapport.erreurs) == (3, 4)
+    assert Patient.query.filter(Patient.email.like('import%@test.local')).count() == 3
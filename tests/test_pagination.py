@@ -0,0 +1,37 @@
+import base64
+import json
+
+import pytest
+
+from models.pagination import decode_cursor, encode_cursor
+from models.rdv_model import RendezVous
+
+CLES = {'date_heure': RendezVous.date_heure, 'id': RendezVous.id}
+
+
+def _curseur(valeurs):
+    return base64.urlsafe_b64encode(json.dumps(valeurs).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('valeurs', [
+    [12, 3],
+    [None, 3],
+    ['pas une date', 3],
+    ['2026-01-05T09:00:00', {'id': 3}],
+    ['2026-01-05T09:00:00', [3]],
+])
+def test_curseur_forge_refuse(valeurs):
+    with pytest.raises(ValueError, match='Curseur invalide'):
+        decode_cursor(_curseur(valeurs), CLES)
+
+
+def test_curseur_aller_retour():
+    from datetime import datetime
+    valeurs = [datetime(2026, 1, 5, 9, 0), 3]
+    assert decode_cursor(encode_cursor(valeurs), CLES) == valeurs
+
+
+def test_curseur_forge_400(client_connecte):
+    reponse = client_connecte.get('/api/rdv', query_string={'after': _curseur([12, 3])})
+    assert reponse.status_code == 400
+    assert reponse.get_json() == {'error': 'Curseur invalide'}
@@ -0,0 +1,30 @@
+from sqlalchemy import text
+
+from app import create_app
+from models import db, migrations
+
+
+def test_requetes_critiques_sur_index(contexte):
+    assert migrations.check_query_plans() == {}
+
+
+def test_parcours_complet_detecte(tmp_path):
+    # Base jetable à laquelle on retire l'index du calcul des disponibilités : la vérification doit échouer
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "sans_index.db"}',
+        'SQLALCHEMY_BINDS': {},
+        'SESSIONS_STOCKAGE': 'memoire',
+        'TACHES_EXECUTEUR_WEB': False,
+    })
+    with app.app_context():
+        migrations.upgrade(log=lambda message: None)
+        assert migrations.check_query_plans() == {}
+        db.session.execute(text('DROP INDEX ix_rdv_medecin_date'))
+        db.session.commit()
+        # Nouvelle connexion : pysqlite garderait le plan de l'EXPLAIN déjà préparé
+        db.session.close()
+        db.engine.dispose()
+        regressions = migrations.check_query_plans()
+    assert 'disponibilites médecin' in regressions
+    assert any(ligne.startswith('SCAN rendez_vous') for ligne in regressions['disponibilites médecin'])
@@ -0,0 +1,108 @@
+import shutil
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from benchmarks.donnees import MOT_DE_PASSE, generer
+from models import db, migrations
+from models.medecin_model import Medecin
+from models.rdv_model import RendezVous
+from tests.test_reservations import _creneau
+
+LAG_MAX = 5
+
+
+@pytest.fixture
+def app_replica(tmp_path):
+    # Primaire migré et rempli, puis copié en réplica ; le primaire reçoit
+    # ensuite un médecin que le réplica, en retard, n'a pas encore
+    primaire, replica = tmp_path / 'primaire.db', tmp_path / 'replica.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primaire}',
+        'SQLALCHEMY_BINDS': {'replica': {'url': f'sqlite:///{replica}'}},
+        'SESSIONS_STOCKAGE': 'memoire',
+        'TACHES_EXECUTEUR_WEB': False,
+        'REPLICA_LAG_MAX': LAG_MAX,
+    })
+    with app.app_context():
+        migrations.upgrade(log=lambda message: None)
+        generer(2, 3, 0, log=lambda message: None)
+        db.session.remove()
+        db.engine.dispose()
+    shutil.copyfile(primaire, replica)
+    with app.app_context():
+        db.session.add(Medecin(nom='Primaire', prenom='Seul', email='primaire@bench.local',
+                               mot_de_passe='-', specialite='Cardiologie'))
+        db.session.commit()
+
+    bases = []
+    with app.app_context():
+        for nom, moteur in (('primaire', db.engine), ('replica', db.engines['replica'])):
+            event.listen(moteur, 'before_cursor_execute',
+                         lambda *args, nom=nom: bases.append((nom, args[2])))
+    app.bases, app.fichier_replica = bases, replica
+    return app
+
+
+def _noms(reponse):
+    return {medecin['nom'] for medecin in reponse.get_json()}
+
+
+def _bases(app):
+    noms = {nom for nom, _ in app.bases}
+    app.bases.clear()
+    return noms
+
+
+def test_lectures_sur_le_replica(app_replica):
+    client = app_replica.test_client()
+    app_replica.bases.clear()
+    reponse = client.get('/api/medecins')
+    assert reponse.status_code == 200
+    assert 'Primaire' not in _noms(reponse)
+    assert _bases(app_replica) == {'replica'}
+
+    # Hors de REPLICA_ROUTES, les GET restent sur le primaire
+    client.get('/medecins/')
+    assert _bases(app_replica) == {'primaire'}
+
+
+def test_ecritures_et_relecture_sur_le_primaire(app_replica):
+    auteur, autre = app_replica.test_client(), app_replica.test_client()
+    for client in (auteur, autre):
+        client.post('/patient/connexion', data={'email': 'patient1@bench.local', 'mot_de_passe': MOT_DE_PASSE})
+    # La connexion peut réécrire un hash : on repart d'une fenêtre écoulée
+    for client in (auteur, autre):
+        with client.session_transaction() as session:
+            session.pop('derniere_ecriture', None)
+    app_replica.bases.clear()
+
+    date_heure = _creneau(301, 9)
+    reponse = auteur.post('/rdv/nouveau', data={
+        'date_heure': date_heure.strftime('%Y-%m-%dT%H:%M'), 'motif': 'réplica',
+        'medecin_id': '1', 'idempotency_key': 'replica',
+    })
+    assert reponse.status_code == 302
+    ecritures = {nom for nom, sql in app_replica.bases if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))}
+    assert ecritures == {'primaire'}
+    app_replica.bases.clear()
+    with app_replica.app_context():
+        assert db.session.query(RendezVous).filter_by(motif='réplica').count() == 1
+    with sqlite3.connect(app_replica.fichier_replica) as connexion:
+        assert connexion.execute("SELECT COUNT(*) FROM rendez_vous WHERE motif = 'réplica'").fetchone()[0] == 0
+
+    # L'auteur relit le primaire pendant REPLICA_LAG_MAX, les autres le réplica
+    assert 'Primaire' in _noms(auteur.get('/api/medecins'))
+    assert _bases(app_replica) == {'primaire'}
+    assert 'Primaire' not in _noms(autre.get('/api/medecins'))
+    assert _bases(app_replica) == {'replica'}
+
+    # Fenêtre écoulée : l'auteur revient sur le réplica
+    with auteur.session_transaction() as session:
+        session['derniere_ecriture'] = time.time() - LAG_MAX - 1
+    assert 'Primaire' not in _noms(auteur.get('/api/medecins'))
+    assert _bases(app_replica) == {'replica'}
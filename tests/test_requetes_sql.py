@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.donnees import MOT_DE_PASSE
+from controllers import profilage
+from models import db, entites
+from models.patient_model import Patient
+from models.rdv_model import RendezVous
+
+# Instructions SQL au plus par page, caches du worker vides : le nombre ne
+# dépend pas du nombre de rendez-vous du patient (pas de N+1)
+BUDGETS = {
+    '/patient/dashboard': ('patient_dashboard', 3),
+    '/rdv/liste': ('liste_rdv', 1),
+    '/api/dashboard-data/{patient_id}': ('api.get_dashboard_data', 4),
+    '/medecins/': ('medecin.liste_medecins', 1),
+    '/medecins/1': ('medecin.details_medecin', 2),
+}
+
+
+@pytest.fixture(scope='module')
+def patients_extremes(app):
+    """(id, email) of the patients with the fewest and the most rendez-vous."""
+    with app.app_context():
+        rows = db.session.query(Patient.id, Patient.email).join(RendezVous, RendezVous.patient_id == Patient.id)\
+            .group_by(Patient.id, Patient.email).order_by(db.func.count(RendezVous.id), Patient.id).all()
+    return rows[0], rows[-1]
+
+
+def _instructions(client, url, endpoint):
+    entites._appliquer(entites.TOUS)  # caches de ce processus seulement
+    avant = profilage.metriques.sql_instructions[(endpoint, 'GET')]
+    assert client.get(url).status_code == 200
+    return profilage.metriques.sql_instructions[(endpoint, 'GET')] - avant
+
+
+@pytest.mark.parametrize('url', BUDGETS)
+def test_instructions_sql_par_page(app, patients_extremes, url):
+    endpoint, budget = BUDGETS[url]
+    comptes = []
+    for patient_id, email in patients_extremes:
+        client = app.test_client()
+        client.post('/patient/connexion', data={'email': email, 'mot_de_passe': MOT_DE_PASSE})
+        comptes.append(_instructions(client, url.format(patient_id=patient_id), endpoint))
+    assert comptes[0] == comptes[1]
+    assert comptes[0] <= budget
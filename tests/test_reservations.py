@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from config import IDEMPOTENCE_RETENTION
+from models import db, disponibilite_model, taches
+from models.rdv_model import RendezVous, StatutRdv, cancel_rdv, create_rdv
+from models.reservation_model import CleIdempotence, ResultatReservation, VerrouAgenda, _contention, _jours, reserver
+from models.taches import Tache
+
+
+def _creneau(jours, heure):
+    # Jour ouvré au-delà des rendez-vous générés (180 jours) ; les tests
+    # espacent leurs jours d'une semaine pour ne pas tomber sur le même lundi
+    jour = datetime.now().date() + timedelta(days=jours)
+    while jour.weekday() >= 5:
+        jour += timedelta(days=1)
+    return datetime(jour.year, jour.month, jour.day, heure)
+
+
+def test_annulation_par_un_autre_worker(contexte):
+    creneau = _creneau(301, 8)
+    resultat, rdv_id = reserver(1, 2, creneau, 'test')
+    assert resultat == ResultatReservation.CREE
+    # Annulation validée ailleurs : l'index de ce worker n'en sait rien
+    db.session.query(RendezVous).filter(RendezVous.id == rdv_id)\
+        .update({'statut': StatutRdv.ANNULE}, synchronize_session=False)
+    db.session.commit()
+    assert disponibilite_model.has_conflict(2, creneau)
+
+    resultat, autre_id = reserver(3, 2, creneau, 'test')
+    assert resultat == ResultatReservation.CREE and autre_id != rdv_id
+    assert reserver(4, 2, creneau, 'test') == (ResultatReservation.CONFLIT, None)
+
+
+def _erreur(table, valeurs):
+    try:
+        db.session.execute(table.insert(), valeurs)
+    except IntegrityError as e:
+        db.session.rollback()
+        return e
+    raise AssertionError('IntegrityError attendue')
+
+
+def test_contention_limitee_aux_insertions_concurrentes(contexte):
+    jour = _creneau(308, 9).date()
+    db.session.execute(VerrouAgenda.__table__.insert(), {'medecin_id': 1, 'jour': jour, 'version': 1})
+    db.session.commit()
+    assert _contention(_erreur(VerrouAgenda.__table__, {'medecin_id': 1, 'jour': jour, 'version': 1}))
+    # NOT NULL : réessayer ne servirait à rien
+    assert not _contention(_erreur(RendezVous.__table__, {'patient_id': None, 'medecin_id': 1,
+                                                          'date_heure': _creneau(308, 9)}))
+
+
+def test_create_rdv_ne_masque_pas_les_erreurs(contexte):
+    assert create_rdv(_creneau(315, 9), 'test', 1, 3) is not None
+    assert create_rdv(_creneau(315, 9), 'test', 2, 3) is None  # conflit
+    with pytest.raises(ValueError):
+        create_rdv(_creneau(315, 10), 'test', 1, 'inconnu')
+
+
+def test_cancel_rdv_ne_masque_pas_les_erreurs(contexte, monkeypatch):
+    assert cancel_rdv(10 ** 9) is False
+    rdv_id = create_rdv(_creneau(315, 11), 'test', 1, 3)
+
+    def commit():
+        raise IntegrityError('UPDATE rendez_vous', {}, Exception('base indisponible'))
+    monkeypatch.setattr(db.session, 'commit', commit)
+    with pytest.raises(IntegrityError):
+        cancel_rdv(rdv_id)
+    monkeypatch.undo()
+    assert db.session.get(RendezVous, rdv_id).statut != StatutRdv.ANNULE  # annulation défaite
+
+
+def test_cles_expirees_purgees_par_tache(contexte):
+    creneau = _creneau(322, 8)
+    resultat, rdv_id = reserver(6, 2, creneau, 'test', cle='purge-ancienne')
+    assert resultat == ResultatReservation.CREE
+    assert reserver(7, 2, creneau + timedelta(hours=1), 'test', cle='purge-recente')[0] == ResultatReservation.CREE
+    # Une seule tâche de purge pour la tranche, après l'expiration des clés
+    purges = db.session.query(Tache.executer_apres).filter(Tache.type == 'cles_idempotence_purger').all()
+    assert len(purges) == 1
+    assert purges[0].executer_apres >= datetime.now() + timedelta(seconds=IDEMPOTENCE_RETENTION)
+
+    db.session.query(CleIdempotence).filter(CleIdempotence.cle == 'purge-ancienne')\
+        .update({'created_at': datetime.utcnow() - timedelta(seconds=IDEMPOTENCE_RETENTION + 1)})
+    db.session.commit()
+    taches.TACHES['cles_idempotence_purger']()
+    restantes = {cle for cle, in db.session.query(CleIdempotence.cle).filter(CleIdempotence.cle.like('purge-%'))}
+    assert restantes == {'purge-recente'}
+
+
+def test_horaires_verifies_hors_serie(contexte):
+    assert reserver(1, 2, _creneau(329, 7), 'test') == (ResultatReservation.HORS_HORAIRES, None)
+    assert reserver(1, 2, _creneau(329, 17).replace(minute=45), 'test') == (ResultatReservation.HORS_HORAIRES, None)
+    assert reserver(1, 2, datetime.now() - timedelta(hours=1), 'test') == (ResultatReservation.PASSE, None)
+
+
+def test_verrous_des_deux_jours():
+    soir = datetime(2030, 1, 7, 23, 45)
+    assert _jours(soir, 30) == (soir.date(), soir.date() + timedelta(days=1))
+    assert _jours(soir.replace(minute=30), 30) == (soir.date(), soir.date())  # finit à minuit pile
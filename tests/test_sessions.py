@@ -0,0 +1,53 @@
+import pytest
+
+from controllers.sessions import StockageMemoire, StockageSessions
+
+
+def _cookie(client, app):
+    return client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+
+
+def _sid_generation(app, valeur):
+    interface = app.session_interface
+    sid, generation = interface._signer(app).unsign(valeur).decode().rsplit('.', 1)
+    return sid, int(generation)
+
+
+def test_cookie_generation_anterieure(app, client_connecte):
+    interface = app.session_interface
+    ancien = _cookie(client_connecte, app).value
+    sid, generation = _sid_generation(app, ancien)
+    # Requête concurrente : elle a réenregistré la session, mais le navigateur a gardé l'ancien cookie
+    _, donnees, expire_le = interface.stockage.lire(sid)
+    interface.stockage.ecrire(sid, generation + 1, donnees, expire_le)
+    interface.cache.retirer(sid)
+
+    # Requête qui ne modifie pas la session : seul le cookie est renvoyé, à la génération enregistrée
+    assert client_connecte.get('/api/health').status_code == 200
+    assert _sid_generation(app, _cookie(client_connecte, app).value) == (sid, generation + 1)
+    assert interface.stockage.lire(sid)[0] == generation + 1
+
+    # Toujours connecté, y compris sur un autre worker (cache vide)
+    interface.cache.retirer(sid)
+    assert client_connecte.get('/patient/dashboard').status_code == 200
+
+
+def test_session_supprimee_deconnecte(app, client_connecte):
+    interface = app.session_interface
+    sid, _ = _sid_generation(app, _cookie(client_connecte, app).value)
+    interface._supprimer(sid)
+
+    reponse = client_connecte.get('/patient/dashboard')
+    assert reponse.status_code == 302
+
+
+def test_stockage_abstrait():
+    class Incomplet(StockageSessions):
+        def lire(self, sid):
+            return None
+
+    with pytest.raises(TypeError):
+        StockageSessions()
+    with pytest.raises(TypeError):
+        Incomplet()
+    StockageMemoire()
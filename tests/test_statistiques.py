@@ -0,0 +1,56 @@
+from threading import Thread
+
+from models import db, entites, statistiques_model
+from models.rdv_model import RendezVous, StatutRdv
+from tests.test_reservations import _creneau
+
+
+def _inserer_ailleurs(date_heure):
+    # Insertion sans les listeners de la session, comme par un autre worker
+    rdv_id = db.session.execute(RendezVous.__table__.insert().values(
+        patient_id=6, medecin_id=2, date_heure=date_heure, duree=30, motif='autre worker', statut=StatutRdv.PLANIFIE
+    )).inserted_primary_key[0]
+    db.session.commit()
+    return rdv_id
+
+
+def test_changements_des_autres_workers(contexte):
+    statistiques_model.invalidate_statistiques()
+    avant = statistiques_model.get_statistiques()
+    rdv_id = _inserer_ailleurs(_creneau(357, 10))
+    assert statistiques_model.get_statistiques() == avant
+
+    # Reçu par le signal des entités, comme le ferait synchroniser()
+    entites._appliquer({('statistiques_nouveau_rdv', rdv_id)})
+    apres = statistiques_model.get_statistiques()
+    assert apres['total_rdv'] == avant['total_rdv'] + 1
+    assert apres['rdv_programmes'] == avant['rdv_programmes'] + 1
+
+    db.session.execute(db.delete(RendezVous).where(RendezVous.id == rdv_id))
+    db.session.commit()
+    entites._appliquer({('statistiques_rdv_supprime', rdv_id)})
+    assert statistiques_model.get_statistiques() == avant
+
+
+def test_reconciliation_hors_du_verrou(contexte, monkeypatch):
+    reconcilier = statistiques_model._reconcilier
+    pendant = []
+
+    def reconcilier_lent():
+        store = reconcilier()
+        # Un autre thread lit les compteurs et valide un rendez-vous pendant la lecture
+        thread = Thread(target=lambda: pendant.append(statistiques_model.get_statistiques_en_memoire()))
+        thread.start()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        statistiques_model._appliquer([('nouveau_rdv', (10 ** 6, _creneau(364, 10), 2, StatutRdv.PLANIFIE))])
+        return store
+
+    statistiques_model.get_statistiques()
+    avant = statistiques_model.get_statistiques_en_memoire()
+    statistiques_model.invalidate_statistiques()
+    monkeypatch.setattr(statistiques_model, '_reconcilier', reconcilier_lent)
+    apres = statistiques_model.get_statistiques()
+    assert pendant == [None]
+    assert apres['rdv_programmes'] == avant['rdv_programmes'] + 1
+    statistiques_model.invalidate_statistiques()
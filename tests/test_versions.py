@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from models import db
+from models.rdv_model import RendezVous, StatutRdv
+from models import migrations
+from models.migrations import check_query_plans
+from models.version_model import get_table_version
+
+
+def test_version_change_a_la_suppression(contexte):
+    avant = get_table_version(RendezVous)
+    # Ni insertion ni mise à jour : seul le compteur des déclencheurs peut changer
+    db.session.execute(db.delete(RendezVous).where(RendezVous.id == 2))
+    (suppressions, modifications), _ = get_table_version(RendezVous)
+    assert suppressions == avant[0][0] + 1
+    assert modifications == avant[0][1]
+
+
+def test_version_change_sans_updated_at_ni_max_id(contexte):
+    # Mise à jour dans la seconde de la dernière : MAX(updated_at) ne bouge pas
+    avant = get_table_version(RendezVous)
+    db.session.execute(db.update(RendezVous).where(RendezVous.id == 3).values(motif='seconde', updated_at=avant[1]))
+    apres = get_table_version(RendezVous)
+    assert apres[1] == avant[1]
+    assert apres[0] == (avant[0][0], avant[0][1] + 1)
+
+    # Import d'un id sous MAX(id) avec un updated_at ancien
+    db.session.execute(db.delete(RendezVous).where(RendezVous.id == 4))
+    avant = get_table_version(RendezVous)
+    ancien = datetime(2000, 1, 1)
+    db.session.execute(RendezVous.__table__.insert(), {
+        'id': 4, 'patient_id': 1, 'medecin_id': 1, 'date_heure': ancien, 'duree': 30, 'motif': 'import',
+        'statut': StatutRdv.TERMINE, 'created_at': ancien, 'updated_at': ancien,
+    })
+    apres = get_table_version(RendezVous)
+    assert apres[1] == avant[1]
+    assert apres[0] == (avant[0][0], avant[0][1] + 1)
+
+
+def test_version_sans_parcours_de_table(contexte):
+    regressions = check_query_plans()
+    assert not {nom: plan for nom, plan in regressions.items() if nom.startswith('get_table_version')}
+
+
+def test_migrations_des_versions_rejouables(app):
+    # Déclencheurs créés après vérification de leur existence, pas par IF NOT EXISTS
+    with app.app_context(), db.engine.begin() as connexion:
+        migrations._m008_versions_tables(connexion)
+        migrations._m009_compteurs_ecritures(connexion)
+        declencheurs = connexion.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars().all()
+    assert sorted(declencheurs) == sorted(f'tr_{table}_{suffixe}' for table in ('medecins', 'patients', 'rendez_vous')
+                                          for suffixe in ('suppressions', 'insertions', 'modifications'))